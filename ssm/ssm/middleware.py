@@ -1,8 +1,11 @@
 """
-Custom middleware to ensure static files are served with correct headers
+Custom middleware to ensure static files are served with correct headers,
+and to attach the logged-in staff member / student to each request
 """
 from django.utils.deprecation import MiddlewareMixin
 
+from .principal import load_staff, load_student
+
 
 class StaticFilesHeadersMiddleware(MiddlewareMixin):
     """
@@ -24,9 +27,20 @@ class StaticFilesHeadersMiddleware(MiddlewareMixin):
         return response
 
 
-
-
-
-
-
-
+class SessionPrincipalMiddleware(MiddlewareMixin):
+    """
+    Sets request.staff and request.student to the logged-in Staff / Student
+    (or None), loaded once per request from the principal cache. A session
+    whose account no longer exists is logged out of it.
+    """
+    def process_request(self, request):
+        request.staff = None
+        request.student = None
+        if 'staff_id' in request.session:
+            request.staff = load_staff(request.session['staff_id'])
+            if request.staff is None:
+                del request.session['staff_id']
+        if 'student_roll_number' in request.session:
+            request.student = load_student(request.session['student_roll_number'])
+            if request.student is None:
+                del request.session['student_roll_number']
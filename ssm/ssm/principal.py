@@ -0,0 +1,68 @@
+"""
+Logged-in staff member / student for the current session.
+
+SessionPrincipalMiddleware (ssm/middleware.py) resolves the principal once
+per request through load_staff / load_student. The model instance (with the
+password hash deferred) is cached under a per-principal version, bumped by
+the post_save/post_delete signals in staffs/signals.py. Students also carry
+a global version for bulk .update() calls that bypass signals (promotion,
+demotion), which call invalidate_students() themselves.
+
+A cached principal can lag behind its row (e.g. cgpa written by another
+request), so views that write to it save(update_fields=[...]) or reload it
+first rather than saving every field back.
+"""
+from django.core.cache import cache
+
+
+PRINCIPAL_CACHE_TIMEOUT = 60 * 60
+
+STUDENTS_VERSION_KEY = 'principal_version:student'
+
+
+def _version_key(kind, pk):
+    return f"principal_version:{kind}:{pk}"
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _load(model, kind, pk, version_keys):
+    versions = cache.get_many(version_keys)
+    key = ':'.join(['principal', kind, *(str(versions.get(k, 0)) for k in version_keys), str(pk)])
+    principal = cache.get(key)
+    if principal is None:
+        principal = model.objects.defer('password').filter(pk=pk).first()
+        if principal is None:
+            return None
+        cache.set(key, principal, PRINCIPAL_CACHE_TIMEOUT)
+    return principal
+
+
+def load_staff(staff_id):
+    """The Staff with `staff_id` (cached), or None if it no longer exists."""
+    from staffs.models import Staff
+    return _load(Staff, 'staff', staff_id, [_version_key('staff', staff_id)])
+
+
+def load_student(roll_number):
+    """The Student with `roll_number` (cached), or None if it no longer exists."""
+    from students.models import Student
+    return _load(Student, 'student', roll_number, [STUDENTS_VERSION_KEY, _version_key('student', roll_number)])
+
+
+def invalidate_staff(staff_id):
+    _bump(_version_key('staff', staff_id))
+
+
+def invalidate_students(roll_numbers=None):
+    """Drops the cached students given, or every cached student when None."""
+    if roll_numbers is None:
+        _bump(STUDENTS_VERSION_KEY)
+        return
+    for roll_number in roll_numbers:
+        _bump(_version_key('student', roll_number))
@@ -41,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'ssm.middleware.StaticFilesHeadersMiddleware',  # Custom middleware for static file headers
+    'ssm.middleware.SessionPrincipalMiddleware',  # request.staff / request.student
 ]
 
 # Security settings that might block static files
@@ -120,6 +121,27 @@ else:
         }
     }
 
+# Cache Configuration
+# Cached session principals, subject access and dashboard counters are
+# invalidated by bumping versions in the cache, including from the management
+# command workers (process_promotion_jobs, process_mail_outbox), so production
+# must share one cache between all processes.
+# Uses Redis when REDIS_URL is set (for production/Render).
+# Falls back to a per-process LocMemCache, fine for a single local runserver.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
 # --- PASSWORD VALIDATION ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -124,3 +124,21 @@ class NewsAdmin(admin.ModelAdmin):
 class StaffLeaveRequestAdmin(admin.ModelAdmin):
     list_display = ('staff', 'leave_type', 'start_date', 'status')
     list_filter = ('staff', 'leave_type', 'status')
+
+from .models import RiskSnapshot
+
+
+@admin.register(RiskSnapshot)
+class RiskSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('snapshot_date', 'student', 'subject', 'semester', 'attendance_percentage', 'internal_marks', 'gpa_delta', 'remark_count', 'at_risk')
+    list_filter = ('snapshot_date', 'semester', 'at_risk')
+    search_fields = ('student__roll_number', 'student__student_name', 'subject__code')
+    ordering = ('-snapshot_date', 'subject', 'student')
+    date_hierarchy = 'snapshot_date'
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
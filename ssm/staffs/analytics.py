@@ -0,0 +1,192 @@
+"""
+Department result analytics for the HOD.
+
+Each batch's subject grades (StudentSubjectGrade) are loaded with one query
+into a columnar frame — one row per student x semester x subject with grade,
+points and credits — and cached per batch until the grade table changes (see
+students.grades.results_version). Pass percentages, grade distributions,
+percentiles, toppers and arrears are then derived with pandas group-bys, so a
+report for the whole department never touches StudentGPA.subject_data.
+"""
+import pandas as pd
+from django.core.cache import cache
+
+from students.models import Student, StudentSubjectGrade
+from students.grades import results_version
+from students.grading import scheme_for_batch
+
+
+CUBE_COLUMNS = ['roll_number', 'student_name', 'batch', 'semester', 'code', 'name', 'grade', 'points', 'credits']
+
+CUBE_CACHE_TIMEOUT = 60 * 60 * 24
+
+PERCENTILES = [0.25, 0.5, 0.75, 0.9]
+
+MAX_TOPPER_NAMES = 3
+
+
+def batch_years():
+    """Joining years that have students, newest first."""
+    return list(
+        Student.objects.exclude(joining_year=None).order_by('-joining_year')
+        .values_list('joining_year', flat=True).distinct()
+    )
+
+
+def result_cube(batch):
+    """Frame of every subject grade of the batch (cached)."""
+    key = f"result_cube:{batch}:{results_version()}"
+    frame = cache.get(key)
+    if frame is None:
+        rows = StudentSubjectGrade.objects.filter(student__joining_year=batch).values_list(
+            'student_id', 'student__student_name', 'student__joining_year', 'semester',
+            'code_normalized', 'name', 'grade', 'points', 'credits'
+        )
+        frame = pd.DataFrame.from_records(list(rows), columns=CUBE_COLUMNS)
+        # Claimed grades without a code are grouped by subject name
+        frame['code'] = frame['code'].where(frame['code'] != '', frame['name'].str.upper())
+        cache.set(key, frame, CUBE_CACHE_TIMEOUT)
+    return frame
+
+
+def department_cube(batches=None, semester=None):
+    """
+    Concatenated cubes of `batches` (default: all) with 'arrear' and
+    'withdrawn' flags from each batch's grading scheme, optionally narrowed
+    to one semester.
+    """
+    batches = batch_years() if batches is None else batches
+    frames = []
+    for batch in batches:
+        frame = result_cube(batch)
+        if semester is not None:
+            frame = frame[frame['semester'] == semester]
+        scheme = scheme_for_batch(batch)
+        frame = frame.assign(
+            arrear=frame['grade'].isin(scheme.fail_grades),
+            withdrawn=frame['grade'].isin(scheme.non_credit_grades),
+        )
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=CUBE_COLUMNS + ['arrear', 'withdrawn'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def semester_summary(cube):
+    """Per batch and semester: students, students with arrears, pass % and average points."""
+    if cube.empty:
+        return []
+    per_student = cube.groupby(['batch', 'semester', 'roll_number'])['arrear'].any()
+    summary = per_student.groupby(['batch', 'semester']).agg(students='size', failed='sum')
+    summary['arrears'] = cube.groupby(['batch', 'semester'])['arrear'].sum()
+    summary['mean_points'] = cube[~cube['withdrawn']].groupby(['batch', 'semester'])['points'].mean()
+    summary['passed'] = summary['students'] - summary['failed']
+    summary['pass_percentage'] = (summary['passed'] * 100 / summary['students']).round(1)
+    summary['mean_points'] = summary['mean_points'].fillna(0).round(2)
+    return summary.reset_index().to_dict('records')
+
+
+def subject_stats(cube):
+    """
+    Per batch, semester and subject: students, pass %, arrears, mean and
+    percentile grade points, and the students holding the top grade.
+    """
+    graded = cube[~cube['withdrawn']]
+    if graded.empty:
+        return []
+    keys = ['batch', 'semester', 'code']
+    grouped = graded.groupby(keys)
+    stats = grouped.agg(
+        name=('name', 'first'),
+        students=('roll_number', 'nunique'),
+        arrears=('arrear', 'sum'),
+        mean_points=('points', 'mean'),
+        top_points=('points', 'max'),
+    )
+    quantiles = grouped['points'].quantile(PERCENTILES).unstack()
+    quantiles.columns = [f"p{int(q * 100)}" for q in PERCENTILES]
+    stats = stats.join(quantiles)
+    stats['pass_percentage'] = ((stats['students'] - stats['arrears']) * 100 / stats['students']).round(1)
+    stats['mean_points'] = stats['mean_points'].round(2)
+
+    top_rows = graded[graded['points'] == grouped['points'].transform('max')]
+    toppers = top_rows.groupby(keys)['student_name'].agg(list)
+    stats['toppers'] = toppers
+    stats['topper_count'] = toppers.str.len()
+
+    records = stats.reset_index().to_dict('records')
+    for row in records:
+        names = row['toppers']
+        row['toppers'] = ', '.join(names[:MAX_TOPPER_NAMES])
+        if len(names) > MAX_TOPPER_NAMES:
+            row['toppers'] += f" +{len(names) - MAX_TOPPER_NAMES} more"
+    return records
+
+
+def grade_distribution(cube, grades):
+    """
+    Per batch, semester and subject: the number of students with each grade,
+    columns ordered as `grades` (grades outside the list are appended).
+    Returns (columns, rows) where each row has 'counts' aligned to columns.
+    """
+    if cube.empty:
+        return list(grades), []
+    table = pd.crosstab([cube['batch'], cube['semester'], cube['code']], cube['grade'])
+    columns = list(grades) + sorted(set(table.columns) - set(grades))
+    table = table.reindex(columns=columns, fill_value=0)
+    names = cube.groupby(['batch', 'semester', 'code'])['name'].first()
+    rows = [
+        {'batch': batch, 'semester': semester, 'code': code, 'name': names[(batch, semester, code)], 'counts': counts}
+        for (batch, semester, code), counts in zip(table.index, table.to_numpy().tolist())
+    ]
+    return columns, rows
+
+
+def arrear_students(cube):
+    """Students with at least one arrear, most arrears first."""
+    arrears = cube[cube['arrear']]
+    if arrears.empty:
+        return []
+    table = arrears.groupby(['batch', 'roll_number']).agg(
+        name=('student_name', 'first'),
+        arrears=('code', 'size'),
+        subjects=('code', lambda codes: ', '.join(sorted(codes))),
+    )
+    table = table.reset_index().sort_values(['arrears', 'batch', 'roll_number'], ascending=[False, True, True])
+    return table.to_dict('records')
+
+
+def department_report(batch=None, semester=None):
+    """
+    Everything the HOD report shows for one batch (or all batches when
+    `batch` is None) and optionally one semester.
+    """
+    cube = department_cube(None if batch is None else [batch], semester)
+    grades = scheme_for_batch(batch).grades
+    columns, distribution = grade_distribution(cube, grades)
+    return {
+        'summary': semester_summary(cube),
+        'subjects': subject_stats(cube),
+        'grade_columns': columns,
+        'distribution': distribution,
+        'arrear_students': arrear_students(cube),
+    }
+
+
+def report_frames(report):
+    """The report's tables as DataFrames, keyed by sheet name (for CSV/XLSX export)."""
+    distribution = pd.DataFrame(
+        [[row['batch'], row['semester'], row['code'], row['name'], *row['counts']] for row in report['distribution']],
+        columns=['batch', 'semester', 'code', 'name', *report['grade_columns']],
+    )
+    return {
+        'Summary': pd.DataFrame(report['summary'], columns=[
+            'batch', 'semester', 'students', 'passed', 'failed', 'pass_percentage', 'arrears', 'mean_points'
+        ]),
+        'Subjects': pd.DataFrame(report['subjects'], columns=[
+            'batch', 'semester', 'code', 'name', 'students', 'pass_percentage', 'arrears', 'mean_points',
+            *[f"p{int(q * 100)}" for q in PERCENTILES], 'top_points', 'topper_count', 'toppers'
+        ]),
+        'Grade Distribution': distribution,
+        'Arrears': pd.DataFrame(report['arrear_students'], columns=['batch', 'roll_number', 'name', 'arrears', 'subjects']),
+    }
@@ -0,0 +1,123 @@
+"""
+Cached weekly schedule and month calendar grid for manage_attendance.
+
+The parts of the calendar that only depend on the subject's timetable (which
+days have which periods, cell links) are built once per subject and month and
+cached. Timetable saves/deletes bump a per-subject version (see
+staffs/signals.py), which retires every cached schedule and grid of that
+subject at once. Only the set of recorded dates is fetched per request.
+"""
+import calendar
+import datetime
+
+from django.core.cache import cache
+from django.urls import reverse
+
+from .models import Timetable
+
+
+PERIOD_TIMES = {
+    1: "08:30 - 09:30",
+    2: "09:30 - 10:30",
+    3: "10:40 - 11:40",
+    4: "11:40 - 12:40",
+    5: "01:30 - 02:30",
+    6: "02:30 - 03:30",
+    7: "03:30 - 04:30",
+}
+
+GRID_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def _version_key(subject_id):
+    return f"attendance_grid_version:{subject_id}"
+
+
+def timetable_version(subject_id):
+    """Current cache version of a subject's timetable."""
+    return cache.get_or_set(_version_key(subject_id), 1, None)
+
+
+def bump_timetable_version(subject_id):
+    """Invalidates every cached schedule and grid of a subject."""
+    try:
+        cache.incr(_version_key(subject_id))
+    except ValueError:
+        cache.set(_version_key(subject_id), 1, None)
+
+
+def subject_schedule(subject_id):
+    """
+    Returns the subject's weekly schedule as
+    {'Monday': [{'period': 1, 'time': '08:30 - 09:30'}, ...], ...}
+    with each day's classes sorted by period.
+    """
+    key = f"attendance_schedule:{subject_id}:{timetable_version(subject_id)}"
+    schedule = cache.get(key)
+    if schedule is None:
+        schedule = {}
+        for day, period in Timetable.objects.filter(subject_id=subject_id).order_by('period').values_list('day', 'period'):
+            schedule.setdefault(day, []).append({
+                'period': period,
+                'time': PERIOD_TIMES.get(period, f"Period {period}")
+            })
+        cache.set(key, schedule, GRID_CACHE_TIMEOUT)
+    return schedule
+
+
+def month_grid(subject_id, year, month):
+    """
+    Returns the static part of a month's calendar: a list of weeks (Monday
+    first), each a list of cell dicts with date, day_num, is_current_month,
+    classes and url.
+    """
+    key = f"attendance_grid:{subject_id}:{timetable_version(subject_id)}:{year:04d}-{month:02d}"
+    grid = cache.get(key)
+    if grid is None:
+        schedule = subject_schedule(subject_id)
+        base_url = reverse('staffs:manage_attendance', kwargs={'subject_id': subject_id})
+        grid = [
+            [
+                {
+                    'date': day,
+                    'day_num': day.day,
+                    'is_current_month': day.month == month,
+                    'classes': schedule.get(day.strftime('%A'), []),
+                    'url': f"{base_url}?date={day.strftime('%Y-%m-%d')}",
+                }
+                for day in week
+            ]
+            for week in calendar.Calendar(firstweekday=0).monthdatescalendar(year, month)
+        ]
+        cache.set(key, grid, GRID_CACHE_TIMEOUT)
+    return grid
+
+
+def calendar_rows(subject_id, year, month, selected_date, recorded_dates):
+    """
+    Combines the cached month grid with the per-request state: the selected
+    day, today and each day's status ('recorded', 'pending', 'future', 'empty').
+    """
+    today = datetime.date.today()
+    rows = []
+    for week in month_grid(subject_id, year, month):
+        week_data = []
+        for cell in week:
+            day = cell['date']
+            if day in recorded_dates:
+                status_class = "recorded" # Activity done
+            elif cell['classes'] and day <= today:
+                status_class = "pending" # Should have been done
+            elif cell['classes']:
+                status_class = "future" # Upcoming
+            else:
+                status_class = "empty" # No class
+
+            week_data.append({
+                **cell,
+                'is_selected': day == selected_date,
+                'is_today': day == today,
+                'status_class': status_class,
+            })
+        rows.append(week_data)
+    return rows
@@ -0,0 +1,178 @@
+"""
+Batched, idempotent sync of attendance sheets captured offline.
+
+The service worker queues sheets while the classroom is offline and posts
+them here in batches. Every sheet carries a client-generated idempotency key
+(a replayed sheet is acknowledged but not applied twice) and the time it was
+recorded. Sheets are applied oldest first and, per student, a sheet never
+overrides a newer one already received for the same class slot, so the
+outcome does not depend on the order in which devices come back online.
+"""
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from students.models import Student, AttendanceSyncReceipt
+from students.attendance import ATTENDANCE_STATUSES, save_attendance_sheets
+from .models import Staff, Subject
+from .attendance_grid import subject_schedule
+
+
+MAX_SYNC_SHEETS = 200
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    return datetime.datetime.strptime(value, '%H:%M').time()
+
+
+def _subject_id(raw):
+    try:
+        return int(raw.get('subject_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_sheet(staff, raw, subjects, semester_rolls):
+    """
+    Validates one raw sheet from the sync payload.
+    Returns (sheet, None) or (None, error message).
+    """
+    key = raw.get('key')
+    if not isinstance(key, str) or not 0 < len(key) <= 64:
+        return None, "Missing or invalid idempotency key"
+
+    subject = subjects.get(_subject_id(raw))
+    if subject is None:
+        return None, "Unknown subject"
+    if subject.staff_id != staff.staff_id:
+        return None, "You are not assigned to this subject"
+
+    try:
+        date = datetime.datetime.strptime(raw.get('date') or '', '%Y-%m-%d').date()
+        time = _parse_time(raw.get('time'))
+        end_time = _parse_time(raw.get('end_time'))
+    except (TypeError, ValueError):
+        return None, "Invalid date or time"
+
+    recorded_at = parse_datetime(raw.get('recorded_at') or '')
+    if recorded_at is None:
+        return None, "Invalid recorded_at timestamp"
+    if timezone.is_naive(recorded_at):
+        recorded_at = timezone.make_aware(recorded_at)
+    # A device clock running ahead must not let its sheets win forever
+    recorded_at = min(recorded_at, timezone.now())
+
+    if not raw.get('is_extra_class') and date.strftime('%A') not in subject_schedule(subject.id):
+        return None, f"{subject.code} is not scheduled on {date.strftime('%A')}. Mark it as an extra class."
+
+    statuses = raw.get('statuses')
+    if not isinstance(statuses, dict) or not statuses:
+        return None, "No attendance marked"
+    if subject.semester not in semester_rolls:
+        semester_rolls[subject.semester] = set(
+            Student.objects.filter(current_semester=subject.semester).values_list('roll_number', flat=True)
+        )
+    unknown = set(statuses) - semester_rolls[subject.semester]
+    if unknown:
+        return None, f"Students not in semester {subject.semester}: {', '.join(sorted(unknown))}"
+    if any(status not in ATTENDANCE_STATUSES for status in statuses.values()):
+        return None, "Status must be Present or Absent"
+
+    return {
+        'key': key,
+        'subject': subject,
+        'date': date,
+        'time': time,
+        'end_time': end_time,
+        'recorded_at': recorded_at,
+        'statuses': statuses,
+    }, None
+
+
+def sync_attendance_sheets(staff, raw_sheets):
+    """
+    Applies a batch of raw sheets for `staff` in one transaction and one bulk
+    write. Returns one result per sheet, in input order, each a dict with the
+    sheet 'key' and a 'status' of 'applied', 'superseded', 'duplicate' or
+    'rejected' (with an 'error').
+    """
+    subject_ids = {_subject_id(raw) for raw in raw_sheets if isinstance(raw, dict)}
+    subjects = Subject.objects.in_bulk([pk for pk in subject_ids if pk is not None])
+    semester_rolls = {}
+
+    results = []
+    sheets = {}
+    for raw in raw_sheets:
+        if not isinstance(raw, dict):
+            results.append({'key': None, 'status': 'rejected', 'error': "Sheet must be an object"})
+            continue
+        sheet, error = parse_sheet(staff, raw, subjects, semester_rolls)
+        if error:
+            results.append({'key': raw.get('key'), 'status': 'rejected', 'error': error})
+        elif sheet['key'] in sheets:
+            results.append({'key': sheet['key'], 'status': 'duplicate'})
+        else:
+            sheets[sheet['key']] = sheet
+            results.append({'key': sheet['key'], 'status': None})
+
+    with transaction.atomic():
+        # Replays come from the same staff member's device: one sync at a time per staff member,
+        # so a concurrent replay sees the receipts of the first and is acknowledged as a duplicate
+        list(Staff.objects.select_for_update().filter(pk=staff.pk).values_list('pk', flat=True))
+        received = set(AttendanceSyncReceipt.objects.filter(key__in=list(sheets)).values_list('key', flat=True))
+        pending = sorted(
+            (sheet for key, sheet in sheets.items() if key not in received),
+            key=lambda sheet: (sheet['recorded_at'], sheet['key'])
+        )
+
+        # Sheets already received for the same slots decide which students a pending sheet may still change
+        stored = {}
+        if pending:
+            for receipt in AttendanceSyncReceipt.objects.filter(
+                subject__in=[sheet['subject'] for sheet in pending],
+                date__in=[sheet['date'] for sheet in pending],
+            ).values('subject_id', 'date', 'time', 'recorded_at', 'key', 'statuses'):
+                stored.setdefault((receipt['subject_id'], receipt['date'], receipt['time']), []).append(receipt)
+
+        writes = []
+        for sheet in pending:
+            order = (sheet['recorded_at'], sheet['key'])
+            covered = set()
+            for receipt in stored.get((sheet['subject'].id, sheet['date'], sheet['time']), []):
+                if (receipt['recorded_at'], receipt['key']) > order:
+                    covered.update(receipt['statuses'])
+            sheet['effective'] = {roll: status for roll, status in sheet['statuses'].items() if roll not in covered}
+            writes.append((sheet['subject'], sheet['date'], sheet['time'], sheet['end_time'], sheet['effective']))
+
+        for sheet, counts in zip(pending, save_attendance_sheets(writes)):
+            sheet['result'] = counts
+
+        AttendanceSyncReceipt.objects.bulk_create([
+            AttendanceSyncReceipt(
+                key=sheet['key'],
+                staff=staff,
+                subject=sheet['subject'],
+                date=sheet['date'],
+                time=sheet['time'],
+                statuses=sheet['statuses'],
+                recorded_at=sheet['recorded_at'],
+            )
+            for sheet in pending
+        ])
+
+    for result in results:
+        if result['status'] is not None:
+            continue
+        sheet = sheets[result['key']]
+        if sheet['key'] in received:
+            result['status'] = 'duplicate'
+        elif not sheet['effective']:
+            result['status'] = 'superseded'
+        else:
+            result['status'] = 'applied'
+            result.update(sheet['result'])
+    return results
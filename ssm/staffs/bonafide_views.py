@@ -2,8 +2,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse
-from .models import Staff
 from students.models import BonafideRequest
+from .decorators import staff_required
 
 @login_required(login_url='staffs:stafflogin')
 def generate_bonafide_request_pdf(request, request_id):
@@ -61,22 +61,15 @@ def generate_bonafide_request_pdf(request, request_id):
     return render(request, 'staff/bonafide/certificate_print.html', context)
 
 @login_required(login_url='staffs:stafflogin')
+@staff_required()
 def hod_bonafide_list(request):
     """
     HOD View: Lists pending requests. actions: Approve / Reject.
     Strict role checks are initially disabled to ensure access.
     """
     print("DEBUG: Entered hod_bonafide_list")
-    if 'staff_id' not in request.session:
-        print("DEBUG: No staff_id in session, redirecting to login")
-        return redirect('staffs:stafflogin')
-
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        print(f"DEBUG: Staff found: {staff.name} ({staff.role})")
-    except Staff.DoesNotExist:
-        print("DEBUG: Staff.DoesNotExist")
-        return redirect('staffs:stafflogin')
+    staff = request.staff
+    print(f"DEBUG: Staff found: {staff.name} ({staff.role})")
 
     # POST: Handle Actions
     if request.method == 'POST':
@@ -121,18 +114,13 @@ def hod_bonafide_list(request):
 
 
 @login_required(login_url='staffs:stafflogin')
+@staff_required()
 def office_bonafide_list(request):
     """
     Office View: Lists requests with new workflow:
     Pending -> Waiting for HOD Sign -> Signed -> Collected
     """
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    except Staff.DoesNotExist:
-        return redirect('staffs:stafflogin')
+    staff = request.staff
 
     # POST: Handle Actions
     if request.method == 'POST':
@@ -0,0 +1,142 @@
+"""
+Cached counters for the staff dashboards.
+
+Each counter (student totals, pending leave / staff leave / bonafide
+requests and the Office Staff's recent bonafide requests) has its own cache
+key, optionally per semester. A dashboard asks for the keys its role shows
+with one cache.get_many and only recomputes the ones that are missing. The post_save/post_delete signals in staffs/signals.py drop
+the affected group of keys after the change commits; bulk .update() calls
+that move students between semesters call invalidate_dashboard_counters
+themselves. COUNTER_CACHE_TIMEOUT is only a safety net.
+"""
+from django.core.cache import cache
+
+
+COUNTER_CACHE_TIMEOUT = 60 * 10
+
+SEMESTERS = range(1, 9)
+
+RECENT_BONAFIDE_LIMIT = 5
+
+
+def _student_count(semester=None):
+    from students.models import Student
+    students = Student.objects.all()
+    if semester is not None:
+        students = students.filter(current_semester=semester)
+    return students.count()
+
+
+def _pending_leaves(semester=None):
+    from students.models import LeaveRequest
+    if semester is None:
+        return LeaveRequest.objects.filter(status='Pending HOD').count()
+    return LeaveRequest.objects.filter(status='Pending Class Incharge', student__current_semester=semester).count()
+
+
+def _pending_staff_leaves():
+    from .models import StaffLeaveRequest
+    return StaffLeaveRequest.objects.filter(status='Pending').count()
+
+
+def _pending_bonafide(office=False):
+    from students.models import BonafideRequest
+    if office:
+        # Approved by HOD -> Print, Waiting -> Mark Ready
+        return BonafideRequest.objects.filter(status__in=['Approved by HOD', 'Waiting for HOD Signature']).count()
+    return BonafideRequest.objects.filter(status='Pending HOD Approval').count()
+
+
+def _recent_bonafide():
+    from students.models import BonafideRequest
+    return list(BonafideRequest.objects.select_related('student').order_by('-updated_at')[:RECENT_BONAFIDE_LIMIT])
+
+
+# Counter name -> (function, invalidation group)
+COUNTERS = {
+    'students': (_student_count, 'students'),
+    'leaves': (_pending_leaves, 'leaves'),
+    'staff_leaves': (_pending_staff_leaves, 'staff_leaves'),
+    'bonafide': (_pending_bonafide, 'bonafide'),
+    'recent_bonafide': (_recent_bonafide, 'bonafide'),
+}
+
+# Groups whose counts also change when students move between semesters
+DEPENDENT_GROUPS = {
+    'students': ['leaves'],
+}
+
+
+def counter_key(name, *args):
+    """Cache key of one counter, e.g. dashboard_counter:students:3."""
+    return ':'.join(['dashboard_counter', name, *map(str, args)])
+
+
+def role_counters(staff):
+    """
+    Returns {context name: (counter name, args)} for the counters the
+    staff member's dashboard shows.
+    """
+    counters = {
+        'student_count': ('students', ()),
+    }
+    if staff.role == 'HOD':
+        counters.update({
+            'pending_leaves_count': ('leaves', ()),
+            'pending_staff_leaves_count': ('staff_leaves', ()),
+            'pending_bonafide_count': ('bonafide', ()),
+        })
+    elif staff.role == 'Office Staff':
+        counters.update({
+            'pending_bonafide_count': ('bonafide', (True,)),
+            'recent_bonafide_requests': ('recent_bonafide', ()),
+        })
+    elif staff.role == 'Class Incharge':
+        if staff.assigned_semester:
+            counters.update({
+                'student_count': ('students', (staff.assigned_semester,)),
+                'pending_leaves_count': ('leaves', (staff.assigned_semester,)),
+            })
+        else:
+            del counters['student_count']
+    return counters
+
+
+def dashboard_counters(staff):
+    """
+    Returns {context name: value} for the staff member's dashboard: one
+    cache.get_many, plus one query per counter that was not cached.
+    """
+    counters = role_counters(staff)
+    keys = {name: counter_key(counter, *args) for name, (counter, args) in counters.items()}
+    values = cache.get_many(keys.values())
+    missing = {}
+    for name, (counter, args) in counters.items():
+        if keys[name] not in values:
+            missing[keys[name]] = COUNTERS[counter][0](*args)
+    if missing:
+        cache.set_many(missing, COUNTER_CACHE_TIMEOUT)
+        values.update(missing)
+    return {name: values[key] for name, key in keys.items()}
+
+
+def _group_keys(group):
+    keys = []
+    for name, (_, counter_group) in COUNTERS.items():
+        if counter_group != group:
+            continue
+        if name in ('students', 'leaves'):
+            keys += [counter_key(name, semester) for semester in SEMESTERS]
+        elif name == 'bonafide':
+            keys.append(counter_key(name, True))
+        keys.append(counter_key(name))
+    return keys
+
+
+def invalidate_dashboard_counters(*groups):
+    """Drops the cached counters of the given groups (see COUNTERS)."""
+    keys = []
+    for group in groups:
+        for affected in [group, *DEPENDENT_GROUPS.get(group, [])]:
+            keys += _group_keys(affected)
+    cache.delete_many(keys)
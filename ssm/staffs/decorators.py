@@ -0,0 +1,91 @@
+"""
+Access control for staff views.
+
+@staff_required replaces the inline "'staff_id' not in request.session"
+checks and role / subject checks. The subjects a staff member may open are
+precomputed as sets of ids and cached per staff member, so a subject check
+is a set lookup. The cache is versioned and bumped by staffs/signals.py when
+a subject's staff or semester changes, or a staff member's role or assigned
+semester changes.
+"""
+from functools import wraps
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+
+ACCESS_CACHE_TIMEOUT = 60 * 60 * 24
+
+ACCESS_VERSION_KEY = 'staff_subject_access_version'
+
+
+def bump_subject_access():
+    """Invalidates every staff member's cached subject access."""
+    try:
+        cache.incr(ACCESS_VERSION_KEY)
+    except ValueError:
+        cache.set(ACCESS_VERSION_KEY, 1, None)
+
+
+def subject_access(staff):
+    """
+    Returns {'assigned': ids, 'class': ids} as frozensets of the subject ids
+    `staff` teaches ('assigned'), plus, for a Class Incharge, every subject of
+    their assigned semester ('class'). The HOD is not limited by these sets.
+    """
+    from .models import Subject
+
+    version = cache.get_or_set(ACCESS_VERSION_KEY, 1, None)
+    key = f"staff_subject_access:{version}:{staff.staff_id}"
+    access = cache.get(key)
+    if access is None:
+        subjects = Subject.objects.filter(staff=staff)
+        if staff.role == 'Class Incharge' and staff.assigned_semester:
+            rows = (subjects | Subject.objects.filter(semester=staff.assigned_semester)).values_list('id', 'staff_id')
+        else:
+            rows = subjects.values_list('id', 'staff_id')
+        rows = list(rows)
+        access = {
+            'assigned': frozenset(subject_id for subject_id, staff_id in rows if staff_id == staff.staff_id),
+            'class': frozenset(subject_id for subject_id, _ in rows),
+        }
+        cache.set(key, access, ACCESS_CACHE_TIMEOUT)
+    return access
+
+
+def can_access_subject(staff, subject_id, scope='assigned'):
+    """True if `staff` may open the subject: the HOD always, others per subject_access()."""
+    return staff.role == 'HOD' or int(subject_id) in subject_access(staff)[scope]
+
+
+def staff_required(roles=None, scope=None, message="Access Denied.",
+                   denied_url='staffs:staff_dashboard', subject_kwarg='subject_id', api=False):
+    """
+    Requires a logged-in staff member (request.staff), optionally with one of
+    `roles` and, with `scope` set to 'assigned' or 'class', access to the
+    subject in the `subject_kwarg` URL argument (see can_access_subject).
+    Denied requests get `message` and a redirect to `denied_url`, or a JSON
+    error for `api` views.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            staff = request.staff
+            if staff is None:
+                if api:
+                    return JsonResponse({'error': 'Authentication required. Please log in.'}, status=401)
+                return redirect('staffs:stafflogin')
+
+            allowed = roles is None or staff.role in roles
+            if allowed and scope and kwargs.get(subject_kwarg) is not None:
+                allowed = can_access_subject(staff, kwargs[subject_kwarg], scope)
+            if not allowed:
+                if api:
+                    return JsonResponse({'error': message}, status=403)
+                messages.error(request, message)
+                return redirect(denied_url)
+            return view_func(request, *args, **kwargs)
+        return _wrapped_view
+    return decorator
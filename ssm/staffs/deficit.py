@@ -0,0 +1,98 @@
+"""
+Monthly attendance deficit engine for class incharges.
+
+Everything is computed for the whole semester at once: the month's summary
+rows are pulled in a single query into a pandas frame and the session-based
+and hour-weighted (Lab = 3 hours) percentages are derived column-wise.
+"""
+import calendar
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from students.models import Student, AttendanceSummary
+
+
+DEFICIT_THRESHOLD = 70
+
+FRAME_COLUMNS = ['present', 'total', 'present_hours', 'total_hours']
+
+
+def resolve_month(month_offset):
+    """Returns (year, month, 'Month YYYY') for `month_offset` months before today."""
+    target_date = datetime.date.today()
+    for _ in range(month_offset):
+        target_date = target_date.replace(day=1) - datetime.timedelta(days=1)
+    return target_date.year, target_date.month, f"{calendar.month_name[target_date.month]} {target_date.year}"
+
+
+def attendance_frame(semester, year, month, roll_numbers):
+    """
+    Builds a frame indexed by roll number with session/hour counts and both
+    percentages for the given students. Students without attendance in the
+    month get zero counts (and 0%).
+    """
+    rows = AttendanceSummary.objects.filter(
+        subject__semester=semester,
+        month=datetime.date(year, month, 1),
+        student__in=roll_numbers,
+    ).values_list('student', *FRAME_COLUMNS)
+
+    frame = pd.DataFrame.from_records(list(rows), columns=['roll_number'] + FRAME_COLUMNS)
+    frame = frame.groupby('roll_number')[FRAME_COLUMNS].sum()
+    frame = frame.reindex(roll_numbers, fill_value=0).astype('int64')
+
+    # Integer percentages, floored like the old per-student loop
+    for count, total, column in (('present', 'total', 'percentage'), ('present_hours', 'total_hours', 'hours_percentage')):
+        totals = frame[total].to_numpy()
+        frame[column] = np.where(totals > 0, frame[count].to_numpy() * 100 // np.maximum(totals, 1), 0)
+    return frame
+
+
+def get_attendance_rows(semester, year, month, roll_numbers=None):
+    """
+    Returns one dict per student of `semester` (optionally narrowed to
+    `roll_numbers`) with session and hour counts and both percentages for the
+    month. Returns an empty list if no attendance was taken at all.
+    """
+    students = Student.objects.filter(current_semester=semester).select_related('personalinfo').order_by('roll_number')
+    if roll_numbers is not None:
+        students = students.filter(roll_number__in=roll_numbers)
+    students = list(students)
+    if not students:
+        return []
+
+    frame = attendance_frame(semester, year, month, [s.roll_number for s in students])
+    if not frame['total'].any():
+        return []
+
+    records = frame.to_dict('index')
+    rows = []
+    for student in students:
+        row = records[student.roll_number]
+        parent_email = None
+        if hasattr(student, 'personalinfo'):
+            parent_email = student.personalinfo.parent_email
+
+        rows.append({
+            'student': student,
+            'roll': student.roll_number,
+            'name': student.student_name,
+            'present': row['present'],
+            'total': row['total'],
+            'percentage': row['percentage'],
+            'present_hours': row['present_hours'],
+            'total_hours': row['total_hours'],
+            'hours_percentage': row['hours_percentage'],
+            'parent_email': parent_email,
+        })
+    return rows
+
+
+def get_attendance_deficits(semester, year, month, threshold=DEFICIT_THRESHOLD):
+    """
+    Returns the rows of get_attendance_rows() whose hour-weighted attendance
+    for the month is below `threshold`.
+    """
+    return [row for row in get_attendance_rows(semester, year, month) if row['hours_percentage'] < threshold]
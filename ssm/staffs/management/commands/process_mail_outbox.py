@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from staffs.outbox import process_outbox_batch, MAX_ATTEMPTS
+
+
+class Command(BaseCommand):
+    help = 'Sends queued parent notification emails from the MailOutbox table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Emails sent per SMTP connection (default: 50)',
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=MAX_ATTEMPTS,
+            help=f'Give up on an email after this many failures (default: {MAX_ATTEMPTS})',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll the outbox instead of exiting once it is drained',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=int,
+            default=30,
+            help='Seconds to wait between polls in --loop mode (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        totals = {'sent': 0, 'retried': 0, 'failed': 0}
+
+        while True:
+            try:
+                result = process_outbox_batch(options['batch_size'], options['max_attempts'])
+            except Exception as e:
+                # e.g. database unavailable: whatever was claimed becomes due again after the claim timeout
+                self.stderr.write(self.style.ERROR(f'Mail batch failed: {e}'))
+                result = None
+
+            if result:
+                for key in totals:
+                    totals[key] += result[key]
+
+            if result and any(result.values()):
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Mail outbox processed: {totals['sent']} sent, "
+                f"{totals['retried']} scheduled for retry, {totals['failed']} failed"
+            )
+        )
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from staffs.models import PromotionJob
+from staffs.promotion import claim_next_job, run_promotion_job, PROMOTION_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Runs queued semester promotion jobs (archive + promote in batches)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=PROMOTION_CHUNK_SIZE,
+            help=f'Students archived and promoted per transaction (default: {PROMOTION_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Queue failed jobs again before processing (re-running a job is safe)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll for new jobs instead of exiting once the queue is empty',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=int,
+            default=10,
+            help='Seconds to wait between polls in --loop mode (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            count = PromotionJob.objects.filter(status='Failed').update(status='Pending', finished_at=None)
+            self.stdout.write(self.style.WARNING(f'Re-queued {count} failed job(s)'))
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = timezone.now()
+            run_promotion_job(job, options['chunk_size'])
+            elapsed = (timezone.now() - started).total_seconds()
+            if job.status == 'Done':
+                self.stdout.write(self.style.SUCCESS(
+                    f'Job {job.id}: promoted {job.promoted}/{job.total} student(s) from semester {job.semester} in {elapsed:.1f}s'
+                ))
+            else:
+                self.stderr.write(self.style.ERROR(f'Job {job.id} failed: {job.error}'))
@@ -0,0 +1,49 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from staffs.models import RiskSnapshot
+from staffs.risk import take_risk_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Store tonight\'s per-student risk metrics in RiskSnapshot (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the snapshot without saving it',
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=180,
+            help='Delete snapshots older than this many days (0 keeps everything)',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+
+        rows, at_risk = take_risk_snapshot(today, dry_run=options['dry_run'])
+        old_snapshots = RiskSnapshot.objects.none()
+        if options['keep_days']:
+            old_snapshots = RiskSnapshot.objects.filter(
+                snapshot_date__lt=today - datetime.timedelta(days=options['keep_days'])
+            )
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'DRY RUN: Would snapshot {rows} student-subject row(s), {at_risk} at risk, '
+                    f'and delete {old_snapshots.count()} old row(s)'
+                )
+            )
+        else:
+            deleted, _ = old_snapshots.delete()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Snapshot for {today}: {rows} student-subject row(s), {at_risk} at risk; '
+                    f'deleted {deleted} old row(s)'
+                )
+            )
@@ -0,0 +1,127 @@
+"""
+Streaming marks export for one subject or a whole semester.
+
+Students are read in chunks with their marks for the exported subjects
+prefetched alongside each chunk, so memory stays flat whatever the class
+size. CSV rows are yielded straight into a StreamingHttpResponse, with one
+column group per subject. XLSX uses openpyxl's write-only mode, with one
+sheet per subject, spooled to a temporary file and streamed from there.
+"""
+import csv
+import tempfile
+
+from django.db.models import Count, Prefetch
+
+from students.models import Student, StudentMarks
+from students.marks import MARK_FIELDS
+
+
+EXPORT_CHUNK_SIZE = 200
+
+MARK_LABELS = {
+    'test1_marks': 'Test 1',
+    'test2_marks': 'Test 2',
+    'internal_marks': 'Internal',
+}
+
+# Keep XLSX files in memory up to this size, then spill to disk
+SPOOL_MAX_SIZE = 5 * 1024 * 1024
+
+
+class Echo:
+    """File-like object whose write() returns the line, for csv.writer in a generator."""
+
+    def write(self, value):
+        return value
+
+
+def short_roll(roll_number):
+    """Last 3 characters of the roll number, as the marks sheets use."""
+    return roll_number[-3:] if len(roll_number) >= 3 else roll_number
+
+
+def filled_columns(subjects):
+    """
+    Returns {subject_id: [mark fields with at least one value]} so empty
+    columns (e.g. Test 2 before it is held) are left out. One query.
+    """
+    counts = StudentMarks.objects.filter(subject__in=subjects).order_by().values('subject').annotate(
+        **{field: Count(field) for field in MARK_FIELDS}
+    )
+    filled = {subject.id: [] for subject in subjects}
+    for row in counts:
+        filled[row['subject']] = [field for field in MARK_FIELDS if row[field]]
+    return filled
+
+
+def student_marks(subjects, semester):
+    """
+    Yields (student, {subject_id: StudentMarks}) for the students of
+    `semester`, in roll number order, EXPORT_CHUNK_SIZE students at a time.
+    """
+    students = Student.objects.filter(current_semester=semester).order_by('roll_number').only(
+        'roll_number', 'student_name'
+    ).prefetch_related(Prefetch(
+        'marks',
+        queryset=StudentMarks.objects.filter(subject__in=subjects).only('student_id', 'subject_id', *MARK_FIELDS),
+        to_attr='export_marks',
+    ))
+    for student in students.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield student, {marks.subject_id: marks for marks in student.export_marks}
+
+
+def _values(marks, fields):
+    return ['' if marks is None or getattr(marks, field) is None else getattr(marks, field) for field in fields]
+
+
+def csv_rows(subjects, semester):
+    """Yields CSV lines: a header, then one row per student with a column group per subject."""
+    subjects = list(subjects)
+    columns = filled_columns(subjects)
+    writer = csv.writer(Echo())
+
+    header = ['Roll Number', 'Student Name']
+    for subject in subjects:
+        prefix = f"{subject.code} " if len(subjects) > 1 else ''
+        header += [prefix + MARK_LABELS[field] for field in columns[subject.id]]
+    yield writer.writerow(header)
+
+    for student, marks in student_marks(subjects, semester):
+        row = [short_roll(student.roll_number), student.student_name]
+        for subject in subjects:
+            row += _values(marks.get(subject.id), columns[subject.id])
+        yield writer.writerow(row)
+
+
+def xlsx_file(subjects, semester):
+    """
+    Writes a workbook with one sheet per subject in write-only mode and
+    returns it as a temporary file positioned at the start.
+    """
+    from openpyxl import Workbook
+
+    subjects = list(subjects)
+    columns = filled_columns(subjects)
+    workbook = Workbook(write_only=True)
+    sheets = {}
+    titles = set()
+    for subject in subjects:
+        # Sheet titles are limited to 31 characters, must be unique and cannot contain []:*?/\
+        title = ''.join(ch for ch in subject.code if ch not in '[]:*?/\\')[:31] or f"Subject {subject.id}"
+        if title in titles:
+            title = f"{title[:24]} ({subject.id})"
+        titles.add(title)
+        sheet = workbook.create_sheet(title=title)
+        sheet.append(['Roll Number', 'Student Name'] + [MARK_LABELS[field] for field in columns[subject.id]])
+        sheets[subject.id] = sheet
+
+    for student, marks in student_marks(subjects, semester):
+        for subject in subjects:
+            sheets[subject.id].append(
+                [short_roll(student.roll_number), student.student_name] + _values(marks.get(subject.id), columns[subject.id])
+            )
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-17 15:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0029_news_document_news_new_gif_end_date_and_more'),
+        ('students', '0037_attendancesummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('remark_type', models.CharField(default='Attendance Deficit', max_length=100)),
+                ('month', models.CharField(max_length=20)),
+                ('year', models.CharField(max_length=4)),
+                ('payload', models.JSONField(blank=True, default=dict, help_text='Figures rendered into the email (percentage, hours)')),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Sent', 'Sent'), ('Failed', 'Failed')], default='Pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='staffs.staff')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_mails', to='students.student')),
+            ],
+            options={
+                'verbose_name_plural': 'Mail Outbox',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='mailoutbox_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('student', 'remark_type', 'month'), name='unique_outbox_mail_per_month')],
+            },
+        ),
+    ]
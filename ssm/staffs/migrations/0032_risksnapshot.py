@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-17 16:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0031_promotionjob'),
+        ('students', '0043_running_cgpa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_date', models.DateField()),
+                ('semester', models.PositiveIntegerField()),
+                ('attendance_percentage', models.FloatField(default=0)),
+                ('test1_marks', models.IntegerField(blank=True, null=True)),
+                ('test2_marks', models.IntegerField(blank=True, null=True)),
+                ('internal_marks', models.IntegerField(blank=True, null=True)),
+                ('gpa_delta', models.FloatField(blank=True, help_text='Latest semester GPA minus the one before', null=True)),
+                ('remark_count', models.PositiveIntegerField(default=0, help_text='Remarks in the recent window')),
+                ('risk_factors', models.JSONField(default=list)),
+                ('at_risk', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='risk_snapshots', to='students.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='risk_snapshots', to='staffs.subject')),
+            ],
+            options={
+                'ordering': ['-snapshot_date', 'subject', 'student'],
+                'indexes': [models.Index(fields=['snapshot_date', 'subject', 'at_risk'], name='risk_snapshot_subject_idx'), models.Index(fields=['snapshot_date', 'semester', 'at_risk'], name='risk_snapshot_semester_idx')],
+                'constraints': [models.UniqueConstraint(fields=('snapshot_date', 'student', 'subject'), name='unique_risk_snapshot')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-17 16:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0032_risksnapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='news',
+            index=models.Index(fields=['is_active', 'start_date', 'end_date'], name='news_active_window_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0033_news_active_window_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailoutbox',
+            name='status',
+            field=models.CharField(choices=[('Pending', 'Pending'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed')], default='Pending', max_length=20),
+        ),
+    ]
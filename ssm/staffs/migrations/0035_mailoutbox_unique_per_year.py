@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-17 17:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0034_mailoutbox_sending'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='mailoutbox',
+            name='unique_outbox_mail_per_month',
+        ),
+        migrations.AddConstraint(
+            model_name='mailoutbox',
+            constraint=models.UniqueConstraint(fields=('student', 'remark_type', 'month', 'year'), name='unique_outbox_mail_per_month'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.hashers import make_password, check_password
 from ssm.validators import validate_file_size
 from ssm.upload_paths import (
@@ -338,6 +339,10 @@ class News(models.Model):
     class Meta:
         ordering = ['-date']
         verbose_name_plural = "News & Announcements"
+        indexes = [
+            # Active-today window query (see staffs.news_feed)
+            models.Index(fields=['is_active', 'start_date', 'end_date'], name='news_active_window_idx'),
+        ]
     
     def clean(self):
         """Validate NEW gif dates."""
@@ -502,3 +507,104 @@ class MailLog(models.Model):
     def __str__(self):
         return f"Mail to {self.student.student_name} ({self.remark_type}) - {self.sent_at}"
 
+
+
+class MailOutbox(models.Model):
+    """Queued parent notification emails, drained by the process_mail_outbox command."""
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Sending', 'Sending'),
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),
+    ]
+    student = models.ForeignKey('students.Student', on_delete=models.CASCADE, related_name='queued_mails')
+    staff = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True)
+    remark_type = models.CharField(max_length=100, default='Attendance Deficit')
+    month = models.CharField(max_length=20)
+    year = models.CharField(max_length=4)
+    payload = models.JSONField(default=dict, blank=True, help_text="Figures rendered into the email (percentage, hours)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name_plural = 'Mail Outbox'
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'remark_type', 'month', 'year'], name='unique_outbox_mail_per_month'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='mailoutbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.remark_type} mail to {self.student_id} ({self.month}) - {self.status}"
+
+
+class PromotionJob(models.Model):
+    """A batch promotion queued from Manage Semesters, run by the process_promotion_jobs command."""
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+    staff = models.ForeignKey(Staff, on_delete=models.SET_NULL, null=True, blank=True)
+    semester = models.PositiveIntegerField(help_text="Semester the students are promoted from")
+    roll_numbers = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    promoted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    @property
+    def progress(self):
+        return int(self.processed * 100 / self.total) if self.total else 100
+
+    def __str__(self):
+        return f"Promote Sem {self.semester} ({self.total} students) - {self.status}"
+
+
+class RiskSnapshot(models.Model):
+    """
+    Nightly copy of a student's risk metrics in one subject (see
+    staffs.risk and the snapshot_risk_metrics command). Rows are kept for
+    every student, not only those at risk, so movement between snapshots
+    can be shown.
+    """
+    snapshot_date = models.DateField()
+    student = models.ForeignKey('students.Student', on_delete=models.CASCADE, related_name='risk_snapshots')
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='risk_snapshots')
+    semester = models.PositiveIntegerField()
+    attendance_percentage = models.FloatField(default=0)
+    test1_marks = models.IntegerField(null=True, blank=True)
+    test2_marks = models.IntegerField(null=True, blank=True)
+    internal_marks = models.IntegerField(null=True, blank=True)
+    gpa_delta = models.FloatField(null=True, blank=True, help_text="Latest semester GPA minus the one before")
+    remark_count = models.PositiveIntegerField(default=0, help_text="Remarks in the recent window")
+    risk_factors = models.JSONField(default=list)
+    at_risk = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-snapshot_date', 'subject', 'student']
+        constraints = [
+            models.UniqueConstraint(fields=['snapshot_date', 'student', 'subject'], name='unique_risk_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['snapshot_date', 'subject', 'at_risk'], name='risk_snapshot_subject_idx'),
+            models.Index(fields=['snapshot_date', 'semester', 'at_risk'], name='risk_snapshot_semester_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.snapshot_date} - {self.student_id} - {self.subject_id}: {'At risk' if self.at_risk else 'OK'}"
@@ -0,0 +1,71 @@
+"""
+Active news feed for the home page and the staff and student dashboards.
+
+The news active today (is_active, within the optional start/end dates) is
+read with one query — covered by the news_active_window_idx index — and
+split into one list per audience, each item a plain dict with the "NEW"
+flag and document URL already resolved. The feed is cached per day, so it
+is rebuilt at the first request after midnight; saving or deleting News
+drops the cached feed (see staffs/signals.py).
+"""
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Audience -> News.target values shown to it (None: every target)
+AUDIENCE_TARGETS = {
+    'All': None,
+    'Staff': ('All', 'Staff', 'Student'),
+    'Student': ('All', 'Student'),
+}
+
+
+def _feed_key(today):
+    return f"news_feed:{today.isoformat()}"
+
+
+def _item(news):
+    return {
+        'id': news.id,
+        'content': news.content,
+        'link': news.link,
+        'date': news.date,
+        'target': news.target,
+        'document_url': news.document.url if news.document else '',
+        'is_new': news.should_show_new_indicator(),
+    }
+
+
+def build_news_feed(today):
+    """Returns {audience: [news item dict, ...]} for `today`, newest first."""
+    from .models import News
+
+    active = News.objects.filter(
+        Q(is_active=True) &
+        (Q(start_date__isnull=True) | Q(start_date__lte=today)) &
+        (Q(end_date__isnull=True) | Q(end_date__gte=today))
+    ).order_by('-date', '-id')
+    items = [_item(news) for news in active]
+    return {
+        audience: [item for item in items if targets is None or item['target'] in targets]
+        for audience, targets in AUDIENCE_TARGETS.items()
+    }
+
+
+def news_feed(audience):
+    """Today's news items for `audience` ('All', 'Staff' or 'Student')."""
+    today = timezone.now().date()
+    key = _feed_key(today)
+    feed = cache.get(key)
+    if feed is None:
+        feed = build_news_feed(today)
+        cache.set(key, feed, FEED_CACHE_TIMEOUT)
+    return feed[audience]
+
+
+def invalidate_news_feed():
+    """Drops today's cached feed after News changes."""
+    cache.delete(_feed_key(timezone.now().date()))
@@ -0,0 +1,206 @@
+"""
+Persistent outbox for parent notification emails.
+
+Views only enqueue rows here and return immediately; the
+`process_mail_outbox` management command drains the queue in batches over a
+single connection, retrying failures with exponential backoff and writing a
+MailLog row for everything that went out.
+"""
+import datetime
+import logging
+
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MailOutbox, MailLog
+from .utils import build_attendance_deficit_email
+
+
+logger = logging.getLogger(__name__)
+
+DEFICIT_REMARK = 'Attendance Deficit'
+
+MAX_ATTEMPTS = 5
+
+# Seconds to wait before retry n is 60 * 2**(n-1), capped at six hours
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+
+# How long a worker holds the mails it claimed before another worker may take them over
+CLAIM_TIMEOUT = datetime.timedelta(minutes=15)
+
+
+def retry_delay(attempts):
+    """Returns the backoff before the next attempt after `attempts` failures."""
+    return datetime.timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def enqueue_deficit_mails(staff, rows, month_name, year):
+    """
+    Queues one Attendance Deficit mail per row of get_attendance_rows() for
+    the month. Students whose parents were already alerted (or are already
+    queued) are skipped; previously failed mails are queued again.
+
+    Returns the number of newly queued mails.
+    """
+    rows = [row for row in rows if row['parent_email']]
+    if not rows:
+        return 0
+
+    rolls = [row['roll'] for row in rows]
+    sent = set(MailLog.objects.filter(
+        student__in=rolls, remark_type=DEFICIT_REMARK, month=month_name, year=str(year)
+    ).values_list('student', flat=True))
+    queued = dict(MailOutbox.objects.filter(
+        student__in=rolls, remark_type=DEFICIT_REMARK, month=month_name, year=str(year)
+    ).values_list('student', 'status'))
+
+    now = timezone.now()
+    to_create = []
+    to_retry = []
+    for row in rows:
+        if row['roll'] in sent:
+            continue
+        payload = {
+            'percentage': int(row['hours_percentage']),
+            'total_hours': int(row['total_hours']),
+            'attended_hours': int(row['present_hours']),
+            'staff_name': staff.name,
+        }
+        status = queued.get(row['roll'])
+        if status is None:
+            to_create.append(MailOutbox(
+                student_id=row['roll'],
+                staff=staff,
+                remark_type=DEFICIT_REMARK,
+                month=month_name,
+                year=str(year),
+                payload=payload,
+            ))
+        elif status == 'Failed':
+            to_retry.append(row['roll'])
+
+    with transaction.atomic():
+        # ignore_conflicts: a double click must not queue the same alert twice
+        MailOutbox.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_retry:
+            MailOutbox.objects.filter(
+                student__in=to_retry, remark_type=DEFICIT_REMARK, month=month_name, year=str(year), status='Failed'
+            ).update(status='Pending', attempts=0, next_attempt_at=now, last_error='')
+
+    return len(to_create) + len(to_retry)
+
+
+class MissingRecipient(Exception):
+    """The mail has nobody to go to (no parent email on file); retrying cannot help."""
+
+
+def build_message(item):
+    """Builds the email for an outbox row, or None if it can no longer be sent."""
+    if item.remark_type == DEFICIT_REMARK:
+        payload = item.payload
+        return build_attendance_deficit_email(
+            item.student,
+            item.month,
+            payload.get('percentage', 0),
+            payload.get('total_hours', 0),
+            payload.get('attended_hours', 0),
+            payload.get('staff_name') or (item.staff.name if item.staff else ''),
+        )
+    return None
+
+
+def claim_outbox_batch(batch_size=50, now=None):
+    """
+    Marks up to `batch_size` due mails as 'Sending' and commits, so no other
+    worker picks them up while they are sent outside any transaction.
+
+    Rows are locked with SKIP LOCKED only for the claim itself. Each claim
+    counts as an attempt and holds the row for CLAIM_TIMEOUT; a claim left
+    behind by a crashed worker becomes due again after that.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        batch = list(
+            MailOutbox.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status__in=['Pending', 'Sending'], next_attempt_at__lte=now)
+            .select_related('student__personalinfo', 'staff')
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        for item in batch:
+            item.status = 'Sending'
+            item.attempts += 1
+            item.next_attempt_at = now + CLAIM_TIMEOUT
+        MailOutbox.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at'])
+    return batch
+
+
+def _mark_failed(item, error, max_attempts, now, result, permanent=False):
+    """Schedules a retry for `item`, or gives up on it. Saves the row."""
+    item.last_error = str(error)
+    if permanent or item.attempts >= max_attempts:
+        item.status = 'Failed'
+        result['failed'] += 1
+    else:
+        item.status = 'Pending'
+        item.next_attempt_at = now + retry_delay(item.attempts)
+        result['retried'] += 1
+    item.save(update_fields=['status', 'next_attempt_at', 'last_error'])
+
+
+def process_outbox_batch(batch_size=50, max_attempts=MAX_ATTEMPTS, connection=None):
+    """
+    Claims up to `batch_size` due mails (see claim_outbox_batch) and sends
+    them over one connection, saving each row's outcome as soon as it is
+    known, so a failure later in the batch never re-sends what already went
+    out. If the connection cannot be opened the whole batch is backed off.
+
+    Returns a dict with 'sent', 'retried' and 'failed' counts.
+    """
+    result = {'sent': 0, 'retried': 0, 'failed': 0}
+    now = timezone.now()
+
+    batch = claim_outbox_batch(batch_size, now)
+    if not batch:
+        return result
+
+    connection = connection or get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open mail connection for {len(batch)} queued mails: {e}")
+        for item in batch:
+            _mark_failed(item, e, max_attempts, now, result)
+        return result
+
+    try:
+        for item in batch:
+            try:
+                message = build_message(item)
+                if message is None:
+                    raise MissingRecipient('No parent email on file')
+                message.connection = connection
+                connection.send_messages([message])
+            except Exception as e:
+                logger.error(f"Error sending queued mail {item.pk}: {e}")
+                _mark_failed(item, e, max_attempts, now, result, permanent=isinstance(e, MissingRecipient))
+                continue
+
+            item.status = 'Sent'
+            item.sent_at = timezone.now()
+            item.last_error = ''
+            with transaction.atomic():
+                item.save(update_fields=['status', 'sent_at', 'last_error'])
+                MailLog.objects.create(
+                    student_id=item.student_id,
+                    staff_id=item.staff_id,
+                    remark_type=item.remark_type,
+                    month=item.month,
+                    year=item.year,
+                )
+            result['sent'] += 1
+    finally:
+        connection.close()
+
+    return result
@@ -0,0 +1,192 @@
+"""
+Batch semester promotion.
+
+Archiving a semester (attendance % and internal marks per subject, grade
+points and the semester GPA in StudentGPA) is done for a whole cohort with a
+handful of grouped queries and bulk writes; grades come from each batch's
+GradingScheme and are assigned with one vectorized lookup per scheme.
+Promotion jobs run in chunks from the process_promotion_jobs command,
+reporting progress on the PromotionJob row. Re-running a job is safe: only students still in the job's semester are
+archived and promoted.
+"""
+import datetime
+from functools import partial
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from students.models import Student, StudentMarks, StudentGPA, AttendanceSummary
+from students.attendance import archive_student_attendance
+from students.grades import sync_subject_grades
+from students.grading import scheme_for_batch
+from students.cgpa import update_running_cgpa
+from .models import Subject, PromotionJob
+from .dashboard_counters import invalidate_dashboard_counters
+from ssm.principal import invalidate_students
+
+
+PROMOTION_CHUNK_SIZE = 50
+
+
+def archive_semester_batch(roll_numbers, semester):
+    """
+    Archives attendance and marks for all subjects of `semester` into each
+    student's StudentGPA record, for many students at once.
+
+    Uses one query each for students, subjects, attendance summaries, marks
+    and existing GPA records, then writes with bulk_create/bulk_update.
+    Returns the list of StudentGPA records written.
+    """
+    roll_numbers = list(roll_numbers)
+    if not roll_numbers:
+        return []
+
+    joining_years = dict(
+        Student.objects.filter(roll_number__in=roll_numbers).values_list('roll_number', 'joining_year')
+    )
+    subjects = list(Subject.objects.filter(semester=semester).order_by('id'))
+
+    attendance = {
+        (row['student'], row['subject']): (row['present_sum'] or 0, row['total_sum'] or 0)
+        for row in AttendanceSummary.objects.filter(
+            student__in=roll_numbers, subject__in=subjects
+        ).order_by().values('student', 'subject').annotate(present_sum=Sum('present'), total_sum=Sum('total'))
+    }
+    internals = {
+        (student_id, subject_id): internal or 0
+        for student_id, subject_id, internal in StudentMarks.objects.filter(
+            student__in=roll_numbers, subject__in=subjects
+        ).values_list('student_id', 'subject_id', 'internal_marks')
+    }
+    existing = {
+        record.student_id: record
+        for record in StudentGPA.objects.filter(student__in=roll_numbers, semester=semester)
+    }
+
+    # Students x subjects matrix of internal marks, graded per batch scheme
+    scores = np.array(
+        [[internals.get((roll, subject.id), 0) for subject in subjects] for roll in roll_numbers],
+        dtype=float,
+    ).reshape(len(roll_numbers), len(subjects))
+    credits = np.array([subject.credits for subject in subjects], dtype=float)
+    grades = np.empty(scores.shape, dtype=object)
+    points = np.zeros(scores.shape)
+    by_scheme = {}
+    for row, roll in enumerate(roll_numbers):
+        by_scheme.setdefault(scheme_for_batch(joining_years.get(roll)), []).append(row)
+    for scheme, rows in by_scheme.items():
+        grades[rows], points[rows] = scheme.grade_array(scores[rows])
+
+    total_sc = float(credits.sum())
+    gpas = np.round(points @ credits / total_sc, 2) if total_sc > 0 else np.zeros(len(roll_numbers))
+
+    archived_at = str(datetime.date.today())
+    to_create = []
+    to_update = []
+    for row, roll in enumerate(roll_numbers):
+        subject_data = []
+        for col, subject in enumerate(subjects):
+            present_classes, total_classes = attendance.get((roll, subject.id), (0, 0))
+            subject_data.append({
+                'code': subject.code,
+                'name': subject.name,
+                'credits': subject.credits,
+                'internal_marks': internals.get((roll, subject.id), 0),
+                'attendance_percentage': round((present_classes / total_classes) * 100, 1) if total_classes > 0 else 0.0,
+                'points': float(points[row, col]),
+                'grade': grades[row, col],
+                'archived_at': archived_at
+            })
+
+        gpa = float(gpas[row])
+        record = existing.get(roll)
+        if record is None:
+            to_create.append(StudentGPA(
+                student_id=roll, semester=semester, gpa=gpa, total_credits=total_sc, subject_data=subject_data
+            ))
+        else:
+            record.gpa = gpa
+            record.total_credits = total_sc
+            record.subject_data = subject_data
+            record.updated_at = timezone.now()
+            to_update.append(record)
+
+    with transaction.atomic():
+        StudentGPA.objects.bulk_create(to_create)
+        StudentGPA.objects.bulk_update(to_update, ['gpa', 'total_credits', 'subject_data', 'updated_at'])
+        records = to_create + to_update
+        if to_create and to_create[0].pk is None:
+            # Backends without RETURNING on bulk inserts: reload the new rows for their ids
+            records = to_update + list(StudentGPA.objects.filter(
+                student__in=[record.student_id for record in to_create], semester=semester
+            ))
+        sync_subject_grades(records)
+        update_running_cgpa(roll_numbers)
+    return records
+
+
+def promote_batch(roll_numbers, semester):
+    """
+    Archives and promotes the given students of `semester` in one
+    transaction. Students no longer in `semester` (e.g. already promoted by an
+    earlier run) are skipped. Returns the number of students promoted.
+    """
+    with transaction.atomic():
+        rolls = list(
+            Student.objects.select_for_update().filter(
+                roll_number__in=list(roll_numbers), current_semester=semester, current_semester__lte=8
+            ).values_list('roll_number', flat=True)
+        )
+        if not rolls:
+            return 0
+        archive_semester_batch(rolls, semester)
+        # Move the closed semester's raw attendance to cold storage
+        archive_student_attendance(rolls, semester)
+        # .update() sends no signals, so drop the semester counts explicitly
+        transaction.on_commit(lambda: invalidate_dashboard_counters('students'))
+        transaction.on_commit(partial(invalidate_students, rolls))
+        return Student.objects.filter(roll_number__in=rolls, current_semester=semester).update(
+            current_semester=F('current_semester') + 1
+        )
+
+
+def run_promotion_job(job, chunk_size=PROMOTION_CHUNK_SIZE):
+    """Runs a PromotionJob chunk by chunk, saving progress after each chunk."""
+    job.status = 'Running'
+    job.started_at = job.started_at or timezone.now()
+    job.total = len(job.roll_numbers)
+    job.processed = 0
+    job.promoted = 0
+    job.error = ''
+    job.save(update_fields=['status', 'started_at', 'total', 'processed', 'promoted', 'error'])
+
+    try:
+        for start in range(0, job.total, chunk_size):
+            chunk = job.roll_numbers[start:start + chunk_size]
+            job.promoted += promote_batch(chunk, job.semester)
+            job.processed += len(chunk)
+            job.save(update_fields=['processed', 'promoted'])
+    except Exception as e:
+        job.status = 'Failed'
+        job.error = str(e)
+    else:
+        job.status = 'Done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def claim_next_job():
+    """Marks the oldest pending job as running and returns it (None if the queue is empty)."""
+    with transaction.atomic():
+        job = (
+            PromotionJob.objects.select_for_update(skip_locked=True)
+            .filter(status='Pending').order_by('created_at').first()
+        )
+        if job is not None:
+            job.status = 'Running'
+            job.started_at = timezone.now()
+            job.save(update_fields=['status', 'started_at'])
+    return job
@@ -0,0 +1,307 @@
+"""
+At-risk student engine for the risk_students page and its CSV export.
+
+Risk is computed for many subjects at once: the students of the subjects'
+semesters, their marks and their attendance totals (overall and for the
+current month) are each fetched with one grouped query and combined in a
+pandas frame, where every threshold and trend check is a vectorized column
+comparison. The number of queries does not depend on how many subjects or
+students are analysed.
+
+The snapshot_risk_metrics command stores the frame nightly in RiskSnapshot
+(see take_risk_snapshot), so the risk page reads one indexed snapshot and
+compares it with the one from a week earlier (see snapshot_risk_metrics).
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Max, Q, Sum
+
+from students.models import Student, StudentMarks, AttendanceSummary, StudentGPA, StudentRemark
+
+
+RISK_ATTENDANCE_THRESHOLD = 75
+RISK_INTERNAL_THRESHOLD = 40
+RISK_TEST_THRESHOLD = 20
+# Trend flags: a drop of this many marks/percentage points
+RISK_TREND_DROP = 10
+# Latest semester GPA this far below the previous one
+RISK_GPA_DROP = 1.0
+# Remarks within the last REMARK_WINDOW_DAYS days
+RISK_REMARK_COUNT = 3
+REMARK_WINDOW_DAYS = 90
+
+# Snapshots are compared with the latest one at least this old
+SNAPSHOT_COMPARE_DAYS = 7
+
+# Flag column -> label shown in risk_factors, in display order
+RISK_FACTORS = {
+    'low_attendance': 'Low Attendance',
+    'low_internal': 'Low Internal Marks',
+    'low_test1': 'Low Mid-Term 1',
+    'low_test2': 'Low Mid-Term 2',
+    'declining_marks': 'Declining Marks',
+    'attendance_dropping': 'Attendance Dropping',
+    'gpa_dropping': 'GPA Dropping',
+    'frequent_remarks': 'Frequent Remarks',
+}
+
+MARK_COLUMNS = ['test1_marks', 'test2_marks', 'internal_marks']
+ATTENDANCE_COLUMNS = ['present', 'total', 'month_present', 'month_total']
+
+
+def student_trends(semesters, today=None):
+    """
+    Per student of `semesters`: 'gpa_delta' (latest semester GPA minus the
+    previous one, NaN with fewer than two) and 'remark_count' (remarks in the
+    last REMARK_WINDOW_DAYS days). Two queries; indexed by roll number.
+    """
+    today = today or datetime.date.today()
+    gpas = pd.DataFrame.from_records(
+        list(StudentGPA.objects.filter(student__current_semester__in=semesters)
+             .values_list('student_id', 'semester', 'gpa')),
+        columns=['roll_number', 'semester', 'gpa'],
+    ).sort_values(['roll_number', 'semester'])
+    gpas['gpa_delta'] = gpas.groupby('roll_number')['gpa'].diff()
+    remarks = pd.DataFrame.from_records(
+        list(StudentRemark.objects.filter(
+            student__current_semester__in=semesters,
+            incident_date__gte=today - datetime.timedelta(days=REMARK_WINDOW_DAYS),
+        ).order_by().values('student').annotate(count=Count('id')).values_list('student', 'count')),
+        columns=['roll_number', 'remark_count'],
+    ).astype({'remark_count': 'int64'}).set_index('roll_number')
+    trends = gpas.groupby('roll_number')[['gpa_delta']].last().join(remarks, how='outer')
+    trends['gpa_delta'] = trends['gpa_delta'].astype('float64').round(2)
+    trends['remark_count'] = trends['remark_count'].fillna(0).astype('int64')
+    return trends
+
+
+def risk_frame(subjects, month=None, today=None):
+    """
+    Builds one row per (student, subject) for the students currently in each
+    subject's semester, with marks, attendance percentages, GPA delta, remark
+    count and one boolean column per RISK_FACTORS flag. `month` (first day,
+    default: the month of `today`) is compared against the overall attendance
+    for the trend flag.
+    """
+    subjects = list(subjects)
+    today = today or datetime.date.today()
+    month = month or today.replace(day=1)
+    subject_ids = [subject.id for subject in subjects]
+    semesters = {subject.semester for subject in subjects}
+
+    subject_frame = pd.DataFrame(
+        [(subject.id, subject.semester) for subject in subjects], columns=['subject_id', 'semester']
+    )
+    student_frame = pd.DataFrame.from_records(
+        list(Student.objects.filter(current_semester__in=semesters)
+             .values_list('roll_number', 'student_name', 'current_semester')),
+        columns=['roll_number', 'name', 'semester'],
+    )
+    frame = student_frame.merge(subject_frame, on='semester')
+
+    marks = pd.DataFrame.from_records(
+        list(StudentMarks.objects.filter(subject__in=subject_ids).values_list('student_id', 'subject_id', *MARK_COLUMNS)),
+        columns=['roll_number', 'subject_id'] + MARK_COLUMNS,
+    )
+    attendance = pd.DataFrame.from_records(
+        list(AttendanceSummary.objects.filter(subject__in=subject_ids).order_by().values('student', 'subject').annotate(
+            present_sum=Sum('present'),
+            total_sum=Sum('total'),
+            month_present_sum=Sum('present', filter=Q(month=month)),
+            month_total_sum=Sum('total', filter=Q(month=month)),
+        ).values_list('student', 'subject', 'present_sum', 'total_sum', 'month_present_sum', 'month_total_sum')),
+        columns=['roll_number', 'subject_id'] + ATTENDANCE_COLUMNS,
+    ).astype(dict.fromkeys(ATTENDANCE_COLUMNS, 'float64'))  # numeric even with no rows, month sums may be NULL
+    frame = frame.merge(marks, on=['roll_number', 'subject_id'], how='left')
+    frame = frame.merge(attendance, on=['roll_number', 'subject_id'], how='left')
+    frame = frame.merge(student_trends(semesters, today), left_on='roll_number', right_index=True, how='left')
+    frame['remark_count'] = frame['remark_count'].fillna(0).astype('int64')
+    frame[ATTENDANCE_COLUMNS] = frame[ATTENDANCE_COLUMNS].fillna(0).astype('int64')
+    for column in MARK_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce')
+
+    total = frame['total'].to_numpy()
+    month_total = frame['month_total'].to_numpy()
+    frame['attendance_percentage'] = np.where(
+        total > 0, np.round(frame['present'].to_numpy() * 100 / np.maximum(total, 1), 1), 0.0
+    )
+    month_percentage = np.where(month_total > 0, frame['month_present'].to_numpy() * 100 / np.maximum(month_total, 1), 0.0)
+
+    # Missing marks never count as low (NaN comparisons are False)
+    frame['low_attendance'] = (total > 0) & (frame['attendance_percentage'] < RISK_ATTENDANCE_THRESHOLD)
+    frame['low_internal'] = frame['internal_marks'] < RISK_INTERNAL_THRESHOLD
+    frame['low_test1'] = frame['test1_marks'] < RISK_TEST_THRESHOLD
+    frame['low_test2'] = frame['test2_marks'] < RISK_TEST_THRESHOLD
+    frame['declining_marks'] = frame['test2_marks'] <= frame['test1_marks'] - RISK_TREND_DROP
+    frame['attendance_dropping'] = (month_total > 0) & (month_total < total) & (
+        month_percentage <= frame['attendance_percentage'].to_numpy() - RISK_TREND_DROP
+    )
+    frame['gpa_dropping'] = frame['gpa_delta'] <= -RISK_GPA_DROP
+    frame['frequent_remarks'] = frame['remark_count'] >= RISK_REMARK_COUNT
+    frame['at_risk'] = frame[list(RISK_FACTORS)].any(axis=1)
+    return frame
+
+
+def _display(value):
+    return '-' if pd.isna(value) else int(value)
+
+
+def _nullable(value, cast=int):
+    return None if pd.isna(value) else cast(value)
+
+
+def _factor_labels(flags):
+    return [label for label, flagged in zip(RISK_FACTORS.values(), flags) if flagged]
+
+
+def get_risk_metrics_for_subjects(subjects, month=None):
+    """
+    Returns {subject_id: [student dict, ...]} with only the at-risk students of
+    each subject, ordered by roll number. Each dict has name, roll_number,
+    current_semester, attendance_percentage, internal_marks, test1_marks,
+    test2_marks ('-' when not entered), gpa_delta, remark_count and
+    risk_factors (list of labels).
+    """
+    subjects = list(subjects)
+    if not subjects:
+        return {}
+    frame = risk_frame(subjects, month)
+    frame = frame[frame['at_risk']].sort_values(['subject_id', 'roll_number'])
+
+    flags = frame[list(RISK_FACTORS)].to_numpy()
+    results = {}
+    for row, row_flags in zip(frame.itertuples(index=False), flags):
+        results.setdefault(row.subject_id, []).append({
+            'name': row.name,
+            'roll_number': row.roll_number,
+            'current_semester': row.semester,
+            'attendance_percentage': float(row.attendance_percentage),
+            'internal_marks': _display(row.internal_marks),
+            'test1_marks': _display(row.test1_marks),
+            'test2_marks': _display(row.test2_marks),
+            'gpa_delta': _nullable(row.gpa_delta, float),
+            'remark_count': int(row.remark_count),
+            'risk_factors': _factor_labels(row_flags),
+        })
+    return results
+
+
+def get_risk_metrics(subject, month=None):
+    """At-risk students of one subject (see get_risk_metrics_for_subjects)."""
+    return get_risk_metrics_for_subjects([subject], month).get(subject.id, [])
+
+
+def take_risk_snapshot(snapshot_date=None, dry_run=False):
+    """
+    Computes risk for every subject and stores one RiskSnapshot row per
+    (student, subject) for `snapshot_date` (default: today). Re-running on
+    the same date overwrites that day's rows. Returns (rows, at_risk) counts.
+    """
+    from .models import Subject, RiskSnapshot
+
+    snapshot_date = snapshot_date or datetime.date.today()
+    subjects = list(Subject.objects.all())
+    if not subjects:
+        return 0, 0
+    frame = risk_frame(subjects, today=snapshot_date)
+    if dry_run:
+        return len(frame), int(frame['at_risk'].sum())
+
+    flags = frame[list(RISK_FACTORS)].to_numpy()
+    snapshots = [
+        RiskSnapshot(
+            snapshot_date=snapshot_date,
+            student_id=row.roll_number,
+            subject_id=row.subject_id,
+            semester=row.semester,
+            attendance_percentage=float(row.attendance_percentage),
+            test1_marks=_nullable(row.test1_marks),
+            test2_marks=_nullable(row.test2_marks),
+            internal_marks=_nullable(row.internal_marks),
+            gpa_delta=_nullable(row.gpa_delta, float),
+            remark_count=int(row.remark_count),
+            risk_factors=_factor_labels(row_flags),
+            at_risk=bool(row.at_risk),
+        )
+        for row, row_flags in zip(frame.itertuples(index=False), flags)
+    ]
+    RiskSnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['snapshot_date', 'student', 'subject'],
+        update_fields=[
+            'semester', 'attendance_percentage', 'test1_marks', 'test2_marks', 'internal_marks',
+            'gpa_delta', 'remark_count', 'risk_factors', 'at_risk',
+        ],
+    )
+    return len(snapshots), int(frame['at_risk'].sum())
+
+
+def snapshot_risk_metrics(subjects):
+    """
+    Reads the at-risk students of `subjects` from the latest RiskSnapshot and
+    compares them with the latest snapshot at least SNAPSHOT_COMPARE_DAYS
+    older. Returns None when no snapshot exists, otherwise a dict with
+    'snapshot_date', 'previous_date' (or None), 'students' ({subject_id:
+    [student dict as in get_risk_metrics_for_subjects, plus
+    'attendance_change' and 'is_new']}) and 'recovered' ({subject_id: number
+    of students at risk before but not any more}).
+    """
+    from .models import RiskSnapshot
+
+    snapshot_date = RiskSnapshot.objects.aggregate(latest=Max('snapshot_date'))['latest']
+    if snapshot_date is None:
+        return None
+    previous_date = RiskSnapshot.objects.filter(
+        snapshot_date__lte=snapshot_date - datetime.timedelta(days=SNAPSHOT_COMPARE_DAYS)
+    ).aggregate(latest=Max('snapshot_date'))['latest']
+
+    subject_ids = [subject.id for subject in subjects]
+    current = list(RiskSnapshot.objects.filter(
+        snapshot_date=snapshot_date, subject__in=subject_ids, at_risk=True
+    ).select_related('student').only(
+        'student__student_name', 'student__current_semester', 'subject_id', 'attendance_percentage',
+        'test1_marks', 'test2_marks', 'internal_marks', 'gpa_delta', 'remark_count', 'risk_factors',
+    ).order_by('subject_id', 'student_id'))
+
+    previous = {}
+    if previous_date is not None:
+        # Last week's at-risk rows, plus any row of a student at risk now
+        rows = RiskSnapshot.objects.filter(snapshot_date=previous_date, subject__in=subject_ids).filter(
+            Q(at_risk=True) | Q(student__in={snapshot.student_id for snapshot in current})
+        ).values_list('student_id', 'subject_id', 'attendance_percentage', 'at_risk')
+        previous = {(roll, subject_id): (attendance, at_risk) for roll, subject_id, attendance, at_risk in rows}
+
+    students = {}
+    for snapshot in current:
+        before = previous.get((snapshot.student_id, snapshot.subject_id))
+        students.setdefault(snapshot.subject_id, []).append({
+            'name': snapshot.student.student_name,
+            'roll_number': snapshot.student_id,
+            'current_semester': snapshot.student.current_semester,
+            'attendance_percentage': snapshot.attendance_percentage,
+            'internal_marks': '-' if snapshot.internal_marks is None else snapshot.internal_marks,
+            'test1_marks': '-' if snapshot.test1_marks is None else snapshot.test1_marks,
+            'test2_marks': '-' if snapshot.test2_marks is None else snapshot.test2_marks,
+            'gpa_delta': snapshot.gpa_delta,
+            'remark_count': snapshot.remark_count,
+            'risk_factors': snapshot.risk_factors,
+            'attendance_change': None if before is None else round(snapshot.attendance_percentage - before[0], 1),
+            'is_new': previous_date is not None and not (before and before[1]),
+        })
+
+    still_at_risk = {(snapshot.student_id, snapshot.subject_id) for snapshot in current}
+    recovered = {}
+    for pair, (_, at_risk) in previous.items():
+        if at_risk and pair not in still_at_risk:
+            recovered[pair[1]] = recovered.get(pair[1], 0) + 1
+
+    return {
+        'snapshot_date': snapshot_date,
+        'previous_date': previous_date,
+        'students': students,
+        'recovered': recovered,
+    }
@@ -0,0 +1,97 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Timetable, Subject, Staff, StaffLeaveRequest, News
+from .attendance_grid import bump_timetable_version
+from .dashboard_counters import invalidate_dashboard_counters
+from .decorators import bump_subject_access
+from .news_feed import invalidate_news_feed
+from students.models import Student, LeaveRequest, BonafideRequest
+from students.semester_sheet import bump_semester_sheets
+from ssm.principal import invalidate_staff, invalidate_students
+
+
+@receiver(pre_save, sender=Timetable)
+def store_previous_timetable_subject(sender, instance, **kwargs):
+    # A period can be moved to another subject, so both schedules change
+    instance._old_subject_id = None
+    if instance.pk:
+        instance._old_subject_id = Timetable.objects.filter(pk=instance.pk).values_list('subject_id', flat=True).first()
+
+@receiver(post_save, sender=Timetable)
+@receiver(post_delete, sender=Timetable)
+def invalidate_attendance_grid(sender, instance, **kwargs):
+    for subject_id in {instance.subject_id, getattr(instance, '_old_subject_id', None)}:
+        if subject_id:
+            transaction.on_commit(partial(bump_timetable_version, subject_id))
+
+
+@receiver(pre_save, sender=Subject)
+def store_previous_subject_semester(sender, instance, **kwargs):
+    instance._old_semester, instance._old_staff_id = None, None
+    if instance.pk:
+        previous = Subject.objects.filter(pk=instance.pk).values_list('semester', 'staff_id').first()
+        if previous:
+            instance._old_semester, instance._old_staff_id = previous
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_semester_sheets(sender, instance, **kwargs):
+    for semester in {instance.semester, getattr(instance, '_old_semester', None)}:
+        if semester:
+            transaction.on_commit(partial(bump_semester_sheets, semester))
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_subject_access(sender, instance, created=False, **kwargs):
+    # Moving a subject to another staff member or semester changes who can open it
+    old = (getattr(instance, '_old_semester', None), getattr(instance, '_old_staff_id', None))
+    if created or kwargs['signal'] is post_delete or old != (instance.semester, instance.staff_id):
+        transaction.on_commit(bump_subject_access)
+
+
+@receiver(pre_save, sender=Staff)
+def store_previous_staff_role(sender, instance, **kwargs):
+    instance._old_access = None
+    if instance.pk:
+        instance._old_access = Staff.objects.filter(pk=instance.pk).values_list('role', 'assigned_semester').first()
+
+@receiver(post_save, sender=Staff)
+def invalidate_staff_subject_access(sender, instance, **kwargs):
+    if getattr(instance, '_old_access', None) != (instance.role, instance.assigned_semester):
+        transaction.on_commit(bump_subject_access)
+
+
+# Model -> staff dashboard counter group (see staffs.dashboard_counters)
+DASHBOARD_COUNTER_GROUPS = {
+    Student: 'students',
+    LeaveRequest: 'leaves',
+    StaffLeaveRequest: 'staff_leaves',
+    BonafideRequest: 'bonafide',
+}
+
+def invalidate_counters(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_dashboard_counters, DASHBOARD_COUNTER_GROUPS[sender]))
+
+for model in DASHBOARD_COUNTER_GROUPS:
+    post_save.connect(invalidate_counters, sender=model, dispatch_uid=f'dashboard_counters_save_{model.__name__}')
+    post_delete.connect(invalidate_counters, sender=model, dispatch_uid=f'dashboard_counters_delete_{model.__name__}')
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def invalidate_news(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_news_feed)
+
+
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def invalidate_staff_principal(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_staff, instance.pk))
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def invalidate_student_principal(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_students, [instance.pk]))
@@ -1,3 +1,855 @@
-from django.test import TestCase
+import datetime
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.messages import get_messages
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends import locmem
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from students.models import (
+    ArchivedAttendance, AttendanceSummary, AttendanceSyncReceipt, LeaveRequest, PersonalInfo, Student, StudentAttendance,
+    StudentGPA, StudentMarks, StudentRemark,
+)
+from students.attendance import save_attendance_sheets
+from students.grades import sync_subject_grades
+from students.semester_sheet import sheet_cache_key
+
+from .attendance_sync import sync_attendance_sheets
+from .dashboard_counters import dashboard_counters, invalidate_dashboard_counters
+from .deficit import get_attendance_deficits, get_attendance_rows
+from .news_feed import news_feed
+from .promotion import claim_next_job, run_promotion_job
+from .risk import (
+    RISK_FACTORS, get_risk_metrics, get_risk_metrics_for_subjects, risk_frame, snapshot_risk_metrics, take_risk_snapshot,
+)
+from .analytics import department_report, report_frames
+from .attendance_grid import calendar_rows, month_grid, subject_schedule, timetable_version
+from .models import MailLog, MailOutbox, News, PromotionJob, RiskSnapshot, Staff, Subject, Timetable
+from .outbox import (
+    CLAIM_TIMEOUT, MAX_ATTEMPTS, claim_outbox_batch, enqueue_deficit_mails, process_outbox_batch, retry_delay,
+)
+
+
+class StaffRequiredTests(TestCase):
+    """@staff_required: login, role and subject access checks on real views."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hod = cls.create_staff('HOD1', 'HOD')
+        cls.teacher = cls.create_staff('CI1', 'Course Incharge')
+        cls.other_teacher = cls.create_staff('CI2', 'Course Incharge')
+        cls.class_incharge = cls.create_staff('CL1', 'Class Incharge', assigned_semester=3)
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=cls.teacher)
+        cls.other_subject = Subject.objects.create(name='Networks', code='CS501', semester=5, staff=cls.other_teacher)
+
+    @staticmethod
+    def create_staff(staff_id, role, assigned_semester=None):
+        return Staff.objects.create(
+            staff_id=staff_id, name=staff_id, email=f'{staff_id.lower()}@example.com', role=role,
+            assigned_semester=assigned_semester, salutation='Dr.', designation='Professor',
+            qualification='PhD', specialization='CS',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def login(self, staff):
+        session = self.client.session
+        session['staff_id'] = staff.staff_id
+        session.save()
+
+    def assertDenied(self, response, url_name, message):
+        self.assertRedirects(response, reverse(url_name), fetch_redirect_response=False)
+        self.assertIn(message, [str(m) for m in get_messages(response.wsgi_request)])
+
+    # Login
+
+    def test_anonymous_is_redirected_to_login(self):
+        response = self.client.get(reverse('staffs:manage_subjects'))
+        self.assertRedirects(response, reverse('staffs:stafflogin'), fetch_redirect_response=False)
+
+    def test_anonymous_api_gets_401(self):
+        response = self.client.post(reverse('staffs:attendance_sync_api'), '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deleted_staff_session_is_redirected_to_login(self):
+        staff = self.create_staff('GONE', 'HOD')
+        self.login(staff)
+        staff.delete()
+        response = self.client.get(reverse('staffs:manage_subjects'))
+        self.assertRedirects(response, reverse('staffs:stafflogin'), fetch_redirect_response=False)
+
+    # roles=
+
+    def test_wrong_role_is_denied(self):
+        self.login(self.teacher)
+        response = self.client.get(reverse('staffs:manage_subjects'))
+        self.assertDenied(response, 'staffs:staff_dashboard', "Access Denied: Only HOD can manage courses.")
+
+    def test_hod_opens_role_restricted_view(self):
+        self.login(self.hod)
+        response = self.client.get(reverse('staffs:manage_subjects'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['current_staff'], self.hod)
+
+    # scope='assigned'
+
+    def test_subject_outside_assigned_set_is_denied(self):
+        self.login(self.teacher)
+        response = self.client.get(reverse('staffs:attendance_report', args=[self.other_subject.id]))
+        self.assertDenied(response, 'staffs:staff_dashboard', "Access Denied: You are not assigned to this subject.")
+
+    def test_assigned_subject_is_allowed(self):
+        self.login(self.teacher)
+        response = self.client.get(reverse('staffs:attendance_report', args=[self.subject.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_class_incharge_is_not_assigned_to_class_subjects(self):
+        self.login(self.class_incharge)
+        response = self.client.get(reverse('staffs:attendance_report', args=[self.subject.id]))
+        self.assertDenied(response, 'staffs:staff_dashboard', "Access Denied: You are not assigned to this subject.")
+
+    def test_hod_opens_any_subject(self):
+        self.login(self.hod)
+        response = self.client.get(reverse('staffs:attendance_report', args=[self.other_subject.id]))
+        self.assertEqual(response.status_code, 200)
+
+    # No scope
+
+    def test_any_staff_exports_marks(self):
+        for staff in (self.hod, self.teacher, self.class_incharge, self.other_teacher):
+            with self.subTest(staff.role):
+                self.login(staff)
+                response = self.client.get(reverse('staffs:export_marks_csv', args=[self.subject.id]))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content).splitlines()[0], b'Roll Number,Student Name')
+
+    # scope='class'
+
+    def test_class_incharge_opens_semester_subjects(self):
+        self.login(self.class_incharge)
+        response = self.client.get(reverse('staffs:export_risk_list', args=[self.subject.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_subject_outside_class_set_is_denied(self):
+        self.login(self.class_incharge)
+        response = self.client.get(reverse('staffs:export_risk_list', args=[self.other_subject.id]))
+        self.assertDenied(response, 'staffs:risk_students', "Access Denied.")
+
+    def test_reassigned_subject_access_is_refreshed(self):
+        self.login(self.teacher)
+        url = reverse('staffs:attendance_report', args=[self.other_subject.id])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.other_subject.staff = self.teacher
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_subject.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    # request.staff
+
+    def test_edit_profile_keeps_fields_written_elsewhere(self):
+        self.login(self.teacher)
+        self.client.get(reverse('staffs:staff_profile'))
+        # Written without signals, so the cached principal still has the old role
+        Staff.objects.filter(pk=self.teacher.pk).update(role='Class Incharge', assigned_semester=3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('staffs:staff_edit_profile'), {'address': 'Campus', 'qualification': 'PhD'})
+
+        staff = Staff.objects.get(pk=self.teacher.pk)
+        self.assertEqual((staff.address, staff.role, staff.assigned_semester), ('Campus', 'Class Incharge', 3))
+        response = self.client.get(reverse('staffs:staff_profile'))
+        self.assertEqual(response.wsgi_request.staff.address, 'Campus')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class MailOutboxTests(TestCase):
+    """Parent alerts are claimed, sent one by one and retried with backoff."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(
+            staff_id='CL1', name='Incharge', email='cl1@example.com', role='Class Incharge', assigned_semester=3,
+        )
+        cls.student = Student.objects.create(
+            roll_number='R100', student_name='Student', student_email='r100@example.com', password='x', current_semester=3,
+        )
+        PersonalInfo.objects.create(student=cls.student, gender='Male', student_mobile='9999999999', parent_email='parent@example.com')
+        cls.no_parent = Student.objects.create(
+            roll_number='R101', student_name='Orphan', student_email='r101@example.com', password='x', current_semester=3,
+        )
+
+    def queue(self, student, **fields):
+        return MailOutbox.objects.create(
+            student=student, staff=self.staff, month='January', year='2026', payload={'percentage': 60}, **fields
+        )
+
+    def deficit_row(self, student):
+        return {
+            'roll': student.roll_number, 'parent_email': 'parent@example.com',
+            'hours_percentage': 60, 'total_hours': 20, 'present_hours': 12,
+        }
+
+    def test_sends_and_logs(self):
+        item = self.queue(self.student)
+        self.assertEqual(process_outbox_batch(), {'sent': 1, 'retried': 0, 'failed': 0})
+
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), ('Sent', 1))
+        self.assertIsNotNone(item.sent_at)
+        self.assertEqual(mail.outbox[0].to, ['parent@example.com'])
+        self.assertTrue(MailLog.objects.filter(student=self.student, month='January', year='2026').exists())
+
+    def test_missing_recipient_fails_permanently(self):
+        item = self.queue(self.no_parent)
+        self.assertEqual(process_outbox_batch(), {'sent': 0, 'retried': 0, 'failed': 1})
+
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), ('Failed', 1))
+        self.assertEqual(item.last_error, 'No parent email on file')
+        self.assertEqual(mail.outbox, [])
+
+    def test_send_error_is_retried_with_backoff(self):
+        item = self.queue(self.student)
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=OSError('timeout')):
+            before = timezone.now()
+            self.assertEqual(process_outbox_batch(), {'sent': 0, 'retried': 1, 'failed': 0})
+
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts, item.last_error), ('Pending', 1, 'timeout'))
+        self.assertGreaterEqual(item.next_attempt_at, before + retry_delay(1))
+        # Not due yet
+        self.assertEqual(process_outbox_batch(), {'sent': 0, 'retried': 0, 'failed': 0})
+
+    def test_gives_up_after_max_attempts(self):
+        item = self.queue(self.student, attempts=MAX_ATTEMPTS - 1)
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', side_effect=OSError('timeout')):
+            self.assertEqual(process_outbox_batch(), {'sent': 0, 'retried': 0, 'failed': 1})
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), ('Failed', MAX_ATTEMPTS))
+
+    def test_failed_open_backs_off_whole_batch(self):
+        items = [self.queue(self.student), self.queue(self.no_parent)]
+        with mock.patch.object(locmem.EmailBackend, 'open', side_effect=OSError('unreachable')):
+            self.assertEqual(process_outbox_batch(), {'sent': 0, 'retried': 2, 'failed': 0})
+
+        for item in items:
+            item.refresh_from_db()
+            self.assertEqual((item.status, item.attempts, item.last_error), ('Pending', 1, 'unreachable'))
+            self.assertGreater(item.next_attempt_at, timezone.now())
+
+    def test_claimed_rows_are_skipped_until_the_claim_expires(self):
+        item = self.queue(self.student)
+        claimed = claim_outbox_batch()
+        self.assertEqual([row.pk for row in claimed], [item.pk])
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), ('Sending', 1))
+        self.assertEqual(claim_outbox_batch(), [])
+
+        # A worker that crashed mid-batch leaves the claim behind
+        later = timezone.now() + CLAIM_TIMEOUT + datetime.timedelta(seconds=1)
+        self.assertEqual([row.pk for row in claim_outbox_batch(now=later)], [item.pk])
+
+    def test_enqueue_skips_sent_and_queued_alerts_of_the_same_year_only(self):
+        MailLog.objects.create(student=self.student, staff=self.staff, month='January', year='2025')
+        self.assertEqual(enqueue_deficit_mails(self.staff, [self.deficit_row(self.student)], 'January', 2026), 1)
+        # Double click
+        self.assertEqual(enqueue_deficit_mails(self.staff, [self.deficit_row(self.student)], 'January', 2026), 0)
+
+        MailLog.objects.create(student=self.student, staff=self.staff, month='January', year='2027')
+        self.assertEqual(enqueue_deficit_mails(self.staff, [self.deficit_row(self.student)], 'January', 2027), 0)
+        self.assertEqual(MailOutbox.objects.filter(student=self.student).count(), 1)
+
+    def test_enqueue_requeues_failed_alerts(self):
+        item = self.queue(self.student, status='Failed', attempts=MAX_ATTEMPTS)
+        self.assertEqual(enqueue_deficit_mails(self.staff, [self.deficit_row(self.student)], 'January', 2026), 1)
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.attempts), ('Pending', 0))
+
+
+
+class AttendanceReportTests(TestCase):
+    """attendance_report counts the whole class in grouped queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(staff_id='CI1', name='Teacher', email='ci1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=cls.staff)
+        present_days = {'R1': 4, 'R2': 3, 'R3': 1}
+        for roll in present_days:
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=3)
+        save_attendance_sheets([
+            (cls.subject, datetime.date(2026, 1, day), datetime.time(9), None,
+             {roll: 'Present' if day <= present else 'Absent' for roll, present in present_days.items()})
+            for day in range(1, 5)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        session = self.client.session
+        session['staff_id'] = self.staff.staff_id
+        session.save()
+
+    def report(self, **params):
+        response = self.client.get(reverse('staffs:attendance_report', args=[self.subject.id]), params)
+        return response.context
+
+    def test_counts_and_categories(self):
+        context = self.report()
+        self.assertEqual(
+            [(row['student'].roll_number, row['present'], row['absent'], row['percentage'], row['category']) for row in context['summary_data']],
+            [('R1', 4, 0, 100.0, 'safe'), ('R2', 3, 1, 75.0, 'safe'), ('R3', 1, 3, 25.0, 'critical')],
+        )
+        self.assertEqual((context['stats']['safe'], context['stats']['critical'], context['stats']['avg_attendance']), (2, 1, 66.7))
+
+    def test_date_range_counts_raw_rows(self):
+        context = self.report(start_date='2026-01-02', end_date='2026-01-03')
+        self.assertEqual(context['total_working_days'], 2)
+        self.assertEqual([(row['present'], row['absent']) for row in context['summary_data']], [(2, 0), (2, 0), (0, 2)])
+
+    def test_query_count_does_not_grow_with_class_size(self):
+        self.report()
+        with CaptureQueriesContext(connection) as small:
+            self.report(start_date='2026-01-01', end_date='2026-01-31')
+        for roll in ('R4', 'R5', 'R6'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=3)
+        with self.assertNumQueries(len(small)):
+            self.report(start_date='2026-01-01', end_date='2026-01-31')
+
+
+
+class AttendanceDeficitTests(TestCase):
+    """Monthly deficits are computed for the whole semester, weighting Lab sessions by hours."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='CI1', name='Teacher', email='ci1@example.com', role='Course Incharge')
+        theory = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        lab = Subject.objects.create(name='Algorithms Lab', code='CS311', semester=3, staff=staff, subject_type='Lab')
+        for roll in ('R1', 'R2', 'R3'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=3)
+        save_attendance_sheets([
+            (theory, datetime.date(2026, 1, 5), datetime.time(9), None, {'R1': 'Present', 'R2': 'Present'}),
+            (theory, datetime.date(2026, 1, 6), datetime.time(9), None, {'R1': 'Present', 'R2': 'Present'}),
+            (theory, datetime.date(2026, 1, 7), datetime.time(9), None, {'R1': 'Absent', 'R2': 'Present'}),
+            (lab, datetime.date(2026, 1, 8), datetime.time(9), None, {'R1': 'Present', 'R2': 'Absent'}),
+        ])
+
+    def test_session_and_hour_percentages(self):
+        rows = get_attendance_rows(3, 2026, 1)
+        self.assertEqual(
+            [(row['roll'], row['present'], row['total'], row['percentage'], row['present_hours'], row['total_hours'], row['hours_percentage']) for row in rows],
+            [('R1', 3, 4, 75, 5, 6, 83), ('R2', 3, 4, 75, 3, 6, 50), ('R3', 0, 0, 0, 0, 0, 0)],
+        )
+
+    def test_deficits_use_hour_weighted_attendance(self):
+        self.assertEqual([row['roll'] for row in get_attendance_deficits(3, 2026, 1)], ['R2', 'R3'])
+        self.assertEqual([row['roll'] for row in get_attendance_rows(3, 2026, 1, roll_numbers=['R2'])], ['R2'])
+
+    def test_month_without_attendance_has_no_rows(self):
+        self.assertEqual(get_attendance_rows(3, 2026, 2), [])
+
+
+
+class AttendanceGridTests(TestCase):
+    """The manage_attendance month grid is cached per subject and timetable version."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='CI1', name='Teacher', email='ci1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        Timetable.objects.create(semester=3, day='Monday', period=2, subject=cls.subject)
+
+    def setUp(self):
+        cache.clear()
+
+    def cell(self, rows, date):
+        return next(cell for week in rows for cell in week if cell['date'] == date)
+
+    def test_grid_is_cached_and_refreshed_with_the_timetable(self):
+        grid = month_grid(self.subject.id, 2026, 1)
+        self.assertEqual(grid[0][0]['date'], datetime.date(2025, 12, 29))
+        self.assertEqual(self.cell(grid, datetime.date(2026, 1, 5))['classes'], [{'period': 2, 'time': mock.ANY}])
+        with self.assertNumQueries(0):
+            month_grid(self.subject.id, 2026, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Timetable.objects.create(semester=3, day='Tuesday', period=1, subject=self.subject)
+        self.assertEqual(len(self.cell(month_grid(self.subject.id, 2026, 1), datetime.date(2026, 1, 6))['classes']), 1)
+
+    def test_calendar_rows_mark_day_status(self):
+        rows = calendar_rows(self.subject.id, 2026, 1, datetime.date(2026, 1, 12), {datetime.date(2026, 1, 5)})
+        self.assertEqual(self.cell(rows, datetime.date(2026, 1, 5))['status_class'], 'recorded')
+        self.assertEqual(self.cell(rows, datetime.date(2026, 1, 12))['status_class'], 'pending')
+        self.assertTrue(self.cell(rows, datetime.date(2026, 1, 12))['is_selected'])
+        self.assertEqual(self.cell(rows, datetime.date(2026, 1, 13))['status_class'], 'empty')
+
+
+class AttendanceSyncTests(TestCase):
+    """Offline sheets are applied once, oldest first, and never override newer sheets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(staff_id='CI1', name='Teacher', email='ci1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=cls.staff)
+        for roll in ('R1', 'R2'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def sheet(self, key, recorded_at, statuses, time='09:00'):
+        return {
+            'key': key, 'subject_id': self.subject.id, 'date': '2026-01-05', 'time': time,
+            'is_extra_class': True, 'recorded_at': recorded_at, 'statuses': statuses,
+        }
+
+    def statuses(self):
+        return dict(StudentAttendance.objects.values_list('student_id', 'status'))
+
+    def test_replayed_sheet_is_a_duplicate(self):
+        sheet = self.sheet('k1', '2026-01-05T09:05:00', {'R1': 'Present', 'R2': 'Absent'})
+        [result] = sync_attendance_sheets(self.staff, [sheet])
+        self.assertEqual((result['status'], result['inserted']), ('applied', 2))
+
+        [result] = sync_attendance_sheets(self.staff, [sheet])
+        self.assertEqual(result['status'], 'duplicate')
+        self.assertEqual(StudentAttendance.objects.count(), 2)
+        self.assertEqual(AttendanceSyncReceipt.objects.count(), 1)
+
+    def test_older_sheet_does_not_override_newer_one(self):
+        sync_attendance_sheets(self.staff, [self.sheet('new', '2026-01-05T10:00:00', {'R1': 'Absent'})])
+        [result] = sync_attendance_sheets(self.staff, [self.sheet('old', '2026-01-05T09:00:00', {'R1': 'Present', 'R2': 'Present'})])
+
+        self.assertEqual(result['status'], 'applied')
+        self.assertEqual(self.statuses(), {'R1': 'Absent', 'R2': 'Present'})
+
+    def test_batch_is_applied_oldest_first(self):
+        results = sync_attendance_sheets(self.staff, [
+            self.sheet('b', '2026-01-05T10:00:00', {'R1': 'Absent'}),
+            self.sheet('a', '2026-01-05T09:00:00', {'R1': 'Present'}),
+        ])
+        self.assertEqual([r['status'] for r in results], ['applied', 'applied'])
+        self.assertEqual(self.statuses(), {'R1': 'Absent'})
+
+    def test_invalid_sheets_are_rejected(self):
+        results = sync_attendance_sheets(self.staff, [
+            self.sheet('x', '2026-01-05T09:00:00', {'R9': 'Present'}),
+            {**self.sheet('y', '2026-01-05T09:00:00', {'R1': 'Present'}), 'is_extra_class': False},
+            'not a sheet',
+        ])
+        self.assertEqual([r['status'] for r in results], ['rejected'] * 3)
+        self.assertFalse(StudentAttendance.objects.exists())
+
+    def test_manage_attendance_saves_sheet_and_receipt_together(self):
+        session = self.client.session
+        session['staff_id'] = self.staff.staff_id
+        session.save()
+        url = reverse('staffs:manage_attendance', args=[self.subject.id])
+        data = {
+            'attendance_date': '2026-01-05', 'class_time': '09:00', 'is_extra_class': 'on',
+            'status_R1': 'Present', 'status_R2': 'Absent',
+        }
+
+        with mock.patch.object(AttendanceSyncReceipt.objects, 'create', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(url, data)
+        self.assertFalse(StudentAttendance.objects.exists())
+
+        self.client.post(url, data)
+        self.assertEqual(self.statuses(), {'R1': 'Present', 'R2': 'Absent'})
+        receipt = AttendanceSyncReceipt.objects.get()
+        self.assertEqual(receipt.statuses, {'R1': 'Present', 'R2': 'Absent'})
+
+
+class CacheInvalidationTests(TestCase):
+    """Model signals bump cache versions only once the change is committed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=cls.staff)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_timetable_change_refreshes_schedule_after_commit(self):
+        self.assertEqual(subject_schedule(self.subject.id), {})
+        version = timetable_version(self.subject.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Timetable.objects.create(semester=3, day='Monday', period=1, subject=self.subject)
+            self.assertEqual(timetable_version(self.subject.id), version)
+        self.assertEqual(list(subject_schedule(self.subject.id)), ['Monday'])
+
+    def test_moved_period_refreshes_both_subjects(self):
+        other = Subject.objects.create(name='Networks', code='CS302', semester=3, staff=self.staff)
+        period = Timetable.objects.create(semester=3, day='Monday', period=1, subject=self.subject)
+        versions = [timetable_version(self.subject.id), timetable_version(other.id)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            period.subject = other
+            period.save()
+        self.assertEqual([timetable_version(self.subject.id), timetable_version(other.id)], [v + 1 for v in versions])
+
+    def test_subject_change_bumps_old_and_new_semester_sheets(self):
+        keys = [sheet_cache_key('R1', 3), sheet_cache_key('R1', 5)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.subject.semester = 5
+            self.subject.save()
+            self.assertEqual([sheet_cache_key('R1', 3), sheet_cache_key('R1', 5)], keys)
+        self.assertNotIn(sheet_cache_key('R1', 3), keys)
+        self.assertNotIn(sheet_cache_key('R1', 5), keys)
+
+    def test_rolled_back_change_bumps_nothing(self):
+        key, version = sheet_cache_key('R1', 3), timetable_version(self.subject.id)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                self.subject.name = 'Renamed'
+                self.subject.save()
+                Timetable.objects.create(semester=3, day='Monday', period=1, subject=self.subject)
+                raise DatabaseError('rolled back')
+        self.assertEqual(callbacks, [])
+        self.assertEqual((sheet_cache_key('R1', 3), timetable_version(self.subject.id)), (key, version))
+
+
+class PromotionJobTests(TestCase):
+    """Promotion jobs archive and promote their students chunk by chunk, and can safely be re-run."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(staff_id='HOD1', name='Head', email='hod1@example.com', role='HOD')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=cls.staff, credits=4)
+        for roll, semester in (('R1', 3), ('R2', 3), ('R3', 4)):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com',
+                                   password='x', current_semester=semester, joining_year=2023)
+        StudentMarks.objects.create(student_id='R1', subject=cls.subject, internal_marks=85)
+        save_attendance_sheets([(cls.subject, datetime.date(2026, 1, 5), datetime.time(9), None, {'R1': 'Present', 'R2': 'Absent'})])
+
+    def setUp(self):
+        cache.clear()
+
+    def queue(self, **kwargs):
+        return PromotionJob.objects.create(staff=self.staff, semester=3, roll_numbers=['R1', 'R2', 'R3'], **kwargs)
+
+    def test_job_archives_and_promotes_in_chunks(self):
+        job = self.queue()
+        call_command('process_promotion_jobs', '--chunk-size', '1', stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total, job.processed, job.promoted, job.progress), ('Done', 3, 3, 2, 100))
+        self.assertEqual(dict(Student.objects.values_list('roll_number', 'current_semester')), {'R1': 4, 'R2': 4, 'R3': 4})
+        record = StudentGPA.objects.get(student_id='R1', semester=3)
+        self.assertEqual((record.gpa, record.subject_data[0]['grade'], record.subject_data[0]['attendance_percentage']), (9.0, 'A+', 100.0))
+        self.assertEqual(ArchivedAttendance.objects.count(), 2)
+        self.assertFalse(StudentAttendance.objects.exists())
+
+    def test_rerun_skips_promoted_students(self):
+        run_promotion_job(self.queue())
+        job = run_promotion_job(self.queue())
+        self.assertEqual((job.status, job.promoted), ('Done', 0))
+        self.assertEqual(Student.objects.get(pk='R1').current_semester, 4)
+
+    def test_failed_job_is_recorded_and_can_be_retried(self):
+        job = self.queue()
+        with mock.patch('staffs.promotion.archive_student_attendance', side_effect=DatabaseError('disk full')):
+            run_promotion_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('Failed', 'disk full'))
+        # The failed chunk was rolled back
+        self.assertEqual(Student.objects.get(pk='R1').current_semester, 3)
+
+        call_command('process_promotion_jobs', '--retry-failed', stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.promoted), ('Done', 2))
+
+    def test_oldest_pending_job_is_claimed_first(self):
+        first, second = self.queue(), self.queue()
+        self.queue(status='Done')
+        self.assertEqual([claim_next_job().pk, claim_next_job().pk, claim_next_job()], [first.pk, second.pk, None])
+        self.assertEqual(PromotionJob.objects.get(pk=first.pk).status, 'Running')
+
+
+class ResultAnalyticsTests(TestCase):
+    """The HOD report is derived from the subject grade table of each batch."""
+
+    @classmethod
+    def setUpTestData(cls):
+        grades = {'R1': ('O', 'RA'), 'R2': ('A', 'B'), 'R3': ('O', 'W')}
+        records = []
+        for roll, (first, second) in grades.items():
+            Student.objects.create(roll_number=roll, student_name=f'Student {roll}', student_email=f'{roll}@example.com',
+                                   password='x', joining_year=2023)
+            records.append(StudentGPA.objects.create(student_id=roll, semester=3, gpa=0, total_credits=7, subject_data=[
+                {'code': 'CS301', 'name': 'Algorithms', 'grade': first, 'credits': 4},
+                {'code': 'CS302', 'name': 'Networks', 'grade': second, 'credits': 3},
+            ]))
+        sync_subject_grades(records, {'O': 10, 'A': 8, 'B': 6, 'RA': 0, 'W': 0})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_report(self):
+        report = department_report(2023, 3)
+
+        self.assertEqual(report['summary'], [{
+            'batch': 2023, 'semester': 3, 'students': 3, 'failed': 1, 'arrears': 1, 'mean_points': 6.8,
+            'passed': 2, 'pass_percentage': 66.7,
+        }])
+        subjects = {row['code']: row for row in report['subjects']}
+        self.assertEqual(
+            {code: (row['students'], row['arrears'], row['pass_percentage'], row['top_points'], row['toppers']) for code, row in subjects.items()},
+            {'CS301': (3, 0, 100.0, 10.0, 'Student R1, Student R3'), 'CS302': (2, 1, 50.0, 6.0, 'Student R2')},
+        )
+        counts = {row['code']: dict(zip(report['grade_columns'], row['counts'])) for row in report['distribution']}
+        self.assertEqual((counts['CS301']['O'], counts['CS301']['A'], counts['CS302']['W']), (2, 1, 1))
+        self.assertEqual([(row['roll_number'], row['subjects']) for row in report['arrear_students']], [('R1', 'CS302')])
+
+        frames = report_frames(report)
+        self.assertEqual([len(frame) for frame in frames.values()], [1, 2, 2, 1])
+
+    def test_cube_is_cached_until_grades_change(self):
+        department_report(2023)
+        with self.assertNumQueries(0):
+            department_report(2023)
+
+        record = StudentGPA.objects.get(student_id='R1')
+        record.subject_data[1]['grade'] = 'B'
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_subject_grades([record], {'B': 6})
+        self.assertEqual(department_report(2023)['arrear_students'], [])
+
+
+class MarksExportTests(TestCase):
+    """Semester marks exports stream one column group (CSV) or sheet (XLSX) per subject."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hod = Staff.objects.create(staff_id='HOD1', name='Head', email='hod1@example.com', role='HOD')
+        cls.teacher = Staff.objects.create(staff_id='CI1', name='Teacher', email='ci1@example.com', role='Course Incharge')
+        algorithms = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=cls.teacher)
+        networks = Subject.objects.create(name='Networks', code='CS302', semester=3, staff=cls.hod)
+        for roll in ('2023CS001', '2023CS002'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=3)
+        StudentMarks.objects.create(student_id='2023CS001', subject=algorithms, test1_marks=40, internal_marks=80)
+        StudentMarks.objects.create(student_id='2023CS002', subject=networks, test1_marks=35)
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self, staff, **params):
+        session = self.client.session
+        session['staff_id'] = staff.staff_id
+        session.save()
+        return self.client.get(reverse('staffs:export_semester_marks', args=[3]), params)
+
+    def test_csv_has_a_column_group_per_subject(self):
+        response = self.export(self.hod)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [
+            'Roll Number,Student Name,CS301 Test 1,CS301 Internal,CS302 Test 1',
+            '001,2023CS001,40,80,',
+            '002,2023CS002,,,35',
+        ])
+
+    def test_course_incharge_exports_own_subjects(self):
+        response = self.export(self.teacher)
+        header = next(iter(response.streaming_content)).decode().strip()
+        self.assertEqual(header, 'Roll Number,Student Name,Test 1,Internal')
+
+    def test_xlsx_has_a_sheet_per_subject(self):
+        from openpyxl import load_workbook
+
+        response = self.export(self.hod, format='xlsx')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['CS301', 'CS302'])
+        self.assertEqual([list(row) for row in workbook['CS302'].iter_rows(values_only=True)], [
+            ['Roll Number', 'Student Name', 'Test 1'], ['001', '2023CS001', None], ['002', '2023CS002', 35],
+        ])
+
+
+class RiskEngineTests(TestCase):
+    """Risk flags are computed for every student of the analysed subjects in a fixed number of queries."""
+
+    TODAY = datetime.date(2026, 2, 20)
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='CI1', name='Teacher', email='ci1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        for roll in ('R1', 'R2', 'R3', 'R4'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=3)
+        jan, feb = datetime.date(2026, 1, 1), datetime.date(2026, 2, 1)
+        for roll, month, present, total in (('R1', jan, 10, 10), ('R1', feb, 5, 5), ('R2', jan, 5, 10), ('R3', jan, 10, 10), ('R3', feb, 2, 5)):
+            AttendanceSummary.objects.create(student_id=roll, subject=cls.subject, month=month, present=present, total=total)
+        StudentMarks.objects.create(student_id='R1', subject=cls.subject, test1_marks=45, test2_marks=40, internal_marks=80)
+        StudentMarks.objects.create(student_id='R2', subject=cls.subject, test1_marks=35, test2_marks=15, internal_marks=30)
+        for semester, gpa in ((1, 8.5), (2, 7.0)):
+            StudentGPA.objects.create(student_id='R3', semester=semester, gpa=gpa, total_credits=20)
+        for days in (1, 30, 60, 120):
+            StudentRemark.objects.create(student_id='R3', remark_type='OTHERS', incident_date=cls.TODAY - datetime.timedelta(days=days))
+
+    def flagged(self, frame):
+        return {row.roll_number: [flag for flag in RISK_FACTORS if getattr(row, flag)] for row in frame.itertuples()}
+
+    def test_flags(self):
+        frame = risk_frame([self.subject], today=self.TODAY)
+        self.assertEqual(self.flagged(frame), {
+            'R1': [],
+            'R2': ['low_attendance', 'low_internal', 'low_test2', 'declining_marks'],
+            'R3': ['attendance_dropping', 'gpa_dropping', 'frequent_remarks'],
+            'R4': [],
+        })
+        r3 = frame.set_index('roll_number').loc['R3']
+        self.assertEqual((r3['attendance_percentage'], r3['gpa_delta'], r3['remark_count']), (80.0, -1.5, 3))
+
+    def test_at_risk_students_per_subject(self):
+        other = Subject.objects.create(name='Networks', code='CS302', semester=3, staff=self.subject.staff)
+        with self.assertNumQueries(5):
+            metrics = get_risk_metrics_for_subjects([self.subject, other], month=datetime.date(2026, 2, 1))
+        self.assertEqual([student['roll_number'] for student in metrics[self.subject.id]], ['R2', 'R3'])
+        self.assertEqual([student['roll_number'] for student in metrics[other.id]], ['R3'])
+        r2 = get_risk_metrics(self.subject, month=datetime.date(2026, 2, 1))[0]
+        self.assertEqual((r2['internal_marks'], r2['risk_factors'][0]), (30, 'Low Attendance'))
+
+
+class RiskSnapshotTests(TestCase):
+    """Nightly snapshots store every student's risk and are compared with the one a week older."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='CI1', name='Teacher', email='ci1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        for roll in ('R1', 'R2', 'R3'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=3)
+
+    def set_internals(self, **marks):
+        for roll, internal in marks.items():
+            StudentMarks.objects.update_or_create(student_id=roll, subject=self.subject, defaults={'internal_marks': internal})
+
+    def test_week_over_week_movement(self):
+        self.assertIsNone(snapshot_risk_metrics([self.subject]))
+        self.set_internals(R1=30, R2=50, R3=30)
+        take_risk_snapshot(datetime.date(2026, 1, 1))
+        self.set_internals(R1=50, R2=20)
+        self.assertEqual(take_risk_snapshot(datetime.date(2026, 1, 8)), (3, 2))
+
+        report = snapshot_risk_metrics([self.subject])
+        self.assertEqual((report['snapshot_date'], report['previous_date']), (datetime.date(2026, 1, 8), datetime.date(2026, 1, 1)))
+        self.assertEqual([(s['roll_number'], s['is_new'], s['internal_marks']) for s in report['students'][self.subject.id]],
+                         [('R2', True, 20), ('R3', False, 30)])
+        self.assertEqual(report['recovered'], {self.subject.id: 1})
+
+    def test_rerun_overwrites_the_day(self):
+        self.set_internals(R1=30)
+        take_risk_snapshot(datetime.date(2026, 1, 1))
+        self.set_internals(R1=50)
+        take_risk_snapshot(datetime.date(2026, 1, 1))
+        self.assertEqual(RiskSnapshot.objects.count(), 3)
+        self.assertFalse(RiskSnapshot.objects.filter(at_risk=True).exists())
+
+    def test_command_prunes_old_snapshots(self):
+        take_risk_snapshot(timezone.now().date() - datetime.timedelta(days=200))
+        call_command('snapshot_risk_metrics', '--dry-run', stdout=io.StringIO())
+        self.assertEqual(RiskSnapshot.objects.count(), 3)
+
+        call_command('snapshot_risk_metrics', stdout=io.StringIO())
+        self.assertEqual(set(RiskSnapshot.objects.values_list('snapshot_date', flat=True)), {timezone.now().date()})
+
+
+class DashboardCounterTests(TestCase):
+    """Dashboard counters are cached per role and dropped when the counted rows change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.hod = Staff.objects.create(staff_id='HOD1', name='Head', email='hod1@example.com', role='HOD')
+        cls.class_incharge = Staff.objects.create(staff_id='CL1', name='Incharge', email='cl1@example.com',
+                                                  role='Class Incharge', assigned_semester=3)
+        for roll, semester in (('R1', 3), ('R2', 3), ('R3', 5)):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x', current_semester=semester)
+        cls.leave('R1', 'Pending Class Incharge')
+        cls.leave('R3', 'Pending HOD')
+
+    @staticmethod
+    def leave(roll, status):
+        return LeaveRequest.objects.create(student_id=roll, leave_type='Permission', reason='-', status=status,
+                                           start_date=datetime.date(2026, 1, 5), end_date=datetime.date(2026, 1, 5))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counters_per_role(self):
+        self.assertEqual(dashboard_counters(self.hod), {
+            'student_count': 3, 'pending_leaves_count': 1, 'pending_staff_leaves_count': 0, 'pending_bonafide_count': 0,
+        })
+        self.assertEqual(dashboard_counters(self.class_incharge), {'student_count': 2, 'pending_leaves_count': 1})
+        with self.assertNumQueries(0):
+            dashboard_counters(self.hod)
+
+    def test_changes_drop_their_group_after_commit(self):
+        dashboard_counters(self.class_incharge)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.leave('R2', 'Pending Class Incharge')
+            self.assertEqual(dashboard_counters(self.class_incharge)['pending_leaves_count'], 1)
+        self.assertEqual(dashboard_counters(self.class_incharge)['pending_leaves_count'], 2)
+
+        # Moving students changes the semester's pending leaves too
+        Student.objects.filter(pk='R1').update(current_semester=4)
+        invalidate_dashboard_counters('students')
+        self.assertEqual(dashboard_counters(self.class_incharge), {'student_count': 1, 'pending_leaves_count': 1})
+
+
+class NewsFeedTests(TestCase):
+    """The active news feed is built once per day and dropped when News changes."""
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+
+    def create(self, content, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return News.objects.create(content=content, **kwargs)
+
+    def contents(self, audience):
+        return [item['content'] for item in news_feed(audience)]
+
+    def test_feed_per_audience_and_window(self):
+        day = datetime.timedelta(days=1)
+        self.create('everyone', new_gif_start_date=self.today, new_gif_end_date=self.today)
+        self.create('staff only', target='Staff')
+        self.create('students', target='Student', start_date=self.today - day, end_date=self.today + day)
+        self.create('not started', start_date=self.today + day)
+        self.create('ended', end_date=self.today - day)
+        self.create('inactive', is_active=False)
+
+        self.assertEqual(self.contents('All'), ['students', 'staff only', 'everyone'])
+        self.assertEqual(self.contents('Staff'), ['students', 'staff only', 'everyone'])
+        self.assertEqual(self.contents('Student'), ['students', 'everyone'])
+        self.assertEqual([item['is_new'] for item in news_feed('All')], [False, False, True])
+
+    def test_feed_is_cached_until_news_changes(self):
+        news = self.create('first')
+        news_feed('All')
+        with self.assertNumQueries(0):
+            news_feed('Student')
+
+        news.content = 'edited'
+        with self.captureOnCommitCallbacks(execute=True):
+            news.save()
+        self.assertEqual(self.contents('All'), ['edited'])
+
+    def test_feed_is_rebuilt_the_next_day(self):
+        self.create('ends today', end_date=self.today)
+        self.assertEqual(self.contents('All'), ['ends today'])
+        with mock.patch('staffs.news_feed.timezone.now', return_value=timezone.now() + datetime.timedelta(days=1)):
+            self.assertEqual(self.contents('All'), [])
@@ -48,16 +48,21 @@ urlpatterns = [
     path('students/', views.student_list, name='student_list'),
     path('students/<str:roll_number>/', views.student_detail, name='student_detail'),
     path('semesters/', views.manage_semesters, name='manage_semesters'),
+    path('semesters/jobs/<int:job_id>/', views.promotion_job_status, name='promotion_job_status'),
     path('subjects/', views.manage_subjects, name='manage_subjects'),
     path('subjects/<int:subject_id>/marks/', views.manage_marks, name='manage_marks'),
     path('subjects/<int:subject_id>/marks/export/', views.export_marks_csv, name='export_marks_csv'),
+    path('semesters/<int:semester>/marks/export/', views.export_semester_marks, name='export_semester_marks'),
     path('subjects/<int:subject_id>/attendance/', views.manage_attendance, name='manage_attendance'),
+    path('api/attendance/sync/', views.attendance_sync_api, name='attendance_sync_api'),
     path('subjects/<int:subject_id>/attendance/report/', views.attendance_report, name='attendance_report'),
     path('staff/list/', views.staff_list, name='staff_list'),
     
     # Passed Out Students
     path('passed-out/', views.passed_out_batches, name='passed_out_batches'),
     path('passed-out/<int:year>/', views.batch_students, name='batch_students'),
+    path('results/', views.result_analytics, name='result_analytics'),
+    path('results/export/', views.export_result_analytics, name='export_result_analytics'),
     path('exam-schedule/', views.exam_schedule, name='exam_schedule'),
     path('timetable/', views.timetable, name='timetable'),
 
@@ -98,6 +103,7 @@ urlpatterns = [
     # Attendance Deficit
     path('attendance-deficit/', views.attendance_deficit_list, name='attendance_deficit_list'),
     path('attendance-deficit/send/', views.send_deficit_email, name='send_deficit_email'),
+    path('attendance-deficit/send-all/', views.send_all_deficit_emails, name='send_all_deficit_emails'),
     
     # Web Push
     path('webpush/', include('webpush.urls')),
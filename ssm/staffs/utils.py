@@ -5,9 +5,9 @@ from django.core.mail import send_mail
 
 
 
-def log_audit(request, action, actor_type, actor_id, actor_name=None, object_type=None, object_id=None, message=None):
+def log_audit(request, action, actor_type, actor_id, actor_name=None, object_type=None, object_id=None, message=None, extra_data=None):
     """
-    Logs an audit trail entry.
+    Logs an audit trail entry. `extra_data` is stored as JSON (e.g. a diff of changed values).
     """
     from .models import AuditLog
 
@@ -31,6 +31,7 @@ def log_audit(request, action, actor_type, actor_id, actor_name=None, object_typ
         ip_address=ip_address,
         user_agent=user_agent,
         message=message or '',
+        extra_data=extra_data,
         timestamp=timezone.now()
     )
 
@@ -102,52 +103,44 @@ def send_parent_notification_email(student, remark_types, staff_name):
         logger.error(f"Error sending email: {e}")
         return False
 
-def send_attendance_deficit_email(student, month_name, percentage, total_hours, attended_hours, staff_name):
+def build_attendance_deficit_email(student, month_name, percentage, total_hours, attended_hours, staff_name):
     """
-    Send low attendance alert email.
+    Build the low attendance alert email for a student's parent.
+    Returns None if the student has no parent email on file.
     """
-    import logging
     from django.template.loader import render_to_string
     from django.utils.html import strip_tags
     from django.core.mail import EmailMultiAlternatives
 
-    logger = logging.getLogger(__name__)
-
-    try:
-        parent_email = None
-        if hasattr(student, 'personalinfo') and student.personalinfo:
-            parent_email = student.personalinfo.parent_email
-        
-        if not parent_email:
-            return False
-
-        subject = f"Low Attendance Alert - {student.student_name} - {month_name}"
-        
-        context = {
-            'student_name': student.student_name,
-            'roll_number': student.roll_number,
-            'program': student.program_level,
-            'semester': student.current_semester,
-            'month_name': month_name,
-            'percentage': percentage,
-            'total_hours': total_hours,
-            'attended_hours': attended_hours,
-            'staff_name': staff_name,
-        }
-
-        html_content = render_to_string('emails/attendance_deficit_notification.html', context)
-        text_content = strip_tags(html_content)
-
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[parent_email]
-        )
-        email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=False)
-        return True
-
-    except Exception as e:
-        logger.error(f"Error sending attendance email: {e}")
-        return False
+    parent_email = None
+    if hasattr(student, 'personalinfo') and student.personalinfo:
+        parent_email = student.personalinfo.parent_email
+
+    if not parent_email:
+        return None
+
+    subject = f"Low Attendance Alert - {student.student_name} - {month_name}"
+
+    context = {
+        'student_name': student.student_name,
+        'roll_number': student.roll_number,
+        'program': student.program_level,
+        'semester': student.current_semester,
+        'month_name': month_name,
+        'percentage': percentage,
+        'total_hours': total_hours,
+        'attended_hours': attended_hours,
+        'staff_name': staff_name,
+    }
+
+    html_content = render_to_string('emails/attendance_deficit_notification.html', context)
+    text_content = strip_tags(html_content)
+
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=text_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[parent_email]
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
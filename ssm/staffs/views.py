@@ -3,6 +3,7 @@ from django.contrib import messages
 from django.utils import timezone
 
 from .models import Staff, ExamSchedule, Timetable, StaffPublication, StaffAwardHonour, StaffSeminar, StaffStudentGuided, AuditLog
+from .decorators import staff_required
 from students.models import Student
 from django.db.models import Q, Case, When
 from django.db import transaction
@@ -34,28 +35,13 @@ def stafflogin(request):
     return render(request, 'staff/stafflogin.html')
 
 
+@staff_required()
 def staff_dashboard(request):
     """Displays the staff dashboard. Requires login."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    except Staff.DoesNotExist:
-        request.session.flush()
-        return redirect('staffs:stafflogin')
+    staff = request.staff
 
-    student_count = Student.objects.count()
-    
-    
     if staff.role == 'Class Incharge':
         template_name = 'staff/staffdash_class.html'
-        # Filter students relevant to this class incharge
-        if staff.assigned_semester:
-            student_count = Student.objects.filter(current_semester=staff.assigned_semester).count()
-        else:
-            student_count = 0 
-            
     elif staff.role == 'Course Incharge':
         template_name = 'staff/staffdash_course.html'
     elif staff.role == 'Scholarship Officer':
@@ -73,42 +59,11 @@ def staff_dashboard(request):
     else:
         assigned_subjects = staff.subjects.all().order_by('semester', 'code')
         
-    # Calculate pending leaves for notification badge
-    from students.models import LeaveRequest, BonafideRequest, ScholarshipInfo
-    from staffs.models import StaffLeaveRequest, News
-    pending_leaves_count = 0
-    pending_staff_leaves_count = 0
-    pending_bonafide_count = 0
-    
-    # Fetch News
-    # Fetch News
-    today = timezone.now().date()
-    # Office staff usually don't need general student news unless specified, but keeping simple for now
-    news_list = News.objects.filter(
-        Q(is_active=True) & 
-        Q(target__in=['All', 'Staff', 'Student']) &
-        (Q(start_date__isnull=True) | Q(start_date__lte=today)) & 
-        (Q(end_date__isnull=True) | Q(end_date__gte=today))
-    ).order_by('-date', '-id')
-    
-    if staff.role == 'HOD':
-        pending_leaves_count = LeaveRequest.objects.filter(status='Pending HOD').count()
-        pending_staff_leaves_count = StaffLeaveRequest.objects.filter(status='Pending').count()
-        pending_bonafide_count = BonafideRequest.objects.filter(status='Pending HOD Approval').count()
-    elif staff.role == 'Office Staff':
-         # Office Staff only sees Bonafide Requests (and Scholarships)
-         # Count requests waiting for Office Action (Approved by HOD -> Print, Waiting -> Mark Ready)
-         pending_bonafide_count = BonafideRequest.objects.filter(status__in=['Approved by HOD', 'Waiting for HOD Signature']).count()
-         # Fetch recent requests for the dashboard widget
-         recent_bonafide_requests = BonafideRequest.objects.select_related('student').all().order_by('-updated_at')[:5]
-         # Ensure other counts are 0
-         pending_leaves_count = 0
-         pending_staff_leaves_count = 0
-    elif staff.role == 'Class Incharge' and staff.assigned_semester:
-        pending_leaves_count = LeaveRequest.objects.filter(
-            status='Pending Class Incharge',
-            student__current_semester=staff.assigned_semester
-        ).count()
+    # Student count and pending request badges, cached per role / semester
+    from students.models import ScholarshipInfo
+    from .dashboard_counters import dashboard_counters
+    from .news_feed import news_feed
+    counters = dashboard_counters(staff)
 
     # Scholarship Officer Specific Logic
     scholarship_students = []
@@ -150,14 +105,14 @@ def staff_dashboard(request):
 
     return render(request, template_name, {
         'staff': staff, 
-        'student_count': student_count,
+        'student_count': counters.get('student_count', 0),
         'subjects': assigned_subjects,
         'assigned_subjects': assigned_subjects, # For HOD dashboard compatibility
-        'pending_leaves_count': pending_leaves_count,
-        'pending_staff_leaves_count': pending_staff_leaves_count,
-        'pending_bonafide_count': pending_bonafide_count,
-        'recent_bonafide_requests': locals().get('recent_bonafide_requests', []),
-        'news_list': news_list,
+        'pending_leaves_count': counters.get('pending_leaves_count', 0),
+        'pending_staff_leaves_count': counters.get('pending_staff_leaves_count', 0),
+        'pending_bonafide_count': counters.get('pending_bonafide_count', 0),
+        'recent_bonafide_requests': counters.get('recent_bonafide_requests', []),
+        'news_list': news_feed('Staff'),
         'scholarship_students': scholarship_students,
         'selected_scholarship': selected_scholarship
     })
@@ -167,11 +122,8 @@ def staff_logout(request):
     staff_id = request.session.get('staff_id')
     staff_name = ''
     if staff_id:
-        try:
-            s = Staff.objects.get(staff_id=staff_id)
-            staff_name = s.name
-        except Staff.DoesNotExist:
-            pass
+        if request.staff:
+            staff_name = request.staff.name
         from .utils import log_audit
         log_audit(request, 'logout', actor_type='staff', actor_id=staff_id or '', actor_name=staff_name, message='Staff logged out')
     try:
@@ -203,11 +155,9 @@ def staff_register(request):
     return render(request, 'staff/staffreg.html')
 
 
+@staff_required()
 def student_list(request):
     """Displays a list of students with search functionality for staff."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
     query = request.GET.get('q')
     semester = request.GET.get('semester')
     
@@ -215,14 +165,11 @@ def student_list(request):
     students = Student.objects.all().select_related('studentdocuments')
 
     # Restrict view for Class Incharge
-    try:
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        if current_staff.role == 'Class Incharge' and current_staff.assigned_semester:
-            students = students.filter(current_semester=current_staff.assigned_semester)
-            # Override semester filter to be the assigned one (or hide the filter in template)
-            semester = str(current_staff.assigned_semester) 
-    except Staff.DoesNotExist:
-        pass
+    current_staff = request.staff
+    if current_staff.role == 'Class Incharge' and current_staff.assigned_semester:
+        students = students.filter(current_semester=current_staff.assigned_semester)
+        # Override semester filter to be the assigned one (or hide the filter in template)
+        semester = str(current_staff.assigned_semester) 
 
     if query:
         students = students.filter(
@@ -248,11 +195,9 @@ def student_list(request):
     })
 
 
+@staff_required()
 def student_detail(request, roll_number):
     """Displays complete details of a single student."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
     student = get_object_or_404(Student, roll_number=roll_number)
     
     # helper to get object or None
@@ -287,84 +232,8 @@ def student_detail(request, roll_number):
 
     return render(request, 'staff/stud_detail.html', context)
 
-def manage_semesters(request):
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    selected_semester = request.GET.get('semester')
-    students = []
-    
-    if request.method == 'POST':
-        student_ids = request.POST.getlist('student_ids')
-        action = request.POST.get('action')
-
-        if student_ids and action:
-            from django.db.models import F
-            
-            if action == 'promote':
-                # Loop through students to archive data individually BEFORE promoting
-                count = 0
-                for roll in student_ids:
-                    try:
-                        student = Student.objects.get(roll_number=roll)
-                        if student.current_semester <= 8:
-                            # ARCHIVE DATA FIRST
-                            archive_semester_data(student)
-                            
-                            # PROMOTE
-                            student.current_semester += 1
-                            student.save()
-                            count += 1
-                    except Student.DoesNotExist:
-                        continue
-                        
-                messages.success(request, f"Successfully promoted {count} students and archived their semester data.")
-            
-            elif action == 'demote':
-                # Only demote if current_semester > 1.
-                Student.objects.filter(roll_number__in=student_ids, current_semester__gt=1).update(current_semester=F('current_semester') - 1)
-                messages.success(request, f"Successfully demoted selected students.")
-                
-            return redirect(f"{request.path}?semester={selected_semester}") # Stay on same page
-        else:
-            messages.warning(request, "No students selected or invalid action.")
-
-    display_semester_selector = True
-    header_text = "Filter by Current Semester"
-
-    # Restrict for Class Incharge
-    try:
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        if current_staff.role == 'Class Incharge' and current_staff.assigned_semester:
-            selected_semester = str(current_staff.assigned_semester)
-            display_semester_selector = False
-            header_text = f"Managing Semester {selected_semester} (Assigned)"
-    except Staff.DoesNotExist:
-        pass
-
-    if selected_semester:
-        students = Student.objects.filter(current_semester=selected_semester)
-    
-    return render(request, 'staff/manage_semesters.html', {
-        'students': students, 
-        'selected_semester': selected_semester,
-        'display_semester_selector': display_semester_selector,
-        'header_text': header_text
-    })
-
+@staff_required(roles=('HOD',), message="Access Denied: Only HOD can manage courses.")
 def manage_subjects(request):
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    # Check if HOD
-    try:
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        if current_staff.role != 'HOD':
-             messages.error(request, "Access Denied: Only HOD can manage courses.")
-             return redirect('staffs:staff_dashboard')
-    except Staff.DoesNotExist:
-         return redirect('staffs:stafflogin')
-
     from .models import Subject # Import locally to avoid circularity if any
 
     if request.method == 'POST':
@@ -443,105 +312,104 @@ def manage_subjects(request):
     return render(request, 'staff/manage_subjects.html', {
         'subjects_by_sem': subjects_by_sem,
         'staff_members': staff_members,
-        'current_staff': current_staff
+        'current_staff': request.staff
     })
 
+@staff_required(scope='assigned', message="Access Denied: You are not assigned to this subject.")
 def manage_marks(request, subject_id):
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
     from .models import Subject
 
     subject = get_object_or_404(Subject, id=subject_id)
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
-
-    # Access Control: HOD or Assigned Staff
-    if current_staff.role != 'HOD' and subject.staff != current_staff:
-        messages.error(request, "Access Denied: You are not assigned to this subject.")
-        return redirect('staffs:staff_dashboard')
+    current_staff = request.staff
 
     # Basic Access Control completed.
 
-    from django.db.models import Q
+    # Import StudentMarks locally to ensure it is available
+    from students.models import StudentMarks, StudentGPA
+
     # Fetch students who are CURRENTLY in this semester OR have GPA data for this semester
+    # (subquery instead of a join + DISTINCT)
     students = Student.objects.filter(
         Q(current_semester=subject.semester) | 
-        Q(gpa_records__semester=subject.semester)
-    ).distinct().order_by('roll_number')
-
-    # Import StudentMarks locally to ensure it is available
-    from students.models import StudentMarks
+        Q(roll_number__in=StudentGPA.objects.filter(semester=subject.semester).values('student'))
+    ).order_by('roll_number')
 
-    if request.method == 'POST':
-        for student in students:
-            test1 = request.POST.get(f'test1_{student.roll_number}')
-            test2 = request.POST.get(f'test2_{student.roll_number}')
-            internal = request.POST.get(f'internal_{student.roll_number}')
-            
-            # Clean empty strings to None
-            test1 = int(test1) if test1 else None
-            test2 = int(test2) if test2 else None
-            internal = int(internal) if internal else None
-
-            # Update or Create marks
-            StudentMarks.objects.update_or_create(
-                student=student, 
-                subject=subject,
-                defaults={
-                    'test1_marks': test1,
-                    'test2_marks': test2,
-                    'internal_marks': internal
-                }
-            )
-        messages.success(request, "Marks updated successfully.")
-        return redirect('staffs:manage_marks', subject_id=subject.id)
-    
     # Determine if read-only
     # HOD can view all, but should only edit if they are the assigned staff
     is_readonly = False
-    if current_staff.role == 'HOD' and subject.staff != current_staff:
+    if current_staff.role == 'HOD' and subject.staff_id != current_staff.staff_id:
         is_readonly = True
 
+    marks_errors = {}
+    student_marks_map = None
+
+    if request.method == 'POST':
+        if is_readonly:
+            messages.error(request, "Read-only access: Cannot save marks.")
+            return redirect('staffs:manage_marks', subject_id=subject.id)
+
+        from students.marks import MARK_FIELDS, parse_marks_sheet, save_marks_sheet
+        from .utils import log_audit
+
+        students = list(students)
+        # Validate the whole sheet before writing anything
+        sheet, marks_errors = parse_marks_sheet(request.POST, [s.roll_number for s in students])
+        if not marks_errors:
+            changes = save_marks_sheet(subject, sheet)
+            if changes:
+                log_audit(
+                    request, 'update', actor_type='staff', actor_id=current_staff.staff_id, actor_name=current_staff.name,
+                    object_type='StudentMarks', object_id=str(subject.id),
+                    message=f'Updated marks of {len(changes)} student(s) in {subject.code}',
+                    extra_data={'subject': subject.code, 'changes': changes}
+                )
+                messages.success(request, f"Marks updated successfully ({len(changes)} student(s) changed).")
+            else:
+                messages.success(request, "No changes to save.")
+            return redirect('staffs:manage_marks', subject_id=subject.id)
+
+        messages.error(request, f"Marks not saved: {sum(len(e) for e in marks_errors.values())} invalid cell(s). Fix the highlighted marks and save again.")
+        # Re-render with what was typed so nothing has to be re-entered
+        student_marks_map = {
+            roll: {field: request.POST.get(f'{prefix}_{roll}', '') for field, prefix in MARK_FIELDS.items()}
+            for roll in sheet
+        }
+
     # Pre-fetch existing marks for display
-    student_marks_map = {}
-    marks_entries = StudentMarks.objects.filter(subject=subject, student__in=students)
-    for entry in marks_entries:
-        student_marks_map[entry.student.roll_number] = entry
+    if student_marks_map is None:
+        student_marks_map = {
+            entry.student_id: entry
+            for entry in StudentMarks.objects.filter(subject=subject, student__in=students)
+        }
 
-    # Correlation Logic: Fetch Claimed Grades from StudentGPA
-    from students.models import StudentGPA
+    # Correlation Logic: Claimed Grades from the normalized grade table (indexed on code + semester)
+    from students.models import StudentSubjectGrade
+    from students.grades import normalize_code
     claimed_grades_map = {}
     
-    # Fetch GPA records for this semester for these students
-    gpa_records = StudentGPA.objects.filter(student__in=students, semester=subject.semester)
-    
-    for record in gpa_records:
-        if record.subject_data:
-            # Find the grade for this specific subject
-            for sub_data in record.subject_data:
-                # Match by Code (Case insensitive comparison just in case)
-                if sub_data.get('code', '').strip().upper() == subject.code.strip().upper():
-                    grade = sub_data.get('grade', '-')
-                    code = sub_data.get('code', '')
-                    if grade:
-                        claimed_grades_map[record.student.roll_number] = {
-                            'grade': grade,
-                            'code': code
-                        }
-                    break
+    claimed = StudentSubjectGrade.objects.filter(
+        code_normalized=normalize_code(subject.code),
+        semester=subject.semester,
+        student__in=students
+    ).exclude(grade='').order_by('-id').values_list('student_id', 'grade', 'code')
+    
+    for roll, grade, code in claimed:
+        claimed_grades_map[roll] = {
+            'grade': grade,
+            'code': code
+        }
 
     return render(request, 'staff/manage_marks.html', {
         'subject': subject,
         'students': students,
         'student_marks_map': student_marks_map,
         'claimed_grades_map': claimed_grades_map,
+        'marks_errors': marks_errors,
         'is_readonly': is_readonly
     })
 
+@staff_required(scope='assigned', message="Access Denied: You are not assigned to this subject.")
 def manage_attendance(request, subject_id):
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
     from .models import Subject, Timetable
     from students.models import StudentAttendance
     import datetime
@@ -549,12 +417,7 @@ def manage_attendance(request, subject_id):
     from django.urls import reverse
 
     subject = get_object_or_404(Subject, id=subject_id)
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
-
-    # Access Control
-    if current_staff.role != 'HOD' and subject.staff != current_staff:
-        messages.error(request, "Access Denied: You are not assigned to this subject.")
-        return redirect('staffs:staff_dashboard')
+    current_staff = request.staff
 
     # --- Date Handling (Current Selected Date) ---
     date_str = request.GET.get('date')
@@ -571,7 +434,7 @@ def manage_attendance(request, subject_id):
 
     # Determine if read-only
     is_readonly = False
-    if current_staff.role == 'HOD' and subject.staff != current_staff:
+    if current_staff.role == 'HOD' and subject.staff_id != current_staff.staff_id:
         is_readonly = True
 
     # --- POST Handler (Saving Attendance) ---
@@ -617,21 +480,30 @@ def manage_attendance(request, subject_id):
             except ValueError:
                 end_time = None
 
-        count_present = 0
+        from students.attendance import save_attendance_sheet
+
+        statuses = {}
         for student in students:
             status = request.POST.get(f'status_{student.roll_number}')
             if status:
-                StudentAttendance.objects.update_or_create(
-                    student=student, 
-                    subject=subject, 
+                statuses[student.roll_number] = status
+
+        import uuid
+        from students.models import AttendanceSyncReceipt
+
+        # Save and record the sheet together, so offline sheets synced later cannot override it with older data
+        with transaction.atomic():
+            result = save_attendance_sheet(subject, save_date, class_time, end_time, statuses)
+            if statuses:
+                AttendanceSyncReceipt.objects.create(
+                    key=uuid.uuid4().hex,
+                    staff=current_staff,
+                    subject=subject,
                     date=save_date,
                     time=class_time,
-                    defaults={
-                        'status': status,
-                        'end_time': end_time
-                    }
+                    statuses=statuses,
+                    recorded_at=timezone.now()
                 )
-                if status == 'Present': count_present += 1
         
         time_msg = ""
         if class_time:
@@ -639,7 +511,7 @@ def manage_attendance(request, subject_id):
             if end_time:
                 time_msg += f" - {end_time.strftime('%I:%M %p')}"
 
-        messages.success(request, f"Attendance saved for {save_date.strftime('%d-%b-%Y')} ({day_name}){time_msg}. {count_present}/{len(students)} Present.")
+        messages.success(request, f"Attendance saved for {save_date.strftime('%d-%b-%Y')} ({day_name}){time_msg}. {result['present']}/{len(students)} Present ({result['inserted']} new, {result['updated']} changed, {result['unchanged']} unchanged).")
         return redirect(reverse('staffs:manage_attendance', kwargs={'subject_id': subject.id}) + f"?date={save_date.strftime('%Y-%m-%d')}")
 
     # --- CALENDAR GENERATION ---
@@ -648,86 +520,30 @@ def manage_attendance(request, subject_id):
     cal_year = date_obj.year
     cal_month = date_obj.month
     
-    cal = calendar.Calendar(firstweekday=0) # 0 = Monday
-    month_days = cal.monthdatescalendar(cal_year, cal_month) # List of weeks, each week is list of date objects
-    
-    # 2. Key Data Mappings
-    PERIOD_TIMES = {
-        1: "08:30 - 09:30",
-        2: "09:30 - 10:30",
-        3: "10:40 - 11:40",
-        4: "11:40 - 12:40",
-        5: "01:30 - 02:30",
-        6: "02:30 - 03:30",
-        7: "03:30 - 04:30",
-    }
-
-    # 3. Fetch Timetable for this Subject
-    # We need to know which DAYS have classes.
-    # Structure: {'Monday': [ {period: 1, time: ...}, ... ], ...}
-    timetable_entries = Timetable.objects.filter(subject=subject)
-    timetable_map = {}
-    for entry in timetable_entries:
-        if entry.day not in timetable_map:
-            timetable_map[entry.day] = []
-        timetable_map[entry.day].append({
-            'period': entry.period,
-            'time': PERIOD_TIMES.get(entry.period, f"Period {entry.period}")
-        })
+    # 2. Weekly schedule and month grid come from the per-subject cache (invalidated on Timetable saves)
+    from .attendance_grid import calendar_rows as build_calendar_rows
     
-    # 4. Fetch Existing Attendance for this Month
+    # 3. Fetch Existing Attendance for this Month
     # We want to color code days.
     # Valid Dates with attendance:
+    # Plain date range (not date__year/date__month) so the (subject, date) index is used
+    from students.attendance import next_month
+    month_start = datetime.date(cal_year, cal_month, 1)
     attendance_dates = set(
         StudentAttendance.objects.filter(
             subject=subject, 
-            date__year=cal_year, 
-            date__month=cal_month
-        ).values_list('date', flat=True)
+            date__gte=month_start, 
+            date__lt=next_month(month_start)
+        ).values_list('date', flat=True).distinct()
     )
 
-    # 5. Build Calendar Data Structure
-    calendar_rows = []
-    
-    for week in month_days:
-        week_data = []
-        for day in week:
-            is_current_month = (day.month == cal_month)
-            day_classes = []
-            status_class = "" # 'recorded', 'pending', 'empty'
-            
-            # Identify classes for this day
-            day_name = day.strftime('%A')
-            if day_name in timetable_map:
-                day_classes = timetable_map[day_name]
-                day_classes.sort(key=lambda x: x['period'])
-            
-            # Determine Status
-            if day in attendance_dates:
-                status_class = "recorded" # Activity done
-            elif day_classes and day <= datetime.date.today():
-                status_class = "pending" # Should have been done
-            elif day_classes:
-                status_class = "future" # Upcoming
-            else:
-                status_class = "empty" # No class
-                
-            week_data.append({
-                'date': day,
-                'day_num': day.day,
-                'is_current_month': is_current_month,
-                'is_selected': (day == date_obj),
-                'is_today': (day == datetime.date.today()),
-                'classes': day_classes,
-                'status_class': status_class,
-                'url': reverse('staffs:manage_attendance', kwargs={'subject_id': subject.id}) + f"?date={day.strftime('%Y-%m-%d')}"
-            })
-        calendar_rows.append(week_data)
+    # 4. Build Calendar Data Structure
+    calendar_rows = build_calendar_rows(subject.id, cal_year, cal_month, date_obj, attendance_dates)
 
     # --- Fetch Data for List View (Selected Date) ---
-    attendance_map = {}
-    attendance_entries = StudentAttendance.objects.filter(subject=subject, date=date_obj, student__in=students)
-    attendance_map = {entry.student.roll_number: entry.status for entry in attendance_entries}
+    attendance_map = dict(
+        StudentAttendance.objects.filter(subject=subject, date=date_obj, student__in=students).values_list('student_id', 'status')
+    )
 
     return render(request, 'staff/manage_attendance.html', {
         'subject': subject,
@@ -744,10 +560,41 @@ def manage_attendance(request, subject_id):
         'next_month_url': f"?date={( (date_obj.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) ).strftime('%Y-%m-%d')}", 
     })
 
+@staff_required(api=True)
+def attendance_sync_api(request):
+    """
+    API for the service worker to sync attendance sheets recorded offline.
+    Expects {"sheets": [{key, subject_id, date, time, end_time, is_extra_class, recorded_at, statuses}, ...]}.
+    """
+    from django.http import JsonResponse
+    from django.db import IntegrityError
+    import json
+    from .attendance_sync import sync_attendance_sheets, MAX_SYNC_SHEETS
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    staff = request.staff
+
+    try:
+        sheets = json.loads(request.body).get('sheets')
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(sheets, list) or not sheets:
+        return JsonResponse({'error': 'sheets must be a non-empty list'}, status=400)
+    if len(sheets) > MAX_SYNC_SHEETS:
+        return JsonResponse({'error': f'At most {MAX_SYNC_SHEETS} sheets per request'}, status=400)
+
+    try:
+        results = sync_attendance_sheets(staff, sheets)
+    except IntegrityError:
+        # The same sheet is being synced concurrently from another tab/device; the client retries
+        return JsonResponse({'error': 'Sync conflict, please retry'}, status=409)
+
+    return JsonResponse({'results': results})
+
+@staff_required(scope='assigned', message="Access Denied: You are not assigned to this subject.")
 def attendance_report(request, subject_id):
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
     from .models import Subject
     from students.models import StudentAttendance
     from django.db.models import Count, Q
@@ -755,12 +602,7 @@ def attendance_report(request, subject_id):
     import calendar
 
     subject = get_object_or_404(Subject, id=subject_id)
-    current_staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
-
-    # Access Control
-    if current_staff.role != 'HOD' and subject.staff != current_staff:
-        messages.error(request, "Access Denied: You are not assigned to this subject.")
-        return redirect('staffs:staff_dashboard')
+    current_staff = request.staff
 
     students = Student.objects.filter(current_semester=subject.semester).order_by('roll_number')
     
@@ -797,10 +639,19 @@ def attendance_report(request, subject_id):
     
     class_total_students = Student.objects.filter(current_semester=subject.semester).count()
 
+    # One grouped query for the whole class instead of 3 COUNTs per student.
+    # Unfiltered reports read the monthly summary table instead of raw rows.
+    from students.attendance import attendance_counts_by_student, summary_counts_by
+    from students.models import AttendanceSummary
+    if start_date and end_date:
+        counts_map = attendance_counts_by_student(attendance_qs)
+    else:
+        counts_map = summary_counts_by(AttendanceSummary.objects.filter(subject=subject), 'student')
+
     for student in students:
-        student_attendance = attendance_qs.filter(student=student)
-        present_count = student_attendance.filter(status='Present').count()
-        absent_count = student_attendance.filter(status='Absent').count()
+        counts = counts_map.get(student.roll_number, {})
+        present_count = counts.get('present', 0)
+        absent_count = counts.get('absent', 0)
         
         percentage = (present_count / total_dates * 100) if total_dates > 0 else 0
         total_percentage_sum += percentage
@@ -892,74 +743,57 @@ def attendance_report(request, subject_id):
 
 
 
+# Open to every staff member, as before @staff_required: class incharges export their semester's marks
+@staff_required()
 def export_marks_csv(request, subject_id):
-    """Exports student marks for a specific subject to CSV."""
-    import csv
-    from django.http import HttpResponse
+    """Streams student marks for a specific subject as CSV."""
+    from django.http import StreamingHttpResponse
     from .models import Subject
-    from students.models import StudentMarks
-
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
+    from .marks_export import csv_rows
 
     subject = get_object_or_404(Subject, id=subject_id)
-    students = Student.objects.filter(current_semester=subject.semester).order_by('roll_number')
 
-    # Prepare CSV response
-    response = HttpResponse(content_type='text/csv')
-    filename = f"{subject.code}_marks.csv"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-    # Fetch all marks for efficiency
-    marks_entries = StudentMarks.objects.filter(subject=subject) # Keep queryset for checking existence
-    marks_map = {m.student.roll_number: m for m in marks_entries}
+    response = StreamingHttpResponse(csv_rows([subject], subject.semester), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{subject.code}_marks.csv"'
+    return response
 
-    # Determine which columns have data
-    has_test1 = any(m.test1_marks is not None for m in marks_entries)
-    has_test2 = any(m.test2_marks is not None for m in marks_entries)
-    has_internal = any(m.internal_marks is not None for m in marks_entries)
 
-    # Dynamic Header
-    header = ['Roll Number', 'Student Name']
-    if has_test1: header.append('Test 1')
-    if has_test2: header.append('Test 2')
-    if has_internal: header.append('Internal')
-    # Removed Total as requested ("remove totals")
-    
-    writer = csv.writer(response)
-    writer.writerow(header)
+@staff_required()
+def export_semester_marks(request, semester):
+    """
+    Streams the marks of every subject of a semester: CSV with one column
+    group per subject, or ?format=xlsx with one sheet per subject. HOD and
+    the semester's Class Incharge get all subjects, other staff their own.
+    """
+    from django.http import StreamingHttpResponse, FileResponse
+    from .models import Subject
+    from .marks_export import csv_rows, xlsx_file
+
+    current_staff = request.staff
+    subjects = Subject.objects.filter(semester=semester).order_by('code', 'id')
+    if not (current_staff.role == 'HOD' or (current_staff.role == 'Class Incharge' and current_staff.assigned_semester == semester)):
+        subjects = subjects.filter(staff=current_staff)
+    subjects = list(subjects)
+    if not subjects:
+        messages.error(request, f"No subjects of Semester {semester} to export.")
+        return redirect('staffs:staff_dashboard')
 
-    for student in students:
-        marks = marks_map.get(student.roll_number)
-        
-        # Last 3 digits of roll number, clean number (no quote requested: "and ` in roll no, just number is")
-        roll_short = student.roll_number[-3:] if len(student.roll_number) >= 3 else student.roll_number
-        if roll_short.isdigit():
-             # If it's a pure number, Excel might strip leading zeros. 
-             # User said "just number is", implying they don't want the quote hack. 
-             # We will just write the string. Excel handles CSV digits as numbers usually (stripping 0).
-             # If they want to keep 023 as 023 without quote, it's tricky in CSV for Excel.
-             # But "just number is" suggests removing the quote wrapper.
-             pass
-        
-        row = [roll_short, student.student_name]
-
-        if has_test1:
-             row.append(marks.test1_marks if marks and marks.test1_marks is not None else '')
-        if has_test2:
-             row.append(marks.test2_marks if marks and marks.test2_marks is not None else '')
-        if has_internal:
-             row.append(marks.internal_marks if marks and marks.internal_marks is not None else '')
-        
-        writer.writerow(row)
+    if request.GET.get('format') == 'xlsx':
+        return FileResponse(
+            xlsx_file(subjects, semester),
+            as_attachment=True,
+            filename=f"semester_{semester}_marks.xlsx",
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
 
+    response = StreamingHttpResponse(csv_rows(subjects, semester), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="semester_{semester}_marks.csv"'
     return response
 
+
+@staff_required()
 def staff_list(request):
     """Displays a list of staff members with search functionality."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
     # Basic Check: Is this restricted to HOD? 
     # User request: "in hod dashboard i want staff directory"
     # Assuming visible to all staff (like student directory) but definitely HOD.
@@ -987,17 +821,10 @@ def staff_list(request):
         'query': query,
         'departments': Staff.objects.values_list('department', flat=True).distinct()
     })
+@staff_required(roles=('HOD',), message="Access Restricted to HOD.")
 def passed_out_batches(request):
     """View to list batches (Ending Years) of passed out students."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    
-    # Simple access check: Only HOD should ideally access this, but can be open to staff
-    if staff.role != 'HOD':
-         messages.error(request, "Access Restricted to HOD.")
-         return redirect('staffs:staff_dashboard')
+    staff = request.staff
 
     # Get distinct ending years
     batches = Student.objects.values_list('ending_year', flat=True).distinct().order_by('-ending_year')
@@ -1006,12 +833,81 @@ def passed_out_batches(request):
 
     return render(request, 'staff/passed_out_batches.html', {'batches': batches, 'staff': staff})
 
+def _analytics_filters(request):
+    """Parses ?batch=<year>|all and ?semester=<n> for the result analytics views."""
+    from .analytics import batch_years
+
+    batches = batch_years()
+    batch_param = request.GET.get('batch')
+    if batch_param == 'all':
+        batch = None
+    elif batch_param and batch_param.isdigit() and int(batch_param) in batches:
+        batch = int(batch_param)
+    else:
+        batch = batches[0] if batches else None
+
+    semester_param = request.GET.get('semester', '')
+    semester = int(semester_param) if semester_param.isdigit() and 1 <= int(semester_param) <= 8 else None
+    return batches, batch, semester
+
+
+@staff_required(roles=('HOD',), message="Access Restricted to HOD.")
+def result_analytics(request):
+    """HOD report of pass %, grade distribution, toppers and arrears per batch."""
+    staff = request.staff
+
+    from .analytics import department_report
+
+    batches, batch, semester = _analytics_filters(request)
+    report = department_report(batch, semester)
+
+    return render(request, 'staff/result_analytics.html', {
+        'staff': staff,
+        'batches': batches,
+        'batch': batch,
+        'semester': semester,
+        'semesters': range(1, 9),
+        **report,
+    })
+
+
+@staff_required(roles=('HOD',), message="Access Restricted to HOD.")
+def export_result_analytics(request):
+    """Exports the result analytics report as CSV (one table) or XLSX (one sheet per table)."""
+    import csv
+    import io
+    import pandas as pd
+    from django.http import HttpResponse
+    from .analytics import department_report, report_frames
+
+    batches, batch, semester = _analytics_filters(request)
+    frames = report_frames(department_report(batch, semester))
+    filename = f"results_{batch or 'all'}" + (f"_sem{semester}" if semester else '')
+
+    if request.GET.get('format') == 'xlsx':
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            for sheet, frame in frames.items():
+                frame.to_excel(writer, sheet_name=sheet, index=False)
+        response = HttpResponse(
+            buffer.getvalue(),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}.xlsx"'
+        return response
+
+    tables = {'summary': 'Summary', 'subjects': 'Subjects', 'distribution': 'Grade Distribution', 'arrears': 'Arrears'}
+    table = tables.get(request.GET.get('table'), 'Subjects')
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}_{table.lower().replace(" ", "_")}.csv"'
+    frames[table].to_csv(response, index=False, quoting=csv.QUOTE_MINIMAL)
+    return response
+
+
+@staff_required()
 def batch_students(request, year):
     """View to list students of a specific passed out batch."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = request.staff
     
     students = Student.objects.filter(ending_year=year).order_by('roll_number')
     
@@ -1022,12 +918,10 @@ def batch_students(request, year):
         'staff': staff
     })
 
+@staff_required()
 def exam_schedule(request):
     """View to display exam schedule."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = request.staff
     
     # Get semester from GET request or default to 1
     selected_semester = request.GET.get('semester', 1)
@@ -1045,12 +939,10 @@ def exam_schedule(request):
         'semesters': range(1, 9)
     })
 
+@staff_required()
 def timetable(request):
     """View to display weekly timetable."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = request.staff
     
     selected_semester = request.GET.get('semester', 1)
     try:
@@ -1082,17 +974,17 @@ def timetable(request):
         'semesters': range(1, 9)
     })
 
+@staff_required()
 def risk_students(request):
     """
     Dedicated view to display students at risk (Low Attendance / Low Marks).
+    Reads the latest nightly RiskSnapshot (see snapshot_risk_metrics) with
+    week-over-week movement; computes live until a snapshot exists.
     """
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = request.staff
     
     # Imports
-    from .utils import get_risk_metrics
+    from .risk import get_risk_metrics_for_subjects, snapshot_risk_metrics
     from .models import Subject
     
     risk_insights = []
@@ -1102,30 +994,38 @@ def risk_students(request):
         # HOD sees all subjects
         subjects_to_analyze = Subject.objects.all().order_by('semester', 'code')
     
-    elif staff.role == 'Class Incharge' and staff.assigned_semester:
-        # Class Incharge sees subjects they teach + ALL subjects in their assigned semester
-        teaching_subjects = staff.subjects.all()
-        semester_subjects = Subject.objects.filter(semester=staff.assigned_semester)
-        subjects_to_analyze = (teaching_subjects | semester_subjects).distinct().order_by('semester', 'code')
-        
     else:
-        # Regular Staff / Course Incharge
-        subjects_to_analyze = staff.subjects.all().order_by('semester', 'code')
-
-    # Process Risk Metrics
+        # Subjects they teach, plus ALL subjects of a Class Incharge's assigned semester
+        from .decorators import subject_access
+        subjects_to_analyze = Subject.objects.filter(id__in=subject_access(staff)['class']).order_by('semester', 'code')
+
+    # Process Risk Metrics (all subjects at once)
+    subjects_to_analyze = list(subjects_to_analyze)
+    snapshot = snapshot_risk_metrics(subjects_to_analyze)
+    if snapshot is not None:
+        risks_by_subject = snapshot['students']
+        recovered = snapshot['recovered']
+    else:
+        risks_by_subject = get_risk_metrics_for_subjects(subjects_to_analyze)
+        recovered = {}
     for subject in subjects_to_analyze:
-        risks = get_risk_metrics(subject)
-        if risks:
+        risks = risks_by_subject.get(subject.id)
+        if risks or recovered.get(subject.id):
             risk_insights.append({
                 'subject': subject,
-                'students': risks
+                'students': risks or [],
+                'new_count': sum(1 for student in risks or [] if student.get('is_new')),
+                'recovered_count': recovered.get(subject.id, 0),
             })
             
     return render(request, 'staff/risk_students.html', {
         'staff': staff,
-        'risk_insights': risk_insights
+        'risk_insights': risk_insights,
+        'snapshot_date': snapshot and snapshot['snapshot_date'],
+        'previous_date': snapshot and snapshot['previous_date'],
     })
 
+@staff_required(scope='class', denied_url='staffs:risk_students')
 def export_risk_list(request, subject_id):
     """
     Exports the list of risk students for a specific subject to CSV.
@@ -1133,39 +1033,17 @@ def export_risk_list(request, subject_id):
     import csv
     from django.http import HttpResponse
     from .models import Subject
-    from .utils import get_risk_metrics
+    from .risk import get_risk_metrics, snapshot_risk_metrics
 
-    # Check Login
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    # Access: HOD, the subject's staff, or the Class Incharge of its semester (see @staff_required)
     subject = get_object_or_404(Subject, id=subject_id)
 
-    # Access Control Check (Basic) - Reusing logic:
-    # HOD can access all. Staff can access if assigned.
-    # We can be slightly lenient or strict. Optimally, check usage.
-    # Allowing if staff is HOD OR if subject is in staff.subjects.all()
-    # (Or if Class Incharge and subject in semester... simpler to stick to "can view risk page logic")
-    
-    can_access = False
-    if staff.role == 'HOD':
-        can_access = True
-    elif staff.role == 'Class Incharge' and staff.assigned_semester:
-        # Allow if subject is in their assigned semester OR if they teach it
-        if subject.semester == staff.assigned_semester or subject in staff.subjects.all():
-            can_access = True
+    # Get Data (same snapshot as the risk page, live until one exists)
+    snapshot = snapshot_risk_metrics([subject])
+    if snapshot is not None:
+        risks = snapshot['students'].get(subject.id, [])
     else:
-        if subject in staff.subjects.all():
-            can_access = True
-            
-    # If HOD, access is True. If strict access needed:
-    if not can_access and staff.role != 'HOD':
-         messages.error(request, "Access Denied.")
-         return redirect('staffs:risk_students')
-
-    # Get Data
-    risks = get_risk_metrics(subject)
+        risks = get_risk_metrics(subject)
     
     # Prepare CSV
     filename = f"Risk_Report_{subject.code}_Sem{subject.semester}.csv"
@@ -1174,11 +1052,15 @@ def export_risk_list(request, subject_id):
 
     writer = csv.writer(response)
     # Context Header
-    writer.writerow([f"Subject: {subject.name} ({subject.code})", f"Semester: {subject.semester}"])
+    writer.writerow([
+        f"Subject: {subject.name} ({subject.code})",
+        f"Semester: {subject.semester}",
+        f"As of: {snapshot['snapshot_date'] if snapshot else 'now'}",
+    ])
     writer.writerow([]) # Blank line
     
     # Table Header
-    writer.writerow(['Roll Number', 'Student Name', 'Attendance %', 'Internal Marks', 'Risk Factors'])
+    writer.writerow(['Roll Number', 'Student Name', 'Attendance %', 'Internal Marks', 'GPA Change', 'Remarks', 'Risk Factors'])
     
     for student_data in risks:
         # Data structure from get_risk_metrics: 
@@ -1189,6 +1071,8 @@ def export_risk_list(request, subject_id):
             f"{student_data['name']} (Sem {student_data['current_semester']})",
             f"{student_data['attendance_percentage']}%",
             student_data['internal_marks'],
+            '' if student_data['gpa_delta'] is None else student_data['gpa_delta'],
+            student_data['remark_count'],
             ", ".join(student_data['risk_factors'])
         ]
         writer.writerow(row)
@@ -1196,12 +1080,10 @@ def export_risk_list(request, subject_id):
     return response
 
 
+@staff_required()
 def view_leave_requests(request):
     """View to list pending leave requests."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = request.staff
     from students.models import LeaveRequest
     
     # Filter requests based on role
@@ -1224,11 +1106,9 @@ def view_leave_requests(request):
         'leave_requests': leave_requests
     })
 
+@staff_required()
 def update_leave_status(request, request_id):
     """View to approve or reject a leave request."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
     if request.method == 'POST':
         from students.models import LeaveRequest
         leave_request = get_object_or_404(LeaveRequest, id=request_id)
@@ -1236,7 +1116,7 @@ def update_leave_status(request, request_id):
         action = request.POST.get('action')
         reason = request.POST.get('rejection_reason', '')
         
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
+        staff = request.staff
         
         if action == 'approve':
             if staff.role == 'Class Incharge':
@@ -1258,12 +1138,10 @@ def update_leave_status(request, request_id):
 
 # --- Staff Leave System (Staff -> HOD) ---
 
+@staff_required()
 def staff_apply_leave(request):
     """View for staff to apply for leave."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = request.staff
     from .forms import StaffLeaveRequestForm
     from .models import StaffLeaveRequest
     
@@ -1317,29 +1195,20 @@ def staff_apply_leave(request):
         'special_used': special_used,
     })
 
+@staff_required()
 def staff_leave_history(request):
     """View for staff to see their leave history."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    staff = Staff.objects.get(staff_id=request.session['staff_id'])
+    staff = request.staff
     from .models import StaffLeaveRequest
     
     leaves = StaffLeaveRequest.objects.filter(staff=staff).order_by('-created_at')
     
     return render(request, 'staff/my_leave_history.html', {'staff': staff, 'leaves': leaves})
 
+@staff_required(roles=('HOD',), message="Access Restricted to HOD.")
 def hod_leave_dashboard(request):
     """HOD view to see all staff leave requests."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    
-    # Strictly for HOD
-    if current_staff.role != 'HOD':
-        messages.error(request, "Access Restricted to HOD.")
-        return redirect('staffs:staff_dashboard')
+    current_staff = request.staff
         
     from .models import StaffLeaveRequest
     
@@ -1351,20 +1220,12 @@ def hod_leave_dashboard(request):
         'leave_requests': pending_leaves
     })
 
+@staff_required(roles=('HOD',), message="Unauthorized action.")
 def hod_update_leave_status(request, request_id):
     """HOD action to approve/reject staff leave."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
     if request.method == 'POST':
         from .models import StaffLeaveRequest
         leave_request = get_object_or_404(StaffLeaveRequest, id=request_id)
-        
-        # Verify HOD access again for security
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        if current_staff.role != 'HOD':
-             messages.error(request, "Unauthorized action.")
-             return redirect('staffs:staff_dashboard')
 
         action = request.POST.get('action')
         reason = request.POST.get('rejection_reason', '')
@@ -1381,19 +1242,10 @@ def hod_update_leave_status(request, request_id):
         
     return redirect('staffs:hod_leave_dashboard')
 
+@staff_required(roles=('HOD',), message="Access Denied: Only HOD can access Admin Portal.")
 def admin_portal_login(request):
     """Auto-login HOD to Django Admin Portal."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    except Staff.DoesNotExist:
-        return redirect('staffs:stafflogin')
-
-    if staff.role != 'HOD':
-        messages.error(request, "Access Denied: Only HOD can access Admin Portal.")
-        return redirect('staffs:staff_dashboard')
+    staff = request.staff
 
     from django.contrib.auth.models import User
     from django.contrib.auth import login
@@ -1424,15 +1276,10 @@ def admin_portal_login(request):
     return redirect('/admin/')
 
 
+@staff_required()
 def create_superuser(request):
     """View to manually create a superuser."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    except Staff.DoesNotExist:
-        return redirect('staffs:stafflogin')
+    staff = request.staff
 
     if request.method == 'POST':
         username = request.POST.get('username')
@@ -1456,16 +1303,10 @@ def create_superuser(request):
     return render(request, 'staff/create_superuser.html', {'staff': staff})
 
 
+@staff_required()
 def scholarship_manager(request):
     """Dedicated page for managing scholarships with advanced filtering and export."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    except Staff.DoesNotExist:
-        return redirect('staffs:stafflogin')
-        
+    staff = request.staff
     if staff.role != 'Scholarship Officer' and staff.role != 'Office Staff':
         messages.error(request, "Access restricted to Scholarship Officer or Office Staff.")
         return redirect('staffs:staff_dashboard')
@@ -1574,24 +1415,24 @@ def scholarship_manager(request):
     return render(request, 'staff/scholarship_manager.html', context)
 
 
+@staff_required()
 def staff_profile(request):
     """View to display the logged-in staff's profile."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-    except Staff.DoesNotExist:
-        return redirect('staffs:stafflogin')
+    staff = request.staff
 
     return render(request, 'staff/profile.html', {'staff': staff})
 
+# The fields staff_edit_profile writes: request.staff is a cached copy, so nothing else is saved from it
+PROFILE_FIELDS = [
+    'address', 'mobile_number', 'blood_group', 'gender', 'date_of_birth', 'qualification', 'specialization',
+    'academic_details', 'experience', 'research_interests', 'google_scholar_link', 'linkedin_link',
+    'orcid_link', 'research_gate_link',
+]
+
+@staff_required()
 def staff_edit_profile(request):
     """View to edit staff professional profile."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = request.staff
 
     if request.method == 'POST':
         staff.address = request.POST.get('address', '')
@@ -1612,7 +1453,7 @@ def staff_edit_profile(request):
         staff.orcid_link = request.POST.get('orcid_link', '') or None
         staff.research_gate_link = request.POST.get('research_gate_link', '') or None
 
-        staff.save()
+        staff.save(update_fields=PROFILE_FIELDS)
         from .utils import log_audit
         log_audit(request, 'update', actor_type='staff', actor_id=staff.staff_id, actor_name=staff.name, object_type='Staff', object_id=staff.staff_id, message='Updated profile details')
         messages.success(request, "Profile updated successfully.")
@@ -1621,13 +1462,8 @@ def staff_edit_profile(request):
     return render(request, 'staff/staff_edit_profile.html', {'staff': staff})
 
 def _get_staff_for_portfolio(request):
-    """Helper to get logged-in staff for portfolio views."""
-    if 'staff_id' not in request.session:
-        return None
-    try:
-        return get_object_or_404(Staff, staff_id=request.session['staff_id'])
-    except Exception:
-        return None
+    """Helper to get logged-in staff for portfolio views (None if logged out)."""
+    return request.staff
 
 
 def staff_portfolio(request):
@@ -2121,96 +1957,8 @@ def portfolio_delete_student(request, pk):
         'staff': staff, 'item': item, 'item_label': f"{item.student_name} ({item.degree_type})", 'cancel_url': 'staffs:staff_portfolio',
     })
 
-def archive_semester_data(student):
-    """
-    Helper to archive attendance and marks for all subjects in the student's current semester.
-    """
-    from staffs.models import Subject
-    from students.models import StudentMarks, StudentAttendance, StudentGPA
-    import datetime
-
-    # Get all subjects for the student's current semester
-    subjects = Subject.objects.filter(semester=student.current_semester)
-    
-    # Create/Get GPA record for this semester
-    student_gpa, created = StudentGPA.objects.get_or_create(
-        student=student, 
-        semester=student.current_semester,
-        defaults={'gpa': 0.0, 'total_credits': 0.0}
-    )
-    
-    # Reset subject_data to avoid stale/duplicate entries if re-run
-    student_gpa.subject_data = [] 
-    
-    total_points = 0
-    total_sc = 0
-    
-    for subject in subjects:
-        # 1. Calculate Attendance %
-        total_classes = StudentAttendance.objects.filter(student=student, subject=subject).count()
-        present_classes = StudentAttendance.objects.filter(student=student, subject=subject, status='Present').count()
-        attendance_percentage = round((present_classes / total_classes) * 100, 1) if total_classes > 0 else 0.0
-        
-        # 2. Get Internals & Calculate Grade Point
-        internal_marks = 0
-        try:
-            marks_record = StudentMarks.objects.get(student=student, subject=subject)
-            internal_marks = marks_record.internal_marks or 0
-        except StudentMarks.DoesNotExist:
-            pass # Keep internal as 0
-            
-        # Simple Grade Point Logic 
-        score = internal_marks 
-        grade = 'RA'
-        grade_point = 0
-        
-        if score >= 90: 
-            grade_point = 10
-            grade = 'O'
-        elif score >= 80: 
-            grade_point = 9
-            grade = 'A+'
-        elif score >= 70: 
-            grade_point = 8
-            grade = 'A'
-        elif score >= 60: 
-            grade_point = 7
-            grade = 'B+'
-        elif score >= 50: 
-            grade_point = 6
-            grade = 'B'
-        else: 
-            grade_point = 0
-            grade = 'RA'
-            
-        # Append data
-        new_entry = {
-            'code': subject.code,
-            'name': subject.name,
-            'credits': getattr(subject, 'credits', 3), 
-            'internal_marks': internal_marks,
-            'attendance_percentage': attendance_percentage,
-            'points': grade_point,
-            'grade': grade,
-            'archived_at': str(datetime.date.today())
-        }
-        student_gpa.subject_data.append(new_entry)
-        
-        # Accumulate for GPA
-        creds = getattr(subject, 'credits', 3)
-        total_points += (grade_point * creds)
-        total_sc += creds
-
-    # Finalize GPA
-    student_gpa.gpa = round(total_points / total_sc, 2) if total_sc > 0 else 0.0
-    student_gpa.total_credits = total_sc
-    student_gpa.save()
-
-
+@staff_required()
 def manage_semesters(request):
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
     selected_semester = request.GET.get('semester')
     students = []
     
@@ -2221,28 +1969,48 @@ def manage_semesters(request):
         if student_ids and action:
             from django.db.models import F
             
+            from students.attendance import restore_student_attendance
+
             if action == 'promote':
-                # Loop through students to archive data individually BEFORE promoting
-                count = 0
-                for roll in student_ids:
-                    try:
-                        student = Student.objects.get(roll_number=roll)
-                        if student.current_semester <= 8:
-                            # ARCHIVE DATA FIRST
-                            archive_semester_data(student)
-                            
-                            # PROMOTE
-                            student.current_semester += 1
-                            student.save()
-                            count += 1
-                    except Student.DoesNotExist:
-                        continue
-                        
-                messages.success(request, f"Successfully promoted {count} students and archived their semester data.")
+                # Archive + promote runs in the background (process_promotion_jobs), one job per semester
+                from .models import PromotionJob
+                by_semester = {}
+                for roll, semester in Student.objects.filter(
+                    roll_number__in=student_ids, current_semester__lte=8
+                ).order_by('roll_number').values_list('roll_number', 'current_semester'):
+                    by_semester.setdefault(semester, []).append(roll)
+
+                staff = request.staff
+                PromotionJob.objects.bulk_create([
+                    PromotionJob(staff=staff, semester=semester, roll_numbers=rolls, total=len(rolls))
+                    for semester, rolls in by_semester.items()
+                ])
+                queued = sum(len(rolls) for rolls in by_semester.values())
+                messages.success(request, f"Promotion of {queued} students queued. Their semester data is archived in the background.")
             
             elif action == 'demote':
-                # Only demote if current_semester > 1.
-                Student.objects.filter(roll_number__in=student_ids, current_semester__gt=1).update(current_semester=F('current_semester') - 1)
+                from functools import partial
+                from .dashboard_counters import invalidate_dashboard_counters
+                from ssm.principal import invalidate_students
+
+                # Restore and demote together, so attendance is never restored for students left in place
+                with transaction.atomic():
+                    # Only demote if current_semester > 1.
+                    by_semester = {}
+                    for roll, semester in Student.objects.select_for_update().filter(
+                        roll_number__in=student_ids, current_semester__gt=1
+                    ).values_list('roll_number', 'current_semester'):
+                        by_semester.setdefault(semester, []).append(roll)
+                    # The semester is open again, so bring its attendance back from the archive
+                    for semester, rolls in by_semester.items():
+                        restore_student_attendance(rolls, semester - 1)
+                        Student.objects.filter(roll_number__in=rolls, current_semester=semester).update(
+                            current_semester=F('current_semester') - 1
+                        )
+                    rolls = [roll for rolls in by_semester.values() for roll in rolls]
+                    # .update() sends no signals, so drop the semester counts explicitly
+                    transaction.on_commit(lambda: invalidate_dashboard_counters('students'))
+                    transaction.on_commit(partial(invalidate_students, rolls))
                 messages.success(request, f"Successfully demoted selected students.")
                 
             return redirect(f"{request.path}?semester={selected_semester}") # Stay on same page
@@ -2253,23 +2021,52 @@ def manage_semesters(request):
     header_text = "Filter by Current Semester"
 
     # Restrict for Class Incharge
-    try:
-        current_staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        if current_staff.role == 'Class Incharge' and current_staff.assigned_semester:
-            selected_semester = str(current_staff.assigned_semester)
-            display_semester_selector = False
-            header_text = f"Managing Semester {selected_semester} (Assigned)"
-    except Staff.DoesNotExist:
-        pass
+    current_staff = request.staff
+    if current_staff.role == 'Class Incharge' and current_staff.assigned_semester:
+        selected_semester = str(current_staff.assigned_semester)
+        display_semester_selector = False
+        header_text = f"Managing Semester {selected_semester} (Assigned)"
 
+    promotion_jobs = []
     if selected_semester:
+        from .models import PromotionJob
         students = Student.objects.filter(current_semester=selected_semester)
+        promotion_jobs = PromotionJob.objects.filter(semester=selected_semester)
+        if not can_view_promotion_jobs(current_staff, selected_semester):
+            promotion_jobs = promotion_jobs.filter(staff=current_staff)
+        promotion_jobs = promotion_jobs[:3]
     
     return render(request, 'staff/manage_semesters.html', {
         'students': students, 
         'selected_semester': selected_semester,
         'display_semester_selector': display_semester_selector,
-        'header_text': header_text
+        'header_text': header_text,
+        'promotion_jobs': promotion_jobs
+    })
+
+
+def can_view_promotion_jobs(staff, semester):
+    """True if `staff` may follow every promotion job of `semester`: the HOD and that semester's Class Incharge."""
+    return staff.role == 'HOD' or (staff.role == 'Class Incharge' and str(staff.assigned_semester) == str(semester))
+
+
+@staff_required(api=True)
+def promotion_job_status(request, job_id):
+    """API returning the progress of a promotion job (polled by Manage Semesters)."""
+    from django.http import JsonResponse
+    from .models import PromotionJob
+
+    job = get_object_or_404(PromotionJob, id=job_id)
+    if job.staff_id != request.staff.staff_id and not can_view_promotion_jobs(request.staff, job.semester):
+        return JsonResponse({'error': 'Access Denied.'}, status=403)
+    return JsonResponse({
+        'id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'promoted': job.promoted,
+        'progress': job.progress,
+        'error': job.error
     })
 
 # --- Staff Password Reset Logic ---
@@ -2431,13 +2228,11 @@ def staff_password_reset_confirm(request):
     return render(request, 'staff/password_reset/p3.html', {'staff': staff})
 
 
+@staff_required()
 def generate_student(request):
     """
     Admin view to bulk generate student records with temporary passwords and export to CSV.
     """
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
     if request.method == 'POST':
         action = request.POST.get('action', 'preview')
         
@@ -2597,20 +2392,15 @@ def generate_student(request):
 from django.contrib.auth.decorators import login_required
 # @login_required(login_url='staffs:stafflogin')
 @login_required(login_url='staffs:stafflogin')
+@staff_required()
 def hod_manage_bonafide(request):
     """Specific view for HOD to approve/reject bonafide requests."""
     # Debug print removed for production cleanliness, but logic restored.
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        # STRICT ROLE CHECK DISABLED to prevent lockout for non-exact 'HOD' roles
-        # if staff.role.strip() != 'HOD':
-        #     messages.error(request, "Access Denied.")
-        #     return redirect('staffs:staff_dashboard')
-    except Staff.DoesNotExist:
-        return redirect('staffs:stafflogin')
+    staff = request.staff
+    # STRICT ROLE CHECK DISABLED to prevent lockout for non-exact 'HOD' roles
+    # if staff.role.strip() != 'HOD':
+    #     messages.error(request, "Access Denied.")
+    #     return redirect('staffs:staff_dashboard')
 
     try:
         from students.models import BonafideRequest
@@ -2655,18 +2445,13 @@ def hod_manage_bonafide(request):
         return HttpResponse(f"<h1>Critical Error in HOD Bonafide View</h1><pre>{traceback.format_exc()}</pre>")
 
 @login_required(login_url='staffs:stafflogin')
+@staff_required()
 def office_manage_bonafide(request):
     """Specific view for Office Staff to process bonafide requests."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    try:
-        staff = Staff.objects.get(staff_id=request.session['staff_id'])
-        if staff.role.strip() != 'Office Staff':
-            messages.error(request, "Access Denied: You are not authorized as Office Staff.")
-            return redirect('staffs:staff_dashboard')
-    except Staff.DoesNotExist:
-        return redirect('staffs:stafflogin')
+    staff = request.staff
+    if staff.role.strip() != 'Office Staff':
+        messages.error(request, "Access Denied: You are not authorized as Office Staff.")
+        return redirect('staffs:staff_dashboard')
 
     from students.models import BonafideRequest
     from django.http import FileResponse
@@ -2724,12 +2509,10 @@ def office_manage_bonafide(request):
 
 # --- Student Remarks System ---
 
+@staff_required()
 def remark_student_list(request):
     """Lists students for the class incharge to add/view remarks."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-    
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = request.staff
     
     # Security: Ensure only Class Incharge (or HOD/authorized roles) triggers this
     # For now, we assume Class Incharge logic as per request.
@@ -2747,12 +2530,10 @@ def remark_student_list(request):
 
     return render(request, 'staff/remark_student_list.html', {'staff': staff, 'students': students})
 
+@staff_required()
 def remark_history(request, roll_number):
     """View and add remarks for a specific student with violation types, incident details, and parent email notification."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = request.staff
     student = get_object_or_404(Student, roll_number=roll_number)
     
     from students.models import StudentRemark
@@ -2818,12 +2599,10 @@ def remark_history(request, roll_number):
         'violation_choices': violation_choices
     })
 
+@staff_required()
 def attendance_deficit_list(request):
     """View to list students with < 70% attendance for Class Incharge."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
-    staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+    staff = request.staff
     
     # Access Control: Class Incharge Only
     if staff.role != 'Class Incharge' or not staff.assigned_semester:
@@ -2831,164 +2610,124 @@ def attendance_deficit_list(request):
         return redirect('staffs:staff_dashboard')
         
     import datetime
-    import calendar
-    from .models import Subject, Timetable
-    from students.models import StudentAttendance, Student
+    from students.models import StudentAttendance
+    from students.attendance import next_month
+    from .models import MailLog, MailOutbox
+    from .deficit import resolve_month, get_attendance_deficits
     
     # --- Month Selection ---
-    today = datetime.date.today()
     month_offset = int(request.GET.get('month_offset', 0))
-    
-    # Calculate target month
-    # Logic: Go back 'month_offset' months
-    target_date = today
-    for _ in range(month_offset):
-        target_date = target_date.replace(day=1) - datetime.timedelta(days=1)
-        
-    target_month = target_date.month
-    target_year = target_date.year
-    month_name = calendar.month_name[target_month]
-    
-    # --- Logic ---
-    # 1. Get Students in Assigned Semester
-    students = Student.objects.filter(current_semester=staff.assigned_semester).select_related('personalinfo')
-    
-    # 2. Get Subjects for this Semester
-    subjects = Subject.objects.filter(semester=staff.assigned_semester)
-    
-    # 3. Calculate Attendance
-    # We need: Total Working Days (Unique dates with ANY attendance for ANY subject in this sem)
-    # AND Student Presence (Count of unique dates student was present)
-    # NOTE: This approximates "days" rather than "periods". If strict period count needed, logic changes.
-    # Assuming "Daily Attendance":
+    target_year, target_month, month_name = resolve_month(month_offset)
+    month_start = datetime.date(target_year, target_month, 1)
     
     # Get all dates where attendance was taken for this semester's subjects in this month
-    working_dates_qs = StudentAttendance.objects.filter(
+    working_days_count = StudentAttendance.objects.filter(
         subject__semester=staff.assigned_semester,
-        date__year=target_year,
-        date__month=target_month
-    ).values_list('date', flat=True).distinct()
-    
-    working_days_count = working_dates_qs.count()
-    
-    deficit_students = []
-    
-    if working_days_count > 0:
-        for student in students:
-            # Count days present (distinct dates where status='Present' for any subject)
-            # A student is "Present" for the day if they attended at least one class? 
-            # OR better: Check percentage based on per-subject or aggregate?
-            # Requirement: "monthly attendance deficit students below 70%" -> Usually global aggregate.
-            
-            # Let's use: (Total Periods Attended / Total Periods Conducted) * 100
-            
-            # Total Periods Conducted for this class (sum of all subject sessions)
-            total_sessions = StudentAttendance.objects.filter(
-                subject__semester=staff.assigned_semester,
-                date__year=target_year,
-                date__month=target_month,
-                student=student # Filter by student to match exact records created for them
-            ).count()
-            
-            # Total Present
-            attended_sessions = StudentAttendance.objects.filter(
-                subject__semester=staff.assigned_semester,
-                date__year=target_year,
-                date__month=target_month,
-                student=student,
-                status='Present'
-            ).count()
-            
-            percentage = 0
-            if total_sessions > 0:
-                percentage = int((attended_sessions / total_sessions) * 100)
-                
-            if percentage < 70:
-                parent_email = None
-                if hasattr(student, 'personalinfo'):
-                    parent_email = student.personalinfo.parent_email
-                    
-                deficit_students.append({
-                    'roll': student.roll_number,
-                    'name': student.student_name,
-                    'present': attended_sessions,
-                    'total': total_sessions,
-                    'percentage': percentage,
-                    'parent_email': parent_email
-                })
+        date__gte=month_start,
+        date__lt=next_month(month_start)
+    ).values_list('date', flat=True).distinct().count()
+    
+    # Session and hour-weighted (Lab = 3 hrs) percentages for the whole semester at once
+    deficit_students = get_attendance_deficits(staff.assigned_semester, target_year, target_month)
+
+    # Mark students whose parents were already alerted (or are queued) for this month
+    rolls = [d['roll'] for d in deficit_students]
+    notified = set(MailLog.objects.filter(
+        student__in=rolls,
+        remark_type='Attendance Deficit',
+        month=month_name,
+        year=str(target_year)
+    ).values_list('student', flat=True))
+    queued = set(MailOutbox.objects.filter(
+        student__in=rolls,
+        remark_type='Attendance Deficit',
+        month=month_name,
+        year=str(target_year),
+        status__in=['Pending', 'Sending']
+    ).values_list('student', flat=True))
+    for row in deficit_students:
+        row['mail_sent'] = row['roll'] in notified
+        row['mail_queued'] = row['roll'] in queued
     
     return render(request, 'staff/attendance_deficit_list.html', {
         'staff': staff,
         'deficit_students': deficit_students,
-        'month_name': f"{month_name} {target_year}",
+        'month_name': month_name,
         'working_days': working_days_count, # Just for reference
         'month_offset': month_offset
     })
 
+@staff_required()
 def send_deficit_email(request):
-    """Action to send the deficit email."""
-    if 'staff_id' not in request.session:
-        return redirect('staffs:stafflogin')
-        
+    """Action to queue the deficit email for one student."""
     if request.method == 'POST':
         student_roll = request.POST.get('student_roll')
         month_offset = request.POST.get('month_offset')
         
-        staff = get_object_or_404(Staff, staff_id=request.session['staff_id'])
+        staff = request.staff
         student = get_object_or_404(Student, roll_number=student_roll)
         
-        # Re-calculate to get data for email (Hours based)
-        import datetime
-        import calendar
-        from students.models import StudentAttendance
-        from .models import MailLog
+        from .deficit import resolve_month, get_attendance_rows
+        from .outbox import enqueue_deficit_mails
         
-        today = datetime.date.today()
         offset = int(month_offset) if month_offset else 0
-        target_date = today
-        for _ in range(offset):
-            target_date = target_date.replace(day=1) - datetime.timedelta(days=1)
+        target_year, target_month, month_name = resolve_month(offset)
+        
+        # Hours based figures for the email (Lab = 3 hrs)
+        rows = get_attendance_rows(staff.assigned_semester, target_year, target_month, roll_numbers=[student.roll_number])
+        if not rows:
+            rows = [{
+                'student': student,
+                'roll': student.roll_number,
+                'hours_percentage': 0,
+                'total_hours': 0,
+                'present_hours': 0,
+                'parent_email': student.personalinfo.parent_email if hasattr(student, 'personalinfo') else None,
+            }]
             
-        target_month = target_date.month
-        target_year = target_date.year
-        month_name = f"{calendar.month_name[target_month]} {target_year}"
-        
-        attendance_records = StudentAttendance.objects.filter(
-            subject__semester=staff.assigned_semester,
-            date__year=target_year,
-            date__month=target_month,
-            student=student
-        ).select_related('subject')
-        
-        total_hours = 0
-        attended_hours = 0
-        for record in attendance_records:
-            hours = 3 if record.subject.subject_type == 'Lab' else 1
-            total_hours += hours
-            if record.status == 'Present':
-                attended_hours += hours
-        
-        percentage = 0
-        if total_hours > 0:
-            percentage = int((attended_hours / total_hours) * 100)
-            
-        # Send Email
-        from .utils import send_attendance_deficit_email
-        if send_attendance_deficit_email(student, month_name, percentage, total_hours, attended_hours, staff.name):
-            # Log the email
-            MailLog.objects.create(
-                student=student,
-                staff=staff,
-                remark_type='Attendance Deficit',
-                month=month_name,
-                year=str(target_year)
-            )
-            messages.success(request, f"Alert sent to {student.student_name}'s parent.")
+        # Queue Email - the process_mail_outbox worker sends it and writes the MailLog
+        if not rows[0]['parent_email']:
+            messages.error(request, "Cannot send email. Parent email does not exist.")
+        elif enqueue_deficit_mails(staff, rows, month_name, target_year):
+            messages.success(request, f"Alert queued for {student.student_name}'s parent.")
         else:
-            messages.error(request, "Failed to send email. Check if parent email exists.")
+            messages.info(request, f"An alert for {student.student_name} is already queued or sent for {month_name}.")
             
         from django.urls import reverse
         return redirect(f"{reverse('staffs:attendance_deficit_list')}?month_offset={offset}")
         
     from django.urls import reverse
     return redirect('staffs:attendance_deficit_list')
+
+@staff_required()
+def send_all_deficit_emails(request):
+    """Action to queue alerts to the parents of every deficit student for the month."""
+    from django.urls import reverse
+
+    if request.method != 'POST':
+        return redirect('staffs:attendance_deficit_list')
+
+    staff = request.staff
+    if staff.role != 'Class Incharge' or not staff.assigned_semester:
+        messages.error(request, "Access Restricted to Class Incharge.")
+        return redirect('staffs:staff_dashboard')
+
+    from .deficit import resolve_month, get_attendance_deficits
+    from .outbox import enqueue_deficit_mails
+
+    offset = int(request.POST.get('month_offset') or 0)
+    target_year, target_month, month_name = resolve_month(offset)
+
+    queued = enqueue_deficit_mails(
+        staff,
+        get_attendance_deficits(staff.assigned_semester, target_year, target_month),
+        month_name,
+        target_year
+    )
+
+    if queued:
+        messages.success(request, f"{queued} alert(s) queued. They will be emailed to parents shortly.")
+    else:
+        messages.info(request, "No pending alerts to send for this month.")
+
+    return redirect(f"{reverse('staffs:attendance_deficit_list')}?month_offset={offset}")
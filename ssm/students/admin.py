@@ -2,7 +2,7 @@ from django.contrib import admin
 from .models import (
     Student, PersonalInfo, AcademicHistory, DiplomaDetails, UGDetails, PGDetails,
     PhDDetails, ScholarshipInfo, StudentDocuments, BankDetails, OtherDetails,
-    StudentSkill, StudentProject
+    StudentSkill, StudentProject, GradingScheme
 )
 
 class PersonalInfoInline(admin.StackedInline):
@@ -104,7 +104,11 @@ class StudentAdmin(admin.ModelAdmin):
     @admin.action(description='Promote selected students to next semester')
     def promote_students(self, request, queryset):
         from django.db.models import F
+        from staffs.dashboard_counters import invalidate_dashboard_counters
+        from ssm.principal import invalidate_students
         updated_count = queryset.filter(current_semester__lte=8).update(current_semester=F('current_semester') + 1)
+        invalidate_dashboard_counters('students')
+        invalidate_students()
         self.message_user(request, f"{updated_count} students were successfully promoted.")
 
     # Removed get_urls and generate_students_view from here to move to StudentGeneratorAdmin
@@ -252,3 +256,8 @@ class StudentGeneratorAdmin(admin.ModelAdmin):
         
         # Initial GET request
         return render(request, 'staff/generate_student.html', {'is_admin': True})
+
+
+@admin.register(GradingScheme)
+class GradingSchemeAdmin(admin.ModelAdmin):
+    list_display = ('name', 'first_batch_year', 'updated_at')
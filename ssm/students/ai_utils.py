@@ -322,9 +322,10 @@ def _handle_api_error(error, client):
         return {"error": f"AI service error: {error_msg[:200]}"}
 
 
-def extract_grades_from_image(image_file, api_key=None):
+def extract_grades_from_image(image_file, api_key=None, grades=None):
     """
     Extracts grade data from a result screenshot using Gemini Pro Vision (or Flash).
+    `grades` lists the valid grade letters of the student's grading scheme, best first.
     """
     try:
         if not api_key:
@@ -337,23 +338,28 @@ def extract_grades_from_image(image_file, api_key=None):
         
         # Read image bytes
         image_bytes = image_file.read()
+
+        if not grades:
+            from .grading import DEFAULT_SCHEME
+            grades = DEFAULT_SCHEME.grades
+        valid_grades = ", ".join(f"'{grade}'" for grade in grades)
         
-        prompt = """
+        prompt = f"""
         Analyze this academic result screenshot. Extract the data into a JSON structure.
         
         I need a list of subjects with the following fields:
         - subject_code (string, optional)
         - subject_name (string)
-        - grade (string, Valid values: 'S' (top), 'A', 'B', 'C', 'D', 'E', 'RA' (Reappear/Fail), 'W' (Withdraw))
+        - grade (string, Valid values, best first: {valid_grades})
         - credits (float, default to 3 or 4 if not visible but usually 3 for theory, 2 for labs, 4 for major)
         
         Format:
-        {
+        {{
             "subjects": [
-                {"code": "CS123", "name": "Subject Name", "grade": "A+", "credits": 3},
+                {{"code": "CS123", "name": "Subject Name", "grade": "{grades[0]}", "credits": 3}},
                 ...
             ]
-        }
+        }}
         
         If you see "PASS", "FAIL", ignore it. Focus on individual subject grades.
         If credits are not visible, estimate based on subject type (Lab=2, Theory=3/4, Project=10).
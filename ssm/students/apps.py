@@ -6,3 +6,4 @@ class StudentsConfig(AppConfig):
     name = 'students'
     def ready(self):
         import students.signals_push
+        import students.grading
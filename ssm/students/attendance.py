@@ -0,0 +1,326 @@
+"""
+Attendance helpers shared by the staff and student views.
+"""
+import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import StudentAttendance, AttendanceSummary, ArchivedAttendance
+from .semester_sheet import invalidate_semester_sheets
+
+
+ATTENDANCE_STATUSES = ('Present', 'Absent')
+
+# A Lab session is a 3-hour block; everything else counts as one hour
+LAB_SESSION_HOURS = 3
+
+# Cached month calendars are invalidated on write, the timeout only bounds staleness of subject codes
+CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def session_hours(subject_type):
+    """Returns how many hours one session of a subject type is worth."""
+    return LAB_SESSION_HOURS if subject_type == 'Lab' else 1
+
+
+def next_month(day):
+    """Returns the first day of the month after `day`."""
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def save_attendance_sheet(subject, date, time, end_time, statuses):
+    """
+    Saves one class sheet (subject + date + time) in a single transaction.
+
+    `statuses` maps roll_number -> 'Present' / 'Absent'. See
+    save_attendance_sheets() for how the write is batched.
+
+    Returns a dict with 'inserted', 'updated', 'unchanged' and 'present' counts.
+    """
+    return save_attendance_sheets([(subject, date, time, end_time, statuses)])[0]
+
+
+def save_attendance_sheets(sheets):
+    """
+    Saves many class sheets, each a (subject, date, time, end_time, statuses)
+    tuple, in a single transaction.
+
+    Existing rows of all the slots are loaded in one query and diffed against
+    the sheets: new rows go through one bulk_create (upsert, so a concurrent
+    submission of the same sheet cannot fail on the unique key) and changed
+    rows through one bulk_update. Summaries are refreshed once per subject.
+    The upsert cannot match rows without a class time (NULLs never conflict),
+    so sheets without one lock their subject row for the duration instead.
+
+    Returns one result dict per sheet, in order, with 'inserted', 'updated',
+    'unchanged' and 'present' counts.
+    """
+    results = []
+    slots = []
+    for subject, date, time, end_time, statuses in sheets:
+        statuses = {roll: status for roll, status in statuses.items() if status in ATTENDANCE_STATUSES}
+        results.append({'inserted': 0, 'updated': 0, 'unchanged': 0, 'present': 0})
+        slots.append((subject, date, time, end_time, statuses))
+
+    slot_filter = Q()
+    for subject, date, time, end_time, statuses in slots:
+        if statuses:
+            slot_filter |= Q(subject=subject, date=date, time=time, student_id__in=list(statuses))
+    if not slot_filter:
+        return results
+
+    with transaction.atomic():
+        untimed_subject_ids = sorted({subject.id for subject, date, time, end_time, statuses in slots if time is None and statuses})
+        if untimed_subject_ids:
+            from staffs.models import Subject
+            list(Subject.objects.select_for_update().filter(id__in=untimed_subject_ids).values_list('id', flat=True))
+
+        existing = {
+            (row.subject_id, row.date, row.time, row.student_id): row
+            for row in StudentAttendance.objects.filter(slot_filter)
+        }
+
+        to_create = []
+        to_update = []
+        changed = {}  # subject_id -> (subject, {rolls}, {dates})
+        for (subject, date, time, end_time, statuses), result in zip(slots, results):
+            for roll, status in statuses.items():
+                row = existing.get((subject.id, date, time, roll))
+                if row is None:
+                    row = StudentAttendance(
+                        student_id=roll,
+                        subject=subject,
+                        date=date,
+                        time=time,
+                        end_time=end_time,
+                        status=status,
+                    )
+                    # Later sheets for the same slot overwrite earlier ones
+                    existing[(subject.id, date, time, roll)] = row
+                    to_create.append(row)
+                    result['inserted'] += 1
+                elif row.status != status or row.end_time != end_time:
+                    row.status = status
+                    row.end_time = end_time
+                    if row.pk:
+                        to_update.append(row)
+                    result['updated'] += 1
+                else:
+                    result['unchanged'] += 1
+                    continue
+
+                entry = changed.setdefault(subject.id, (subject, set(), set()))
+                entry[1].add(roll)
+                entry[2].add(date)
+
+            result['present'] = sum(1 for status in statuses.values() if status == 'Present')
+
+        if to_create:
+            StudentAttendance.objects.bulk_create(
+                to_create,
+                update_conflicts=True,
+                unique_fields=['student', 'subject', 'date', 'time'],
+                update_fields=['status', 'end_time'],
+            )
+        if to_update:
+            StudentAttendance.objects.bulk_update(list({row.pk: row for row in to_update}.values()), ['status', 'end_time'])
+
+        for subject, rolls, dates in changed.values():
+            refresh_attendance_summary(subject, rolls, dates)
+            transaction.on_commit(lambda rolls=rolls, dates=dates: invalidate_attendance_calendar(rolls, dates))
+
+    return results
+
+
+def attendance_counts_by_student(attendance_qs):
+    """
+    Groups an attendance queryset by student in one query.
+
+    Returns {roll_number: {'present': n, 'absent': n, 'total': n}}; students
+    with no rows in the queryset are simply absent from the map.
+    """
+    rows = attendance_qs.order_by().values('student').annotate(
+        present=Count('id', filter=Q(status='Present')),
+        absent=Count('id', filter=Q(status='Absent')),
+        total=Count('id'),
+    )
+    return {
+        row['student']: {'present': row['present'], 'absent': row['absent'], 'total': row['total']}
+        for row in rows
+    }
+
+
+def build_summary_rows(attendance_qs):
+    """
+    Aggregates an attendance queryset into unsaved AttendanceSummary rows,
+    one per (student, subject, month).
+    """
+    rows = attendance_qs.order_by().annotate(month=TruncMonth('date')).values(
+        'student', 'subject', 'subject__subject_type', 'month'
+    ).annotate(
+        present=Count('id', filter=Q(status='Present')),
+        absent=Count('id', filter=Q(status='Absent')),
+        total=Count('id'),
+    )
+    for row in rows:
+        hours = session_hours(row['subject__subject_type'])
+        yield AttendanceSummary(
+            student_id=row['student'],
+            subject_id=row['subject'],
+            month=row['month'],
+            present=row['present'],
+            absent=row['absent'],
+            total=row['total'],
+            present_hours=row['present'] * hours,
+            total_hours=row['total'] * hours,
+        )
+
+
+def refresh_attendance_summary(subject, student_ids, dates):
+    """
+    Recomputes the summary rows of one subject for the given students and the
+    months covering `dates`. Runs inside the caller's transaction so the
+    summary never drifts from the attendance rows it was built from.
+    """
+    months = sorted({day.replace(day=1) for day in dates})
+    attendance_qs = StudentAttendance.objects.filter(
+        subject=subject,
+        student_id__in=list(student_ids),
+        date__gte=months[0],
+        date__lt=next_month(months[-1]),
+    )
+    AttendanceSummary.objects.bulk_create(
+        list(build_summary_rows(attendance_qs)),
+        update_conflicts=True,
+        unique_fields=['student', 'subject', 'month'],
+        update_fields=['present', 'absent', 'total', 'present_hours', 'total_hours', 'updated_at'],
+    )
+    rolls = list(student_ids)
+    transaction.on_commit(lambda: invalidate_semester_sheets(rolls, subject.semester))
+
+
+def summary_counts_by(summary_qs, field):
+    """
+    Sums an AttendanceSummary queryset grouped by `field` (e.g. 'student' or
+    'subject') in one query.
+
+    Returns {value: {'present', 'absent', 'total', 'present_hours', 'total_hours'}}.
+    """
+    rows = summary_qs.order_by().values(field).annotate(
+        present_sum=Sum('present'),
+        absent_sum=Sum('absent'),
+        total_sum=Sum('total'),
+        present_hours_sum=Sum('present_hours'),
+        total_hours_sum=Sum('total_hours'),
+    )
+    return {
+        row[field]: {
+            'present': row['present_sum'],
+            'absent': row['absent_sum'],
+            'total': row['total_sum'],
+            'present_hours': row['present_hours_sum'],
+            'total_hours': row['total_hours_sum'],
+        }
+        for row in rows
+    }
+
+
+ARCHIVE_FIELDS = ('student_id', 'subject_id', 'date', 'time', 'end_time', 'status')
+
+
+def archive_student_attendance(student_ids, semester, batch_size=1000):
+    """
+    Moves the raw attendance of `semester`'s subjects for the given students
+    from StudentAttendance into the append-only ArchivedAttendance table.
+
+    AttendanceSummary rows are left untouched, so every aggregate keeps
+    working after the move. Returns the number of rows archived.
+    """
+    live = StudentAttendance.objects.filter(student_id__in=list(student_ids), subject__semester=semester)
+    with transaction.atomic():
+        rows = [
+            ArchivedAttendance(semester=semester, **dict(zip(ARCHIVE_FIELDS, values)))
+            for values in live.values_list(*ARCHIVE_FIELDS).iterator()
+        ]
+        ArchivedAttendance.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+        live.delete()
+    return len(rows)
+
+
+def restore_student_attendance(student_ids, semester, batch_size=1000):
+    """
+    Moves archived attendance of `semester` back into StudentAttendance, e.g.
+    when students are demoted into a semester that was already archived.
+    Returns the number of rows restored.
+    """
+    archived = ArchivedAttendance.objects.filter(student_id__in=list(student_ids), semester=semester)
+    with transaction.atomic():
+        rows = [
+            StudentAttendance(**dict(zip(ARCHIVE_FIELDS, values)))
+            for values in archived.values_list(*ARCHIVE_FIELDS).iterator()
+        ]
+        StudentAttendance.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+        archived.delete()
+    return len(rows)
+
+
+def build_calendar_days(history):
+    """
+    Turns (date, subject_code, status) tuples into the calendar structure used
+    by the student pages: {'YYYY-MM-DD': {'color': ..., 'details': [...]}}.
+    """
+    days = {}
+    for date, subject_code, status in history:
+        day = days.setdefault(date.strftime('%Y-%m-%d'), {'present': 0, 'absent': 0, 'details': []})
+        day['details'].append({'subject': subject_code or 'General', 'status': status})
+        if status == 'Present':
+            day['present'] += 1
+        else:
+            day['absent'] += 1
+
+    calendar_days = {}
+    for key, day in days.items():
+        if day['present'] == 0 and day['absent'] > 0:
+            color = 'red'  # Fully Absent
+        elif day['present'] > 0 and day['absent'] > 0:
+            color = 'orange'  # Partial
+        else:
+            color = 'green'  # All Present
+        calendar_days[key] = {'color': color, 'details': day['details']}
+    return calendar_days
+
+
+def calendar_cache_key(student_id, year, month):
+    return f"attendance_calendar:{student_id}:{year:04d}-{month:02d}"
+
+
+def attendance_calendar_month(student_id, year, month):
+    """
+    Returns the calendar days of one month for a student, live and archived
+    attendance alike. Results are cached per (student, month) and dropped by
+    invalidate_attendance_calendar() whenever that month is written.
+    """
+    key = calendar_cache_key(student_id, year, month)
+    days = cache.get(key)
+    if days is None:
+        month_start = datetime.date(year, month, 1)
+        columns = ('date', 'subject__code', 'status')
+        bounds = {'student_id': student_id, 'date__gte': month_start, 'date__lt': next_month(month_start)}
+        history = list(StudentAttendance.objects.filter(**bounds).order_by('date', 'time').values_list(*columns))
+        history += ArchivedAttendance.objects.filter(**bounds).order_by('date', 'time').values_list(*columns)
+        days = build_calendar_days(history)
+        cache.set(key, days, CALENDAR_CACHE_TIMEOUT)
+    return days
+
+
+def invalidate_attendance_calendar(student_ids, dates):
+    """Drops the cached month calendars covering `dates` for the given students."""
+    months = {(day.year, day.month) for day in dates}
+    cache.delete_many([
+        calendar_cache_key(student_id, year, month)
+        for student_id in student_ids
+        for year, month in months
+    ])
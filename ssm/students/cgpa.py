@@ -0,0 +1,86 @@
+"""
+Running CGPA maintained on write.
+
+Every write of StudentGPA records (save_gpa_api, semester archiving) calls
+update_running_cgpa in the same transaction, which stores on each record the
+CGPA and credits up to that semester and on the student the overall CGPA.
+Pages read these fields instead of re-summing gpa * total_credits. The
+check_cgpa_consistency command recomputes them for every student.
+"""
+from functools import partial
+
+from django.db import transaction
+
+from ssm.principal import invalidate_students
+from .models import Student, StudentGPA
+
+
+def running_series(records):
+    """
+    Yields (record, running_cgpa, cumulative_credits) for one student's
+    records in semester order.
+    """
+    points = 0.0
+    credits = 0.0
+    for record in sorted(records, key=lambda record: record.semester):
+        points += record.gpa * record.total_credits
+        credits += record.total_credits
+        yield record, round(points / credits, 2) if credits > 0 else 0.0, credits
+
+
+def _group(records):
+    grouped = {}
+    for record in records:
+        grouped.setdefault(record.student_id, []).append(record)
+    return grouped
+
+
+def update_running_cgpa(roll_numbers, dry_run=False):
+    """
+    Recomputes and stores the running CGPA of the given students. The student
+    rows are locked so concurrent saves for one student apply one after the
+    other.
+
+    Returns (cgpas, stale): cgpas maps roll_number -> CGPA and stale lists the
+    students whose stored values were out of date. With dry_run nothing is
+    written.
+    """
+    roll_numbers = list(roll_numbers)
+    if not roll_numbers:
+        return {}, []
+    with transaction.atomic():
+        students = list(
+            Student.objects.select_for_update().filter(roll_number__in=roll_numbers)
+            .only('roll_number', 'cgpa', 'cumulative_credits')
+        )
+        grouped = _group(StudentGPA.objects.filter(student__in=roll_numbers).only(
+            'student_id', 'semester', 'gpa', 'total_credits', 'running_cgpa', 'cumulative_credits'
+        ))
+
+        cgpas = {}
+        stale = set()
+        records_changed = []
+        students_changed = []
+        for student in students:
+            cgpa, credits = 0.0, 0.0
+            for record, cgpa, credits in running_series(grouped.get(student.roll_number, [])):
+                if (record.running_cgpa, record.cumulative_credits) != (cgpa, credits):
+                    record.running_cgpa = cgpa
+                    record.cumulative_credits = credits
+                    records_changed.append(record)
+                    stale.add(student.roll_number)
+            if (student.cgpa, student.cumulative_credits) != (cgpa, credits):
+                student.cgpa = cgpa
+                student.cumulative_credits = credits
+                students_changed.append(student)
+                stale.add(student.roll_number)
+            cgpas[student.roll_number] = cgpa
+
+        if not dry_run:
+            StudentGPA.objects.bulk_update(records_changed, ['running_cgpa', 'cumulative_credits'])
+            Student.objects.bulk_update(students_changed, ['cgpa', 'cumulative_credits'])
+            if students_changed:
+                # bulk_update sends no signals; refresh the cached session students
+                rolls = [student.roll_number for student in students_changed]
+                transaction.on_commit(partial(invalidate_students, rolls))
+    return cgpas, sorted(stale)
@@ -0,0 +1,162 @@
+"""
+Data for the student dashboard (stddash.html / student_profile_status.html).
+
+build_student_dashboard assembles the page in a fixed number of queries,
+however many GPA records, skills, projects or leave requests the student has:
+
+    1. the student with PersonalInfo, AcademicHistory and StudentDocuments
+       (one select_related chain; also read by calculate_profile_completion)
+    2-5. GPA records, skills, projects and the recent leave requests
+       (prefetch_related)
+    6. the current semester sheet, one grouped query for every subject's
+       marks and attendance totals (cached per student, see semester_sheet)
+    7. the news feed (cached per day, see staffs/news_feed.py)
+"""
+from dataclasses import dataclass, field
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+
+RECENT_LEAVES_LIMIT = 5
+
+PROFILE_RELATED = ('personalinfo', 'academichistory', 'studentdocuments')
+
+
+@dataclass
+class StudentDashboard:
+    student: object
+    news_list: list
+    attendance_percentage: float
+    gpa_records: list
+    gpa_labels: list
+    gpa_data: list
+    cgpa: float
+    skills: list
+    projects: list
+    recent_leaves: list
+    profile_completion_percentage: int
+    is_profile_complete: bool
+    today: str = field(default_factory=lambda: timezone.now().strftime('%A'))
+
+    def as_context(self):
+        """Template context; a shallow dict so model instances are passed as-is."""
+        return {name: getattr(self, name) for name in self.__dataclass_fields__}
+
+
+def calculate_profile_completion(student):
+    """
+    Calculates the percentage of the profile that is complete.
+    Based on key fields in Student and related models.
+    """
+    total_fields = 0
+    filled_fields = 0
+
+    # helper
+    def check_model_fields(model_instance, fields_to_check):
+        nonlocal total_fields, filled_fields
+        if not model_instance:
+            total_fields += len(fields_to_check)
+            return
+
+        for field_name in fields_to_check:
+            total_fields += 1
+            val = getattr(model_instance, field_name, None)
+            if val and str(val).strip(): # Check for non-empty
+                filled_fields += 1
+
+    # 1. Student Model (Core)
+    check_model_fields(student, ['student_name', 'student_email', 'program_level', 'current_semester'])
+
+    # 2. Personal Info / 3. Academic History (OneToOne accessors; no query
+    # when the student was loaded with select_related(*PROFILE_RELATED))
+    check_model_fields(getattr(student, 'personalinfo', None),
+                       ['date_of_birth', 'gender', 'student_mobile', 'father_name', 'father_mobile', 'present_address'])
+    check_model_fields(getattr(student, 'academichistory', None),
+                       ['sslc_percentage', 'sslc_year_of_passing', 'hsc_percentage', 'hsc_year_of_passing'])
+
+    if total_fields == 0: return 0
+
+    percentage = int((filled_fields / total_fields) * 100)
+    return min(percentage, 100)
+
+
+def _current_semester_record(student, sheet):
+    """
+    The current semester as a pseudo GPA record built from the sheet, for a
+    semester that has no StudentGPA yet. None if it has no subjects.
+    """
+    subject_data = []
+    for row in sheet:
+        entry = {
+            'code': row['subject']['code'],
+            'name': row['subject']['name'],
+            'credits': row['subject']['credits'],
+            'attendance_percentage': row['percentage'],
+            'grade': 'N/A' # Not generated yet
+        }
+        if row['has_marks']:
+            entry.update({
+                'test1_marks': row['test1'],
+                'test2_marks': row['test2'],
+                'internal_marks': row['internal'],
+            })
+        subject_data.append(entry)
+    if not subject_data:
+        return None
+    # Mimics the structure the template reads from StudentGPA
+    return {
+        'semester': student.current_semester,
+        'gpa': 0.0, # Placeholder
+        'subject_data': subject_data,
+    }
+
+
+def build_student_dashboard(roll_number):
+    """Returns the StudentDashboard of the student, or None if they no longer exist."""
+    from staffs.news_feed import news_feed
+    from .models import LeaveRequest, Student, StudentGPA
+    from .semester_sheet import semester_sheet
+
+    student = Student.objects.defer('password').select_related(*PROFILE_RELATED).prefetch_related(
+        Prefetch('gpa_records', queryset=StudentGPA.objects.order_by('semester')),
+        'skills',
+        'projects',
+        Prefetch(
+            'leave_requests',
+            queryset=LeaveRequest.objects.order_by('-created_at')[:RECENT_LEAVES_LIMIT],
+            to_attr='recent_leaves',
+        ),
+    ).filter(roll_number=roll_number).first()
+    if student is None:
+        return None
+
+    # Current semester subjects with marks and attendance
+    sheet = semester_sheet(student)
+    total_classes = sum(row['total'] for row in sheet)
+    present_classes = sum(row['present'] for row in sheet)
+    attendance_percentage = 0
+    if total_classes > 0:
+        attendance_percentage = round((present_classes / total_classes) * 100, 1)
+
+    gpa_records = list(student.gpa_records.all())
+    if student.current_semester not in {record.semester for record in gpa_records}:
+        current = _current_semester_record(student, sheet)
+        if current:
+            gpa_records.append(current)
+
+    return StudentDashboard(
+        student=student,
+        news_list=news_feed('Student'),
+        attendance_percentage=attendance_percentage,
+        gpa_records=gpa_records,
+        gpa_labels=[f"Sem {record.semester if isinstance(record, StudentGPA) else record['semester']}" for record in gpa_records],
+        gpa_data=[record.gpa if isinstance(record, StudentGPA) else 0.0 for record in gpa_records],
+        # CGPA is maintained on write (students.cgpa)
+        cgpa=student.cgpa,
+        skills=list(student.skills.all()),
+        projects=list(student.projects.all()),
+        recent_leaves=student.recent_leaves,
+        profile_completion_percentage=calculate_profile_completion(student),
+        is_profile_complete=student.is_profile_complete,
+    )
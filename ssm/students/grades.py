@@ -0,0 +1,80 @@
+"""
+Keeps StudentSubjectGrade rows in sync with StudentGPA.subject_data.
+"""
+import re
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import StudentSubjectGrade
+
+
+RESULTS_VERSION_KEY = 'subject_grades_version'
+
+
+def results_version():
+    """Cache version of the StudentSubjectGrade table, bumped on every sync."""
+    return cache.get_or_set(RESULTS_VERSION_KEY, 1, None)
+
+
+def bump_results_version():
+    try:
+        cache.incr(RESULTS_VERSION_KEY)
+    except ValueError:
+        cache.set(RESULTS_VERSION_KEY, 1, None)
+
+
+def normalize_code(code):
+    """Subject codes are matched case-insensitively and ignoring whitespace."""
+    return re.sub(r'\s+', '', str(code or '')).upper()
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def subject_grade_rows(record, grade_points=None):
+    """
+    Builds unsaved StudentSubjectGrade rows for one StudentGPA record.
+    Entries carrying their own 'points' keep them, otherwise the points are
+    looked up from `grade_points` by grade (see students.grading).
+    """
+    grade_points = grade_points or {}
+    for entry in record.subject_data or []:
+        if not isinstance(entry, dict):
+            continue
+        code = str(entry.get('code') or '').strip()
+        grade = str(entry.get('grade') or '').strip()
+        if not code and not grade:
+            continue
+        points = entry.get('points')
+        yield StudentSubjectGrade(
+            gpa_record=record,
+            student_id=record.student_id,
+            semester=record.semester,
+            code=code[:50],
+            code_normalized=normalize_code(code)[:50],
+            name=str(entry.get('name') or '')[:255],
+            grade=grade[:10],
+            points=_to_float(points) if points is not None else grade_points.get(grade, 0),
+            credits=_to_float(entry.get('credits')),
+        )
+
+
+def sync_subject_grades(records, grade_points=None):
+    """
+    Replaces the StudentSubjectGrade rows of the given StudentGPA records
+    with fresh rows built from their subject_data.
+    """
+    records = list(records)
+    if not records:
+        return
+    StudentSubjectGrade.objects.filter(gpa_record__in=records).delete()
+    StudentSubjectGrade.objects.bulk_create([
+        row for record in records for row in subject_grade_rows(record, grade_points)
+    ])
+    # Retires cached result analytics (staffs.analytics) once the write is committed
+    transaction.on_commit(bump_results_version)
@@ -0,0 +1,181 @@
+"""
+Grading scale engine.
+
+Every GPA computation (semester archiving, the GPA calculator, grade
+extraction from result screenshots) reads its scale from a GradingScheme.
+Schemes are compiled once into a sorted array of score cutoffs, so grading a
+single mark is a bisect and grading a whole cohort is one numpy searchsorted.
+Compiled schemes are kept per process and reloaded when a scheme is saved or
+deleted (a version counter in the cache) or after GRADING_RELOAD_SECONDS, so
+processes that do not share a cache still pick up edits.
+"""
+import bisect
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import GradingScheme
+
+
+# Scale the semester archive and CGPA history used before schemes were configurable,
+# used when no GradingScheme row exists. C and AB were never assigned from a score.
+DEFAULT_BANDS = [
+    {'grade': 'O', 'min_score': 90, 'points': 10},
+    {'grade': 'A+', 'min_score': 80, 'points': 9},
+    {'grade': 'A', 'min_score': 70, 'points': 8},
+    {'grade': 'B+', 'min_score': 60, 'points': 7},
+    {'grade': 'B', 'min_score': 50, 'points': 6},
+    {'grade': 'C', 'points': 5},
+    {'grade': 'RA', 'min_score': 0, 'points': 0},
+    {'grade': 'AB', 'points': 0},
+    {'grade': 'W', 'points': 0, 'counts_credits': False},
+]
+
+GRADING_VERSION_KEY = 'grading_scheme_version'
+GRADING_RELOAD_SECONDS = 300
+
+
+class CompiledScheme:
+    """A grading scheme compiled for fast lookups. Raises ValueError for invalid bands."""
+
+    def __init__(self, name, bands, first_batch_year=None):
+        self.name = name
+        self.first_batch_year = first_batch_year
+
+        if not isinstance(bands, list) or not bands:
+            raise ValueError("A scheme needs at least one band")
+        self.bands = []
+        seen = set()
+        for band in bands:
+            if not isinstance(band, dict) or not str(band.get('grade') or '').strip():
+                raise ValueError("Every band needs a grade")
+            grade = str(band['grade']).strip()
+            if grade in seen:
+                raise ValueError(f"Grade {grade} is listed twice")
+            seen.add(grade)
+            try:
+                points = float(band.get('points', 0))
+                min_score = None if band.get('min_score') is None else float(band['min_score'])
+            except (TypeError, ValueError):
+                raise ValueError(f"Grade {grade}: points and min_score must be numbers")
+            self.bands.append({
+                'grade': grade,
+                'min_score': min_score,
+                'points': points,
+                'counts_credits': band.get('counts_credits', True) is not False,
+            })
+
+        scored = sorted((band for band in self.bands if band['min_score'] is not None), key=lambda band: band['min_score'])
+        if not scored or scored[0]['min_score'] > 0:
+            raise ValueError("One band must start at min_score 0 so every score gets a grade")
+        if len({band['min_score'] for band in scored}) != len(scored):
+            raise ValueError("Two bands share the same min_score")
+
+        # Ascending cutoffs; index i covers [cutoffs[i], cutoffs[i + 1])
+        self.cutoffs = np.array([band['min_score'] for band in scored], dtype=float)
+        self._cutoff_list = self.cutoffs.tolist()
+        self.score_grades = np.array([band['grade'] for band in scored], dtype=object)
+        self.score_points = np.array([band['points'] for band in scored], dtype=float)
+
+        self.points_by_grade = {band['grade']: band['points'] for band in self.bands}
+        self.non_credit_grades = {band['grade'] for band in self.bands if not band['counts_credits']}
+        # Failing grades (arrears): credits count but earn no points, e.g. RA
+        self.fail_grades = {band['grade'] for band in self.bands if band['counts_credits'] and band['points'] <= 0}
+
+    @property
+    def grades(self):
+        """Grade letters, best first as listed in the scheme."""
+        return [band['grade'] for band in self.bands]
+
+    def grade_for(self, score):
+        """Returns (grade, grade_point) for one score."""
+        index = max(bisect.bisect_right(self._cutoff_list, score) - 1, 0)
+        return self.score_grades[index], float(self.score_points[index])
+
+    def grade_array(self, scores):
+        """Grades an array of scores at once. Returns (grades, points) arrays of the same shape."""
+        index = np.searchsorted(self.cutoffs, np.asarray(scores, dtype=float), side='right') - 1
+        np.clip(index, 0, None, out=index)
+        return self.score_grades[index], self.score_points[index]
+
+    def points_for(self, grade):
+        return self.points_by_grade.get(grade, 0)
+
+    def as_json(self):
+        """Scale for templates/JS: [{'grade', 'points', 'counts_credits'}], best first."""
+        return [
+            {'grade': band['grade'], 'points': band['points'], 'counts_credits': band['counts_credits']}
+            for band in self.bands
+        ]
+
+
+DEFAULT_SCHEME = CompiledScheme('University default', DEFAULT_BANDS)
+
+_state = {'version': None, 'loaded_at': 0.0, 'default': DEFAULT_SCHEME, 'by_year': [], 'years': []}
+
+
+def bump_grading_version():
+    """Makes every process reload its compiled schemes."""
+    try:
+        cache.incr(GRADING_VERSION_KEY)
+    except ValueError:
+        cache.set(GRADING_VERSION_KEY, 1, None)
+
+
+def _reload_schemes():
+    bump_grading_version()
+    _state['version'] = None
+
+
+@receiver(post_save, sender=GradingScheme)
+@receiver(post_delete, sender=GradingScheme)
+def _grading_scheme_changed(sender, **kwargs):
+    # After commit, so a rolled-back edit is never compiled and readers cannot cache the old rows
+    transaction.on_commit(_reload_schemes)
+
+
+def _load():
+    version = cache.get_or_set(GRADING_VERSION_KEY, 1, None)
+    if version == _state['version'] and time.monotonic() - _state['loaded_at'] < GRADING_RELOAD_SECONDS:
+        return _state
+
+    default = DEFAULT_SCHEME
+    by_year = []
+    for scheme in GradingScheme.objects.all():
+        try:
+            compiled = CompiledScheme(scheme.name, scheme.bands, scheme.first_batch_year)
+        except ValueError:
+            # Invalid rows are rejected by GradingScheme.clean; never grade with a half-valid scale
+            continue
+        if scheme.first_batch_year is None:
+            default = compiled
+        else:
+            by_year.append(compiled)
+    by_year.sort(key=lambda compiled: compiled.first_batch_year)
+
+    _state.update({
+        'version': version,
+        'loaded_at': time.monotonic(),
+        'default': default,
+        'by_year': by_year,
+        'years': [compiled.first_batch_year for compiled in by_year],
+    })
+    return _state
+
+
+def scheme_for_batch(joining_year):
+    """Compiled scheme for students who joined in `joining_year`."""
+    state = _load()
+    if joining_year is not None:
+        index = bisect.bisect_right(state['years'], joining_year) - 1
+        if index >= 0:
+            return state['by_year'][index]
+    return state['default']
+
+
+def scheme_for_student(student):
+    return scheme_for_batch(getattr(student, 'joining_year', None))
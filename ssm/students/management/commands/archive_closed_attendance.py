@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from students.models import StudentAttendance
+from students.attendance import archive_student_attendance
+
+
+class Command(BaseCommand):
+    help = 'Moves attendance of semesters students have already been promoted past into ArchivedAttendance'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show how many rows would be archived without moving them',
+        )
+
+    def handle(self, *args, **options):
+        closed = StudentAttendance.objects.filter(subject__semester__lt=F('student__current_semester'))
+
+        # (semester, roll_number) pairs that still have live rows
+        pending = {}
+        for semester, roll in closed.values_list('subject__semester', 'student').distinct():
+            pending.setdefault(semester, []).append(roll)
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'DRY RUN: Would archive {closed.count()} attendance row(s)')
+            )
+            for semester, rolls in sorted(pending.items()):
+                self.stdout.write(f'  - Semester {semester}: {len(rolls)} student(s)')
+            return
+
+        archived = 0
+        for semester, rolls in sorted(pending.items()):
+            archived += archive_student_attendance(rolls, semester)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully archived {archived} attendance row(s)')
+        )
@@ -0,0 +1,98 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from students.models import StudentAttendance
+from students.attendance import next_month
+
+
+class Command(BaseCommand):
+    help = 'Shows query plans for the hot StudentAttendance queries and (on PostgreSQL) index usage statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE instead of EXPLAIN (PostgreSQL only; executes the queries)',
+        )
+
+    def sample_queries(self):
+        sample = StudentAttendance.objects.select_related('subject').order_by('-date').first()
+        if sample is None:
+            return []
+
+        month_start = sample.date.replace(day=1)
+        month_end = next_month(month_start)
+        semester = sample.subject.semester
+
+        return [
+            (
+                'Subject calendar for a month (subject + date range)',
+                StudentAttendance.objects.filter(
+                    subject=sample.subject_id, date__gte=month_start, date__lt=month_end
+                ).values_list('date', flat=True),
+            ),
+            (
+                'Working days of a semester (subject__semester + date range)',
+                StudentAttendance.objects.filter(
+                    subject__semester=semester, date__gte=month_start, date__lt=month_end
+                ).values_list('date', flat=True).distinct(),
+            ),
+            (
+                'Present sessions of a student in a subject (student + subject, unique key prefix)',
+                StudentAttendance.objects.filter(
+                    student=sample.student_id, subject=sample.subject_id, status='Present'
+                ).values_list('id', flat=True),
+            ),
+            (
+                'Attendance sheet of one day (subject + date)',
+                StudentAttendance.objects.filter(
+                    subject=sample.subject_id, date=sample.date
+                ).values_list('student', 'status'),
+            ),
+            (
+                'Subject attendance in the last 30 days (subject + date range)',
+                StudentAttendance.objects.filter(
+                    subject=sample.subject_id, date__gte=sample.date - datetime.timedelta(days=30)
+                ).values_list('student', 'status'),
+            ),
+        ]
+
+    def handle(self, *args, **options):
+        is_postgres = connection.vendor == 'postgresql'
+        explain_options = {'analyze': True} if options['analyze'] and is_postgres else {}
+
+        queries = self.sample_queries()
+        if not queries:
+            self.stdout.write(self.style.WARNING('No attendance recorded yet - nothing to explain.'))
+
+        for title, queryset in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(title))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
+
+        if not is_postgres:
+            self.stdout.write(self.style.WARNING(
+                f'Index usage statistics are only available on PostgreSQL (current database: {connection.vendor}).'
+            ))
+            return
+
+        table = StudentAttendance._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT indexrelname, idx_scan, idx_tup_read, idx_tup_fetch,
+                       pg_size_pretty(pg_relation_size(indexrelid))
+                FROM pg_stat_user_indexes
+                WHERE relname = %s
+                ORDER BY idx_scan DESC
+                """,
+                [table],
+            )
+            rows = cursor.fetchall()
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Index usage for {table}'))
+        self.stdout.write(f"{'index':<50} {'scans':>10} {'tuples read':>12} {'tuples fetched':>15} {'size':>10}")
+        for name, scans, read, fetched, size in rows:
+            self.stdout.write(f'{name:<50} {scans:>10} {read:>12} {fetched:>15} {size:>10}')
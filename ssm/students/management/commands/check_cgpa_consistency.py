@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from students.models import Student
+from students.cgpa import update_running_cgpa
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored running CGPA of every student from their StudentGPA records and fixes stale values'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report students with stale values',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Students recomputed per transaction (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        roll_numbers = list(Student.objects.order_by('roll_number').values_list('roll_number', flat=True))
+        batch_size = options['batch_size']
+
+        stale = []
+        for start in range(0, len(roll_numbers), batch_size):
+            _, batch_stale = update_running_cgpa(roll_numbers[start:start + batch_size], dry_run=options['dry_run'])
+            stale.extend(batch_stale)
+
+        if options['dry_run']:
+            self.stdout.write(
+                self.style.WARNING(f'DRY RUN: {len(stale)} of {len(roll_numbers)} student(s) have a stale CGPA')
+            )
+            for roll in stale:
+                self.stdout.write(f'  - {roll}')
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {len(roll_numbers)} student(s), fixed {len(stale)} stale CGPA(s)')
+        )
@@ -0,0 +1,46 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from students.models import StudentAttendance, ArchivedAttendance, AttendanceSummary
+from students.attendance import build_summary_rows
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-student, per-subject monthly AttendanceSummary table from raw (live and archived) attendance'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semester',
+            type=int,
+            help='Only rebuild summaries for subjects of this semester',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per bulk insert (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        attendance_qs = StudentAttendance.objects.all()
+        archived_qs = ArchivedAttendance.objects.all()
+        summary_qs = AttendanceSummary.objects.all()
+
+        if options['semester']:
+            attendance_qs = attendance_qs.filter(subject__semester=options['semester'])
+            archived_qs = archived_qs.filter(subject__semester=options['semester'])
+            summary_qs = summary_qs.filter(subject__semester=options['semester'])
+
+        with transaction.atomic():
+            deleted, _ = summary_qs.delete()
+            rows = AttendanceSummary.objects.bulk_create(
+                # A student's semester is either fully live or fully archived, so the keys never overlap
+                chain(build_summary_rows(attendance_qs), build_summary_rows(archived_qs)),
+                batch_size=options['batch_size'],
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt attendance summary: removed {deleted}, created {len(rows)} row(s)')
+        )
@@ -0,0 +1,84 @@
+"""
+Marks sheet validation and diff-only saving for manage_marks.
+"""
+from django.db import transaction
+
+from .models import StudentMarks
+from .semester_sheet import invalidate_semester_sheets
+
+
+# Model field -> form field prefix (inputs are named e.g. "test1_<roll_number>")
+MARK_FIELDS = {
+    'test1_marks': 'test1',
+    'test2_marks': 'test2',
+    'internal_marks': 'internal',
+}
+
+MAX_MARK = 100
+
+
+def parse_marks_sheet(data, roll_numbers):
+    """
+    Validates a posted marks sheet for the given students.
+
+    Returns (sheet, errors): `sheet` maps roll_number -> {field: int or None}
+    and `errors` maps roll_number -> {field: message} for every invalid cell.
+    The sheet should only be saved when `errors` is empty.
+    """
+    sheet = {}
+    errors = {}
+    for roll in roll_numbers:
+        row = {}
+        for field, prefix in MARK_FIELDS.items():
+            raw = (data.get(f'{prefix}_{roll}') or '').strip()
+            if not raw:
+                row[field] = None
+                continue
+            try:
+                value = int(raw)
+            except ValueError:
+                errors.setdefault(roll, {})[field] = f"'{raw}' is not a whole number"
+                continue
+            if not 0 <= value <= MAX_MARK:
+                errors.setdefault(roll, {})[field] = f"Must be between 0 and {MAX_MARK}"
+                continue
+            row[field] = value
+        sheet[roll] = row
+    return sheet, errors
+
+
+def save_marks_sheet(subject, sheet):
+    """
+    Saves a validated sheet for one subject, writing only the rows that
+    changed with a single upsert.
+
+    Returns the diff as {roll_number: {field: [old, new]}}; students whose
+    marks did not change (or who have no row and no marks) are left out.
+    """
+    fields = list(MARK_FIELDS)
+    with transaction.atomic():
+        existing = {
+            row['student_id']: row
+            for row in StudentMarks.objects.filter(subject=subject, student_id__in=list(sheet)).values('student_id', *fields)
+        }
+
+        changes = {}
+        to_write = []
+        for roll, row in sheet.items():
+            old = existing.get(roll, dict.fromkeys(fields))
+            diff = {field: [old[field], row[field]] for field in fields if old[field] != row[field]}
+            if not diff:
+                continue
+            changes[roll] = diff
+            to_write.append(StudentMarks(student_id=roll, subject=subject, **row))
+
+        if to_write:
+            StudentMarks.objects.bulk_create(
+                to_write,
+                update_conflicts=True,
+                unique_fields=['student', 'subject'],
+                update_fields=fields,
+            )
+            rolls = list(changes)
+            transaction.on_commit(lambda: invalidate_semester_sheets(rolls, subject.semester))
+    return changes
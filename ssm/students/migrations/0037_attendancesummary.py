@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-17 15:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
+
+def backfill_attendance_summary(apps, schema_editor):
+    StudentAttendance = apps.get_model('students', 'StudentAttendance')
+    AttendanceSummary = apps.get_model('students', 'AttendanceSummary')
+
+    rows = StudentAttendance.objects.order_by().annotate(month=TruncMonth('date')).values(
+        'student', 'subject', 'subject__subject_type', 'month'
+    ).annotate(
+        present=Count('id', filter=Q(status='Present')),
+        absent=Count('id', filter=Q(status='Absent')),
+        total=Count('id'),
+    )
+    summaries = []
+    for row in rows:
+        hours = 3 if row['subject__subject_type'] == 'Lab' else 1
+        summaries.append(AttendanceSummary(
+            student_id=row['student'],
+            subject_id=row['subject'],
+            month=row['month'],
+            present=row['present'],
+            absent=row['absent'],
+            total=row['total'],
+            present_hours=row['present'] * hours,
+            total_hours=row['total'] * hours,
+        ))
+    AttendanceSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0029_news_document_news_new_gif_end_date_and_more'),
+        ('students', '0036_studentremark_apology_letter_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('present', models.PositiveIntegerField(default=0)),
+                ('absent', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('present_hours', models.PositiveIntegerField(default=0, help_text='Lab sessions count as 3 hours')),
+                ('total_hours', models.PositiveIntegerField(default=0, help_text='Lab sessions count as 3 hours')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='students.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_summaries', to='staffs.subject')),
+            ],
+            options={
+                'unique_together': {('student', 'subject', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_attendance_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-17 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0030_mailoutbox'),
+        ('students', '0037_attendancesummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentattendance',
+            index=models.Index(fields=['subject', 'date'], name='attendance_subject_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentattendance',
+            index=models.Index(fields=['date', 'subject'], name='attendance_date_subject_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentattendance',
+            index=models.Index(condition=models.Q(('status', 'Present')), fields=['student', 'subject'], name='attendance_present_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-17 15:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0030_mailoutbox'),
+        ('students', '0038_studentattendance_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.PositiveSmallIntegerField(help_text='Semester the attendance belongs to')),
+                ('date', models.DateField()),
+                ('time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('Present', 'Present'), ('Absent', 'Absent')], default='Present', max_length=20)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to='students.student')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance', to='staffs.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['student', 'semester'], name='archived_att_student_sem_idx')],
+                'unique_together': {('student', 'subject', 'date', 'time')},
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.7 on 2026-10-17 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('staffs', '0030_mailoutbox'),
+        ('students', '0039_archivedattendance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSyncReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('date', models.DateField()),
+                ('time', models.TimeField(blank=True, null=True)),
+                ('statuses', models.JSONField(default=dict, help_text='roll_number -> status as submitted')),
+                ('recorded_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+                ('staff', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='staffs.staff')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_receipts', to='staffs.subject')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['subject', 'date', 'recorded_at'], name='sync_receipt_slot_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.7 on 2026-10-17 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_subject_grades(apps, schema_editor):
+    StudentGPA = apps.get_model('students', 'StudentGPA')
+    StudentSubjectGrade = apps.get_model('students', 'StudentSubjectGrade')
+
+    # Entries saved by the GPA calculator carry no points of their own
+    calculator_points = {'S': 10, 'A': 9, 'B': 8, 'C': 7, 'D': 6, 'E': 5, 'RA': 0, 'W': 0}
+
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+
+    rows = []
+    for record in StudentGPA.objects.exclude(subject_data=None).iterator():
+        for entry in record.subject_data or []:
+            if not isinstance(entry, dict):
+                continue
+            code = str(entry.get('code') or '').strip()
+            grade = str(entry.get('grade') or '').strip()
+            if not code and not grade:
+                continue
+            points = entry.get('points')
+            rows.append(StudentSubjectGrade(
+                gpa_record_id=record.pk,
+                student_id=record.student_id,
+                semester=record.semester,
+                code=code[:50],
+                code_normalized=''.join(code.split()).upper()[:50],
+                name=str(entry.get('name') or '')[:255],
+                grade=grade[:10],
+                points=to_float(points) if points is not None else calculator_points.get(grade, 0),
+                credits=to_float(entry.get('credits')),
+            ))
+    StudentSubjectGrade.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0040_attendancesyncreceipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentSubjectGrade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.PositiveIntegerField()),
+                ('code', models.CharField(blank=True, max_length=50)),
+                ('code_normalized', models.CharField(blank=True, help_text='Upper-cased code without whitespace', max_length=50)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('grade', models.CharField(blank=True, max_length=10)),
+                ('points', models.FloatField(default=0)),
+                ('credits', models.FloatField(default=0)),
+                ('gpa_record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_grades', to='students.studentgpa')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subject_grades', to='students.student')),
+            ],
+            options={
+                'ordering': ['semester', 'id'],
+                'indexes': [models.Index(fields=['code_normalized', 'semester'], name='subject_grade_code_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_subject_grades, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.7 on 2026-10-17 16:06
+
+from django.db import migrations, models
+
+
+def seed_default_scheme(apps, schema_editor):
+    GradingScheme = apps.get_model('students', 'GradingScheme')
+    # The scale the semester archive and CGPA history already use
+    GradingScheme.objects.get_or_create(
+        first_batch_year=None,
+        defaults={
+            'name': 'University default',
+            'bands': [
+                {'grade': 'O', 'min_score': 90, 'points': 10},
+                {'grade': 'A+', 'min_score': 80, 'points': 9},
+                {'grade': 'A', 'min_score': 70, 'points': 8},
+                {'grade': 'B+', 'min_score': 60, 'points': 7},
+                {'grade': 'B', 'min_score': 50, 'points': 6},
+                {'grade': 'C', 'points': 5},
+                {'grade': 'RA', 'min_score': 0, 'points': 0},
+                {'grade': 'AB', 'points': 0},
+                {'grade': 'W', 'points': 0, 'counts_credits': False},
+            ],
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0041_studentsubjectgrade'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradingScheme',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('first_batch_year', models.PositiveIntegerField(blank=True, help_text='Applies to batches joining from this year; leave blank for the default scheme', null=True, unique=True)),
+                ('bands', models.JSONField(default=list, help_text='e.g. [{"grade": "S", "min_score": 90, "points": 10}, ..., {"grade": "W", "points": 0, "counts_credits": false}]. Grades without min_score can be entered but are never assigned from a score.')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['first_batch_year'],
+            },
+        ),
+        migrations.RunPython(seed_default_scheme, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.7 on 2026-10-17 16:07
+
+from django.db import migrations, models
+
+
+def backfill_running_cgpa(apps, schema_editor):
+    Student = apps.get_model('students', 'Student')
+    StudentGPA = apps.get_model('students', 'StudentGPA')
+
+    records = []
+    totals = {}
+    for record in StudentGPA.objects.order_by('student_id', 'semester').iterator():
+        points, credits = totals.get(record.student_id, (0.0, 0.0))
+        points += record.gpa * record.total_credits
+        credits += record.total_credits
+        totals[record.student_id] = (points, credits)
+        record.running_cgpa = round(points / credits, 2) if credits > 0 else 0.0
+        record.cumulative_credits = credits
+        records.append(record)
+    StudentGPA.objects.bulk_update(records, ['running_cgpa', 'cumulative_credits'], batch_size=1000)
+
+    students = []
+    for student in Student.objects.filter(roll_number__in=list(totals)).only('roll_number'):
+        points, credits = totals[student.roll_number]
+        student.cgpa = round(points / credits, 2) if credits > 0 else 0.0
+        student.cumulative_credits = credits
+        students.append(student)
+    Student.objects.bulk_update(students, ['cgpa', 'cumulative_credits'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0042_gradingscheme'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='cgpa',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='cumulative_credits',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='studentgpa',
+            name='cumulative_credits',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='studentgpa',
+            name='running_cgpa',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(backfill_running_cgpa, migrations.RunPython.noop),
+    ]
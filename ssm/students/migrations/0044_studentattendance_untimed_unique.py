@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-17 17:18
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_untimed_rows(apps, schema_editor):
+    # Keep the latest row of each (student, subject, date) saved without a class time
+    StudentAttendance = apps.get_model('students', 'StudentAttendance')
+    untimed = StudentAttendance.objects.filter(time__isnull=True)
+    keep = untimed.values('student', 'subject', 'date').annotate(latest=Max('id')).values_list('latest', flat=True)
+    untimed.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0043_running_cgpa'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_untimed_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='studentattendance',
+            constraint=models.UniqueConstraint(condition=models.Q(('time__isnull', True)), fields=('student', 'subject', 'date'), name='attendance_untimed_unique'),
+        ),
+    ]
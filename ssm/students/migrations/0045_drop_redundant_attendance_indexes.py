@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-17 17:19
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0044_studentattendance_untimed_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='studentattendance',
+            name='attendance_date_subject_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='studentattendance',
+            name='attendance_present_idx',
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+
+# The S..E scale first seeded by 0042, which moved the archive's grade boundaries
+SEEDED_BANDS = [
+    {'grade': 'S', 'min_score': 90, 'points': 10},
+    {'grade': 'A', 'min_score': 80, 'points': 9},
+    {'grade': 'B', 'min_score': 70, 'points': 8},
+    {'grade': 'C', 'min_score': 60, 'points': 7},
+    {'grade': 'D', 'min_score': 55, 'points': 6},
+    {'grade': 'E', 'min_score': 50, 'points': 5},
+    {'grade': 'RA', 'min_score': 0, 'points': 0},
+    {'grade': 'W', 'points': 0, 'counts_credits': False},
+]
+
+# The scale the semester archive and CGPA history used before GradingScheme
+BASELINE_BANDS = [
+    {'grade': 'O', 'min_score': 90, 'points': 10},
+    {'grade': 'A+', 'min_score': 80, 'points': 9},
+    {'grade': 'A', 'min_score': 70, 'points': 8},
+    {'grade': 'B+', 'min_score': 60, 'points': 7},
+    {'grade': 'B', 'min_score': 50, 'points': 6},
+    {'grade': 'C', 'points': 5},
+    {'grade': 'RA', 'min_score': 0, 'points': 0},
+    {'grade': 'AB', 'points': 0},
+    {'grade': 'W', 'points': 0, 'counts_credits': False},
+]
+
+
+def restore_baseline_scale(apps, schema_editor):
+    # Only a default scheme nobody has edited since it was seeded
+    GradingScheme = apps.get_model('students', 'GradingScheme')
+    GradingScheme.objects.filter(first_batch_year=None, bands=SEEDED_BANDS).update(bands=BASELINE_BANDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('students', '0045_drop_redundant_attendance_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gradingscheme',
+            name='bands',
+            field=models.JSONField(default=list, help_text='e.g. [{"grade": "O", "min_score": 90, "points": 10}, ..., {"grade": "W", "points": 0, "counts_credits": false}]. Grades without min_score can be entered but are never assigned from a score.'),
+        ),
+        migrations.RunPython(restore_baseline_scale, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.core.exceptions import ValidationError
 from django.contrib.auth.hashers import make_password, check_password
 import datetime
 from ssm.validators import validate_file_size
@@ -100,6 +101,10 @@ class Student(models.Model):
     # Batch Info
     joining_year = models.IntegerField(null=True, blank=True)
     ending_year = models.IntegerField(null=True, blank=True)
+
+    # Running totals over StudentGPA records, maintained by students.cgpa
+    cgpa = models.FloatField(default=0.0)
+    cumulative_credits = models.FloatField(default=0.0)
     
     # Security Questions (Added to fix DB sync issue)
     security_question_1 = models.CharField(max_length=255, blank=True, null=True)
@@ -310,10 +315,91 @@ class StudentAttendance(models.Model):
 
     class Meta:
         unique_together = ('student', 'subject', 'date', 'time')
+        constraints = [
+            # NULLs never collide in unique_together, so sheets saved without a class time need their own key
+            models.UniqueConstraint(
+                fields=['student', 'subject', 'date'],
+                condition=models.Q(time__isnull=True),
+                name='attendance_untimed_unique',
+            ),
+        ]
+        indexes = [
+            # Subject sheets / calendars and semester-wide date ranges; per-student
+            # lookups are served by the (student, subject, ...) unique key. The
+            # (date, subject) and partial status='Present' (student, subject)
+            # indexes of 0038 were dropped in 0045: present counts are read from
+            # AttendanceSummary, and attendance_index_report shows the remaining
+            # queries planned on these two indexes only.
+            models.Index(fields=['subject', 'date'], name='attendance_subject_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.student_name} - {self.subject.code} - {self.date}"
 
+class AttendanceSyncReceipt(models.Model):
+    """
+    One attendance sheet submitted through the sync API (or the attendance form),
+    keyed by a client-generated idempotency key. `recorded_at` is when the sheet
+    was taken, which decides conflicts between sheets for the same slot.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    staff = models.ForeignKey('staffs.Staff', on_delete=models.SET_NULL, null=True, blank=True)
+    subject = models.ForeignKey('staffs.Subject', on_delete=models.CASCADE, related_name='attendance_receipts')
+    date = models.DateField()
+    time = models.TimeField(null=True, blank=True)
+    statuses = models.JSONField(default=dict, help_text="roll_number -> status as submitted")
+    recorded_at = models.DateTimeField()
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subject', 'date', 'recorded_at'], name='sync_receipt_slot_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} - {self.subject_id} - {self.date}"
+
+class ArchivedAttendance(models.Model):
+    """
+    Append-only cold storage for attendance of semesters a student has been promoted past.
+    Rows are moved here from StudentAttendance by students.attendance.archive_student_attendance.
+    """
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='archived_attendance')
+    subject = models.ForeignKey('staffs.Subject', on_delete=models.CASCADE, related_name='archived_attendance')
+    semester = models.PositiveSmallIntegerField(help_text="Semester the attendance belongs to")
+    date = models.DateField()
+    time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    status = models.CharField(max_length=20, choices=[('Present', 'Present'), ('Absent', 'Absent')], default='Present')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('student', 'subject', 'date', 'time')
+        indexes = [
+            models.Index(fields=['student', 'semester'], name='archived_att_student_sem_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - {self.subject_id} - {self.date} (archived)"
+
+class AttendanceSummary(models.Model):
+    """Per-student, per-subject, per-month attendance counters kept in sync by the attendance save path."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance_summaries')
+    subject = models.ForeignKey('staffs.Subject', on_delete=models.CASCADE, related_name='attendance_summaries')
+    month = models.DateField(help_text="First day of the month")
+    present = models.PositiveIntegerField(default=0)
+    absent = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    present_hours = models.PositiveIntegerField(default=0, help_text="Lab sessions count as 3 hours")
+    total_hours = models.PositiveIntegerField(default=0, help_text="Lab sessions count as 3 hours")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'subject', 'month')
+
+    def __str__(self):
+        return f"{self.student_id} - {self.subject_id} - {self.month:%b %Y}: {self.present}/{self.total}"
+
 class StudentSkill(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='skills')
     skill_name = models.CharField(max_length=100)
@@ -380,6 +466,9 @@ class StudentGPA(models.Model):
     gpa = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(10.0)])
     total_credits = models.FloatField(default=0.0)
     subject_data = models.JSONField(blank=True, null=True, help_text="List of subjects with grades for editing")
+    # CGPA and credits up to and including this semester, maintained by students.cgpa
+    running_cgpa = models.FloatField(default=0.0)
+    cumulative_credits = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -391,6 +480,65 @@ class StudentGPA(models.Model):
         return f"{self.student.student_name} - Sem {self.semester}: {self.gpa}"
 
 
+class StudentSubjectGrade(models.Model):
+    """
+    One subject line of a StudentGPA record's subject_data, normalized so grades
+    can be looked up by subject code with an index instead of scanning JSON.
+    Rebuilt from subject_data by students.grades.sync_subject_grades.
+    """
+    gpa_record = models.ForeignKey(StudentGPA, on_delete=models.CASCADE, related_name='subject_grades')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='subject_grades')
+    semester = models.PositiveIntegerField()
+    code = models.CharField(max_length=50, blank=True)
+    code_normalized = models.CharField(max_length=50, blank=True, help_text="Upper-cased code without whitespace")
+    name = models.CharField(max_length=255, blank=True)
+    grade = models.CharField(max_length=10, blank=True)
+    points = models.FloatField(default=0)
+    credits = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['semester', 'id']
+        indexes = [
+            models.Index(fields=['code_normalized', 'semester'], name='subject_grade_code_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} - Sem {self.semester} - {self.code}: {self.grade}"
+
+
+class GradingScheme(models.Model):
+    """
+    Score -> grade -> grade point scale of a regulation. A scheme applies to
+    students who joined in or after `first_batch_year` (the newest matching
+    scheme wins); the scheme without a year is the default. Compiled and
+    cached by students.grading.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    first_batch_year = models.PositiveIntegerField(
+        null=True, blank=True, unique=True,
+        help_text="Applies to batches joining from this year; leave blank for the default scheme"
+    )
+    bands = models.JSONField(
+        default=list,
+        help_text='e.g. [{"grade": "O", "min_score": 90, "points": 10}, ..., {"grade": "W", "points": 0, "counts_credits": false}]. '
+                  'Grades without min_score can be entered but are never assigned from a score.'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['first_batch_year']
+
+    def clean(self):
+        from .grading import CompiledScheme
+        try:
+            CompiledScheme(self.name, self.bands)
+        except ValueError as e:
+            raise ValidationError({'bands': str(e)})
+
+    def __str__(self):
+        return f"{self.name} (from {self.first_batch_year})" if self.first_batch_year else f"{self.name} (default)"
+
+
 class ResultScreenshot(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='result_screenshots')
     subject = models.ForeignKey('staffs.Subject', on_delete=models.CASCADE, related_name='result_screenshots')
@@ -0,0 +1,87 @@
+"""
+A student's current semester sheet: every subject of the semester with the
+student's marks and attendance totals, shared by the dashboard, the marks
+and attendance pages and the marks CSV.
+
+The sheet is one grouped query (subjects LEFT JOINed to the student's marks
+row and monthly attendance summaries via FilteredRelation) and is cached
+per student. Saving marks or attendance for a student drops their cached
+sheet; adding, editing or removing a subject retires the sheets of its whole
+semester through a per-semester version (see staffs/signals.py).
+"""
+from django.core.cache import cache
+from django.db.models import F, FilteredRelation, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+SHEET_CACHE_TIMEOUT = 60 * 60 * 24
+
+SUBJECT_FIELDS = ('id', 'code', 'name', 'subject_type', 'credits', 'semester')
+COUNT_FIELDS = ('present', 'absent', 'total', 'present_hours', 'total_hours')
+
+
+def _version_key(semester):
+    return f"semester_sheet_version:{semester}"
+
+
+def bump_semester_sheets(semester):
+    """Invalidates the cached sheets of every student of a semester."""
+    try:
+        cache.incr(_version_key(semester))
+    except ValueError:
+        cache.set(_version_key(semester), 1, None)
+
+
+def sheet_cache_key(roll_number, semester):
+    version = cache.get_or_set(_version_key(semester), 1, None)
+    return f"semester_sheet:{semester}:{version}:{roll_number}"
+
+
+def invalidate_semester_sheets(roll_numbers, semester):
+    """Drops the cached sheets of the given students for one semester."""
+    cache.delete_many([sheet_cache_key(roll, semester) for roll in roll_numbers])
+
+
+def build_semester_sheet(roll_number, semester):
+    """
+    Runs the sheet query. Returns one dict per subject, ordered by code, with
+    a 'subject' dict, the marks ('test1', 'test2', 'internal', 'has_marks')
+    and attendance counts plus 'percentage'.
+    """
+    from staffs.models import Subject
+
+    rows = Subject.objects.filter(semester=semester).alias(
+        own_marks=FilteredRelation('student_marks', condition=Q(student_marks__student=roll_number)),
+        own_attendance=FilteredRelation('attendance_summaries', condition=Q(attendance_summaries__student=roll_number)),
+    ).values(*SUBJECT_FIELDS).annotate(
+        marks_id=F('own_marks__id'),
+        test1=F('own_marks__test1_marks'),
+        test2=F('own_marks__test2_marks'),
+        internal=F('own_marks__internal_marks'),
+        **{field: Coalesce(Sum(f'own_attendance__{field}'), 0) for field in COUNT_FIELDS},
+    ).order_by('code')
+
+    sheet = []
+    for row in rows:
+        total = row['total']
+        sheet.append({
+            'subject': {field: row[field] for field in SUBJECT_FIELDS},
+            'test1': row['test1'],
+            'test2': row['test2'],
+            'internal': row['internal'],
+            'has_marks': row['marks_id'] is not None,
+            **{field: row[field] for field in COUNT_FIELDS},
+            'percentage': round((row['present'] / total) * 100, 1) if total > 0 else 0,
+        })
+    return sheet
+
+
+def semester_sheet(student, semester=None):
+    """Cached sheet of `student` for `semester` (default: their current semester)."""
+    semester = semester or student.current_semester
+    key = sheet_cache_key(student.roll_number, semester)
+    sheet = cache.get(key)
+    if sheet is None:
+        sheet = build_semester_sheet(student.roll_number, semester)
+        cache.set(key, sheet, SHEET_CACHE_TIMEOUT)
+    return sheet
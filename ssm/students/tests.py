@@ -1,3 +1,655 @@
+import datetime
+import importlib
+import io
+import json
+import unittest
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
 from django.test import TestCase
+from django.urls import reverse
+
+from ssm.principal import invalidate_students, load_student
+from staffs.models import News, Staff, Subject
+
+from .attendance import (
+    archive_student_attendance, attendance_calendar_month, restore_student_attendance, save_attendance_sheet,
+    save_attendance_sheets,
+)
+from .cgpa import update_running_cgpa
+from .dashboard import build_student_dashboard
+from .grades import results_version
+from .grading import DEFAULT_BANDS, DEFAULT_SCHEME, CompiledScheme, scheme_for_batch
+from .marks import parse_marks_sheet, save_marks_sheet
+from .semester_sheet import semester_sheet
+from .models import (
+    AcademicHistory, ArchivedAttendance, AttendanceSummary, GradingScheme, LeaveRequest, PersonalInfo, Student,
+    StudentAttendance, StudentGPA, StudentMarks, StudentProject, StudentSkill, StudentSubjectGrade,
+)
+
+
+class StudentDashboardQueryTests(TestCase):
+    """The student dashboard is assembled in a fixed number of queries."""
+
+    # Student (+ OneToOne profile models), 4 prefetches, semester sheet, news feed
+    DASHBOARD_QUERIES = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(
+            staff_id='T1', name='Teacher', email='t1@example.com', role='HOD', salutation='Dr.',
+            designation='Professor', qualification='PhD', specialization='CS',
+        )
+        cls.student = Student.objects.create(
+            roll_number='R100', student_name='Student', student_email='r100@example.com',
+            password='x', current_semester=3, is_profile_complete=True,
+        )
+        PersonalInfo.objects.create(student=cls.student, gender='Male', student_mobile='9999999999')
+        AcademicHistory.objects.create(student=cls.student, sslc_percentage=90.0)
+        subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        StudentMarks.objects.create(student=cls.student, subject=subject, test1_marks=40)
+        News.objects.create(content='Results published', target='Student')
+        cls.add_history(cls.student, semesters=2)
+
+    @staticmethod
+    def add_history(student, semesters):
+        """GPA records, skills, projects and leave requests, `semesters` of each."""
+        for semester in range(1, semesters + 1):
+            StudentGPA.objects.get_or_create(student=student, semester=semester, defaults={'gpa': 8.0})
+            StudentSkill.objects.create(student=student, skill_name=f'Skill {semester}')
+            StudentProject.objects.create(student=student, title=f'Project {semester}', description='-')
+            LeaveRequest.objects.create(
+                student=student, leave_type='Permission', reason='-',
+                start_date=datetime.date(2025, 1, semester), end_date=datetime.date(2025, 1, semester),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_build_student_dashboard_query_count(self):
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            dashboard = build_student_dashboard(self.student.roll_number)
+            context = dashboard.as_context()
+            # The profile models the templates read are already loaded
+            context['student'].personalinfo.student_mobile
+
+        self.assertEqual(dashboard.gpa_labels, ['Sem 1', 'Sem 2', 'Sem 3'])
+        self.assertEqual(len(dashboard.skills), 2)
+        self.assertEqual(len(dashboard.recent_leaves), 2)
+        self.assertEqual(len(dashboard.news_list), 1)
+        self.assertGreater(dashboard.profile_completion_percentage, 0)
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.add_history(self.student, semesters=8)
+        with self.assertNumQueries(self.DASHBOARD_QUERIES):
+            dashboard = build_student_dashboard(self.student.roll_number)
+
+        self.assertEqual(len(dashboard.gpa_records), 8)
+        self.assertEqual(len(dashboard.recent_leaves), 5)
+
+    def test_cached_sheet_and_news_are_not_queried_again(self):
+        build_student_dashboard(self.student.roll_number)
+        with self.assertNumQueries(self.DASHBOARD_QUERIES - 2):
+            build_student_dashboard(self.student.roll_number)
+
+    def test_dashboard_view_renders_without_extra_queries(self):
+        session = self.client.session
+        session['student_roll_number'] = self.student.roll_number
+        session.save()
+        # Warm the cached principal, sheet and news feed
+        self.client.get(reverse('student_dashboard'))
+
+        # Session, then the assembler's student and prefetch queries only
+        with self.assertNumQueries(1 + self.DASHBOARD_QUERIES - 2):
+            response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'stddash.html')
+
+    def test_missing_student(self):
+        self.assertIsNone(build_student_dashboard('missing'))
+
+
+class StudentPrincipalTests(TestCase):
+    """Views read the logged-in student from request.student and never save its cached copy back."""
+
+    PROFILE = {
+        'student_email': 'new@example.com', 'student_mobile': '9999999999', 'father_mobile': '', 'mother_mobile': '',
+        'parent_email': '', 'present_address': 'Here', 'permanent_address': 'There', 'account_holder_name': '',
+        'account_number': '', 'bank_name': '', 'branch_name': '', 'ifsc_code': '',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = Student.objects.create(
+            roll_number='R100', student_name='Student', student_email='r100@example.com',
+            password='x', current_semester=3, joining_year=2023, is_profile_complete=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        session = self.client.session
+        session['student_roll_number'] = self.student.roll_number
+        session.save()
+
+    def test_edit_profile_keeps_fields_written_elsewhere(self):
+        self.client.get(reverse('attendance_calendar_api'))
+        # Written without signals, so the cached principal still has the old value
+        Student.objects.filter(pk=self.student.pk).update(cgpa=8.5, current_semester=4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('student_editprofile'), self.PROFILE)
+
+        student = Student.objects.get(pk=self.student.pk)
+        self.assertEqual((student.student_email, student.cgpa, student.current_semester), ('new@example.com', 8.5, 4))
+        self.assertEqual(self.client.get(reverse('attendance_calendar_api')).wsgi_request.student.student_email, 'new@example.com')
+
+    def test_calendar_api_uses_the_principal(self):
+        # Session, principal, then live and archived attendance
+        with self.assertNumQueries(4):
+            self.client.get(reverse('attendance_calendar_api'), {'month': '2026-01'})
+        # Only the session once the principal and month are cached
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('attendance_calendar_api'), {'month': '2026-01'})
+        self.assertEqual(response.json()['month'], '2026-01')
+
+    def test_principal_is_cached_without_password(self):
+        with self.assertNumQueries(1):
+            student = load_student('R100')
+            load_student('R100')
+        self.assertEqual(student.get_deferred_fields(), {'password'})
+
+        # Bulk updates send no signals and bump every cached student instead
+        Student.objects.update(current_semester=4)
+        invalidate_students()
+        self.assertEqual(load_student('R100').current_semester, 4)
+
+    def test_deleted_student_is_logged_out(self):
+        self.client.get(reverse('student_marks'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.filter(pk=self.student.pk).delete()
+        response = self.client.get(reverse('student_marks'))
+        self.assertRedirects(response, reverse('student_login'), fetch_redirect_response=False)
+        self.assertNotIn('student_roll_number', self.client.session)
+
+    def test_extract_grades_api_uses_the_principal(self):
+        image = io.BytesIO(b'image')
+        image.name = 'result.png'
+        with mock.patch('students.ai_utils.extract_grades_from_image', return_value={'subjects': []}) as extract:
+            response = self.client.post(reverse('extract_grades_api'), {'result_image': image})
+        self.assertEqual(response.json(), {'subjects': []})
+        self.assertEqual(extract.call_args.kwargs['grades'], DEFAULT_SCHEME.grades)
+
+
+class AttendanceWriteTests(TestCase):
+    """save_attendance_sheets diffs sheets against the stored rows and writes only the changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        for roll in ('R1', 'R2', 'R3'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com',
+                                   password='x', current_semester=3)
+
+    def statuses(self, time=datetime.time(9)):
+        rows = StudentAttendance.objects.filter(subject=self.subject, time=time)
+        return dict(rows.values_list('student_id', 'status'))
+
+    def save(self, statuses, time=datetime.time(9), end_time=datetime.time(10)):
+        return save_attendance_sheet(self.subject, datetime.date(2026, 1, 5), time, end_time, statuses)
+
+    def test_resaved_sheet_writes_only_changes(self):
+        self.assertEqual(self.save({'R1': 'Present', 'R2': 'Absent'}),
+                         {'inserted': 2, 'updated': 0, 'unchanged': 0, 'present': 1})
+        self.assertEqual(self.save({'R1': 'Present', 'R2': 'Present', 'R3': 'Absent', 'R4': 'Late'}),
+                         {'inserted': 1, 'updated': 1, 'unchanged': 1, 'present': 2})
+        self.assertEqual(self.statuses(), {'R1': 'Present', 'R2': 'Present', 'R3': 'Absent'})
+
+    def test_later_sheet_of_the_same_slot_wins(self):
+        date, time = datetime.date(2026, 1, 5), datetime.time(9)
+        save_attendance_sheets([
+            (self.subject, date, time, None, {'R1': 'Present'}),
+            (self.subject, date, time, None, {'R1': 'Absent'}),
+        ])
+        self.assertEqual(self.statuses(), {'R1': 'Absent'})
+
+    def test_untimed_sheet_is_updated_in_place(self):
+        self.save({'R1': 'Present'}, time=None, end_time=None)
+        self.assertEqual(self.save({'R1': 'Absent'}, time=None, end_time=None)['updated'], 1)
+        self.assertEqual(self.statuses(time=None), {'R1': 'Absent'})
+
+    def test_migration_keeps_latest_untimed_row(self):
+        migration = importlib.import_module('students.migrations.0044_studentattendance_untimed_unique')
+        with connection.cursor() as cursor:
+            # Rolled back with the test
+            cursor.execute('DROP INDEX attendance_untimed_unique')
+        rows = [
+            StudentAttendance.objects.create(student_id='R1', subject=self.subject, date=datetime.date(2026, 1, 5), status=status)
+            for status in ('Present', 'Absent')
+        ]
+        StudentAttendance.objects.create(student_id='R2', subject=self.subject, date=datetime.date(2026, 1, 5), status='Present')
+
+        migration.drop_duplicate_untimed_rows(django_apps, None)
+
+        self.assertEqual(self.statuses(time=None), {'R1': 'Absent', 'R2': 'Present'})
+        self.assertFalse(StudentAttendance.objects.filter(pk=rows[0].pk).exists())
+
+
+
+class AttendanceSummaryTests(TestCase):
+    """The monthly summary follows every attendance write and matches a rebuild from raw rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='Course Incharge')
+        cls.lab = Subject.objects.create(name='Algorithms Lab', code='CS311', semester=3, staff=staff, subject_type='Lab')
+        for roll in ('R1', 'R2'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com',
+                                   password='x', current_semester=3)
+
+    def summaries(self):
+        return list(AttendanceSummary.objects.order_by('student', 'month').values_list(
+            'student', 'month', 'present', 'absent', 'total', 'present_hours', 'total_hours'))
+
+    def test_summary_follows_writes(self):
+        for date in (datetime.date(2026, 1, 30), datetime.date(2026, 2, 2)):
+            save_attendance_sheet(self.lab, date, datetime.time(9), None, {'R1': 'Present', 'R2': 'Absent'})
+        save_attendance_sheet(self.lab, datetime.date(2026, 2, 2), datetime.time(9), None, {'R2': 'Present'})
+
+        jan, feb = datetime.date(2026, 1, 1), datetime.date(2026, 2, 1)
+        self.assertEqual(self.summaries(), [
+            ('R1', jan, 1, 0, 1, 3, 3), ('R1', feb, 1, 0, 1, 3, 3),
+            ('R2', jan, 0, 1, 1, 0, 3), ('R2', feb, 1, 0, 1, 3, 3),
+        ])
+
+    def test_rebuild_matches_maintained_summary(self):
+        save_attendance_sheet(self.lab, datetime.date(2026, 1, 5), datetime.time(9), None, {'R1': 'Present', 'R2': 'Absent'})
+        maintained = self.summaries()
+        AttendanceSummary.objects.update(present=0)
+
+        call_command('rebuild_attendance_summary', stdout=io.StringIO())
+        self.assertEqual(self.summaries(), maintained)
+
+
+
+class AttendanceArchiveTests(TestCase):
+    """Closed-semester attendance moves to the archive table and back without losing rows or aggregates."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='Course Incharge')
+        cls.closed = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        cls.current = Subject.objects.create(name='Networks', code='CS401', semester=4, staff=staff)
+        for roll in ('R1', 'R2'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com',
+                                   password='x', current_semester=4)
+        save_attendance_sheets([
+            (cls.closed, datetime.date(2026, 1, 5), datetime.time(9), None, {'R1': 'Present', 'R2': 'Absent'}),
+            (cls.current, datetime.date(2026, 6, 1), datetime.time(9), None, {'R1': 'Present', 'R2': 'Present'}),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_archive_and_restore_round_trip(self):
+        summaries = list(AttendanceSummary.objects.order_by('pk').values())
+        self.assertEqual(archive_student_attendance(['R1'], 3), 1)
+        self.assertEqual(ArchivedAttendance.objects.get().status, 'Present')
+        self.assertEqual(StudentAttendance.objects.filter(subject=self.closed).count(), 1)
+        self.assertEqual(list(AttendanceSummary.objects.order_by('pk').values()), summaries)
+        # The calendar reads both tables
+        self.assertEqual(attendance_calendar_month('R1', 2026, 1)['2026-01-05']['color'], 'green')
+
+        self.assertEqual(restore_student_attendance(['R1'], 3), 1)
+        self.assertFalse(ArchivedAttendance.objects.exists())
+        self.assertEqual(StudentAttendance.objects.filter(subject=self.closed).count(), 2)
+
+    def test_command_archives_closed_semesters_only(self):
+        call_command('archive_closed_attendance', '--dry-run', stdout=io.StringIO())
+        self.assertFalse(ArchivedAttendance.objects.exists())
+
+        call_command('archive_closed_attendance', stdout=io.StringIO())
+        self.assertEqual(set(ArchivedAttendance.objects.values_list('student', 'semester')), {('R1', 3), ('R2', 3)})
+        self.assertEqual(set(StudentAttendance.objects.values_list('subject', flat=True)), {self.current.id})
+
+
+
+class AttendanceCalendarTests(TestCase):
+    """Month calendars are cached per student and dropped when that month is written."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        Student.objects.create(roll_number='R1', student_name='R1', student_email='r1@example.com', password='x', current_semester=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def save(self, date, time, status):
+        with self.captureOnCommitCallbacks(execute=True):
+            save_attendance_sheet(self.subject, date, time, None, {'R1': status})
+
+    def test_month_is_cached_until_written(self):
+        self.save(datetime.date(2026, 1, 5), datetime.time(9), 'Present')
+        self.assertEqual(attendance_calendar_month('R1', 2026, 1), {
+            '2026-01-05': {'color': 'green', 'details': [{'subject': 'CS301', 'status': 'Present'}]},
+        })
+        with self.assertNumQueries(0):
+            attendance_calendar_month('R1', 2026, 1)
+
+        self.save(datetime.date(2026, 1, 5), datetime.time(10), 'Absent')
+        self.assertEqual(attendance_calendar_month('R1', 2026, 1)['2026-01-05']['color'], 'orange')
+
+    def test_other_months_stay_cached(self):
+        attendance_calendar_month('R1', 2026, 1)
+        self.save(datetime.date(2026, 2, 2), datetime.time(9), 'Absent')
+        with self.assertNumQueries(0):
+            self.assertEqual(attendance_calendar_month('R1', 2026, 1), {})
+        self.assertEqual(attendance_calendar_month('R1', 2026, 2)['2026-02-02']['color'], 'red')
+
+
+
+class MarksSheetTests(TestCase):
+    """Marks sheets are validated as a whole and saved as a diff."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='Course Incharge')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        for roll in ('R1', 'R2', 'R3'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com',
+                                   password='x', current_semester=3)
+        StudentMarks.objects.create(student_id='R1', subject=cls.subject, test1_marks=40)
+        StudentMarks.objects.create(student_id='R2', subject=cls.subject, test1_marks=35)
+
+    def test_invalid_cells_are_reported(self):
+        sheet, errors = parse_marks_sheet({'test1_R1': ' 45 ', 'test2_R1': '4.5', 'internal_R2': '101'}, ['R1', 'R2'])
+        self.assertEqual(sheet['R1']['test1_marks'], 45)
+        self.assertEqual(sheet['R2'], {'test1_marks': None, 'test2_marks': None})
+        self.assertEqual(errors, {
+            'R1': {'test2_marks': "'4.5' is not a whole number"},
+            'R2': {'internal_marks': 'Must be between 0 and 100'},
+        })
+
+    def test_only_changed_rows_are_written(self):
+        sheet, _ = parse_marks_sheet({'test1_R1': '40', 'test1_R2': '38', 'test1_R3': ''}, ['R1', 'R2', 'R3'])
+        # One read and one upsert, inside a savepoint
+        with self.assertNumQueries(4):
+            changes = save_marks_sheet(self.subject, sheet)
+        self.assertEqual(changes, {'R2': {'test1_marks': [35, 38]}})
+        self.assertEqual(dict(StudentMarks.objects.values_list('student', 'test1_marks')), {'R1': 40, 'R2': 38})
+
+        sheet['R3']['internal_marks'] = 70
+        self.assertEqual(save_marks_sheet(self.subject, sheet), {'R3': {'internal_marks': [None, 70]}})
+
+
+
+class SubjectGradeTests(TestCase):
+    """Saved GPA records keep an indexed StudentSubjectGrade row per claimed subject."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='HOD')
+        cls.subject = Subject.objects.create(name='Algorithms', code='CS 301', semester=3, staff=cls.staff)
+        Student.objects.create(roll_number='R1', student_name='R1', student_email='r1@example.com', password='x',
+                               current_semester=3, joining_year=2023)
+
+    def setUp(self):
+        cache.clear()
+        session = self.client.session
+        session['student_roll_number'] = 'R1'
+        session.save()
+
+    def save_gpa(self, subject_data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('save_gpa_api'), json.dumps({
+                'semester': 3, 'gpa': 8.5, 'total_credits': 7, 'subject_data': subject_data,
+            }), content_type='application/json')
+
+    def grades(self):
+        return list(StudentSubjectGrade.objects.values_list('code', 'code_normalized', 'grade', 'points', 'credits'))
+
+    def test_rows_follow_subject_data(self):
+        version = results_version()
+        self.save_gpa([
+            {'code': 'cs301 ', 'name': 'Algorithms', 'grade': 'A+', 'credits': '4'},
+            {'code': 'CS302', 'grade': 'B', 'points': 7, 'credits': 3},
+            {'code': '', 'grade': ''},
+            'not an entry',
+        ])
+        self.assertEqual(self.grades(), [('cs301', 'CS301', 'A+', 9.0, 4.0), ('CS302', 'CS302', 'B', 7.0, 3.0)])
+        self.assertEqual(results_version(), version + 1)
+
+        self.save_gpa([{'code': 'CS301', 'grade': 'O', 'credits': 4}])
+        self.assertEqual(self.grades(), [('CS301', 'CS301', 'O', 10.0, 4.0)])
+
+    def test_manage_marks_shows_claimed_grade_by_normalized_code(self):
+        self.save_gpa([{'code': 'cs301', 'grade': 'A', 'credits': 4}])
+        session = self.client.session
+        session['staff_id'] = self.staff.staff_id
+        session.save()
+
+        response = self.client.get(reverse('staffs:manage_marks', args=[self.subject.id]))
+        self.assertEqual(response.context['claimed_grades_map'], {'R1': {'grade': 'A', 'code': 'cs301'}})
+
+
+
+class RunningCgpaTests(TestCase):
+    """The running CGPA stored on GPA records and students matches a credit-weighted re-sum."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for roll in ('R1', 'R2'):
+            Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com', password='x')
+        for semester, gpa, credits in ((2, 7.0, 20), (1, 9.0, 20), (3, 8.0, 0)):
+            StudentGPA.objects.create(student_id='R1', semester=semester, gpa=gpa, total_credits=credits)
+
+    def series(self, roll):
+        return list(StudentGPA.objects.filter(student_id=roll).order_by('semester').values_list(
+            'semester', 'running_cgpa', 'cumulative_credits'))
+
+    def test_running_values_are_stored(self):
+        cgpas, stale = update_running_cgpa(['R1', 'R2'])
+        self.assertEqual((cgpas, stale), ({'R1': 8.0, 'R2': 0.0}, ['R1']))
+        self.assertEqual(self.series('R1'), [(1, 9.0, 20), (2, 8.0, 40), (3, 8.0, 40)])
+        student = Student.objects.get(pk='R1')
+        self.assertEqual((student.cgpa, student.cumulative_credits), (8.0, 40))
+
+        self.assertEqual(update_running_cgpa(['R1'])[1], [])
+
+    def test_consistency_command_fixes_stale_values(self):
+        update_running_cgpa(['R1'])
+        StudentGPA.objects.filter(student_id='R1', semester=2).update(gpa=10.0)
+
+        out = io.StringIO()
+        call_command('check_cgpa_consistency', '--dry-run', stdout=out)
+        self.assertIn('R1', out.getvalue())
+        self.assertEqual(Student.objects.get(pk='R1').cgpa, 8.0)
+
+        call_command('check_cgpa_consistency', stdout=io.StringIO())
+        self.assertEqual(Student.objects.get(pk='R1').cgpa, 9.5)
+        self.assertEqual(self.series('R1')[1], (2, 9.5, 40))
+
+
+
+class SemesterSheetTests(TestCase):
+    """The current semester sheet is one query, cached per student and dropped on writes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='Course Incharge')
+        cls.theory = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        cls.lab = Subject.objects.create(name='Algorithms Lab', code='CS311', semester=3, staff=staff, subject_type='Lab')
+        cls.student = Student.objects.create(roll_number='R1', student_name='R1', student_email='r1@example.com',
+                                             password='x', current_semester=3)
+        StudentMarks.objects.create(student=cls.student, subject=cls.theory, test1_marks=40)
+        save_attendance_sheets([
+            (cls.theory, datetime.date(2026, 1, 30), datetime.time(9), None, {'R1': 'Present'}),
+            (cls.theory, datetime.date(2026, 2, 2), datetime.time(9), None, {'R1': 'Absent'}),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sheet_rows(self):
+        with self.assertNumQueries(1):
+            sheet = semester_sheet(self.student)
+        self.assertEqual(
+            [(row['subject']['code'], row['test1'], row['has_marks'], row['present'], row['total'], row['percentage']) for row in sheet],
+            [('CS301', 40, True, 1, 2, 50.0), ('CS311', None, False, 0, 0, 0)],
+        )
+
+    def test_sheet_is_cached_until_marks_or_attendance_change(self):
+        semester_sheet(self.student)
+        with self.assertNumQueries(0):
+            semester_sheet(self.student)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_marks_sheet(self.lab, {'R1': {'test1_marks': 30, 'test2_marks': None, 'internal_marks': None}})
+        self.assertEqual(semester_sheet(self.student)[1]['test1'], 30)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            save_attendance_sheet(self.lab, datetime.date(2026, 2, 3), datetime.time(9), None, {'R1': 'Present'})
+        self.assertEqual(semester_sheet(self.student)[1]['present_hours'], 3)
+
+    def test_marks_page_reads_the_cached_sheet(self):
+        session = self.client.session
+        session['student_roll_number'] = 'R1'
+        session.save()
+        self.client.get(reverse('student_marks'))
+
+        # Session and the profile photo in the page header, no marks queries
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('student_marks'))
+        self.assertEqual(response.context['chart_data']['labels'], ['CS301', 'CS311'])
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Asserts SQLite query plans')
+class AttendanceIndexTests(TestCase):
+    """Every query in attendance_index_report is planned on an index that still exists."""
+
+    def test_report_queries_use_the_remaining_indexes(self):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='HOD')
+        subject = Subject.objects.create(name='Algorithms', code='CS301', semester=3, staff=staff)
+        student = Student.objects.create(roll_number='R100', student_name='Student', student_email='r100@example.com', password='x')
+        StudentAttendance.objects.create(student=student, subject=subject, date=datetime.date(2026, 1, 5))
+
+        from .management.commands.attendance_index_report import Command
+        plans = {title: queryset.explain() for title, queryset in Command().sample_queries()}
+        self.assertEqual(len(plans), 5)
+        for title, plan in plans.items():
+            with self.subTest(title):
+                self.assertRegex(plan, r'USING (COVERING )?INDEX (attendance_subject_date_idx|\w*student_id_subject_id_date_time\w*)')
+
+    def test_report_runs(self):
+        call_command('attendance_index_report', stdout=io.StringIO())
+
+
+def baseline_grade_for(score):
+    """The if/elif chain archive_semester_data graded internal marks with before GradingScheme."""
+    for cutoff, grade, point in [(90, 'O', 10), (80, 'A+', 9), (70, 'A', 8), (60, 'B+', 7), (50, 'B', 6)]:
+        if score >= cutoff:
+            return grade, point
+    return 'RA', 0
+
+
+class GradingSchemeTests(TestCase):
+    """The default scheme grades exactly like the hard-coded scale it replaced."""
+
+    SCORES = [score / 2 for score in range(-10, 202)]
+
+    def setUp(self):
+        cache.clear()
+
+    def delete_scheme(self, scheme):
+        # Compiled schemes live in the process, so drop the scheme the way an edit would
+        with self.captureOnCommitCallbacks(execute=True):
+            scheme.delete()
+
+    def test_default_scheme_matches_baseline_scale(self):
+        for scheme in (DEFAULT_SCHEME, scheme_for_batch(None)):
+            with self.subTest(scheme.name):
+                self.assertEqual([scheme.grade_for(score) for score in self.SCORES],
+                                 [baseline_grade_for(score) for score in self.SCORES])
+                grades, points = scheme.grade_array(self.SCORES)
+                self.assertEqual(list(zip(grades, points)), [baseline_grade_for(score) for score in self.SCORES])
+
+    def test_cgpa_history_letters_keep_their_points(self):
+        baseline = {'O': 10, 'A+': 9, 'A': 8, 'B+': 7, 'B': 6, 'C': 5, 'RA': 0, 'AB': 0}
+        for grade, points in baseline.items():
+            self.assertEqual(DEFAULT_SCHEME.points_for(grade), points)
+        self.assertEqual(DEFAULT_SCHEME.non_credit_grades, {'W'})
+
+    def test_archived_gpa_matches_baseline(self):
+        staff = Staff.objects.create(staff_id='T1', name='Teacher', email='t1@example.com', role='HOD')
+        subjects = [
+            Subject.objects.create(name=f'Subject {i}', code=f'CS30{i}', semester=3, staff=staff, credits=credits)
+            for i, credits in enumerate([4, 3, 2])
+        ]
+        marks = {'R1': [95, 54, 49], 'R2': [80, 79, 60], 'R3': [None, 50, 89]}
+        for roll, row in marks.items():
+            student = Student.objects.create(roll_number=roll, student_name=roll, student_email=f'{roll}@example.com',
+                                             password='x', current_semester=3, joining_year=2023)
+            for subject, mark in zip(subjects, row):
+                StudentMarks.objects.create(student=student, subject=subject, internal_marks=mark)
+
+        from staffs.promotion import archive_semester_batch
+        archive_semester_batch(list(marks), 3)
+
+        for record in StudentGPA.objects.filter(semester=3):
+            expected = [baseline_grade_for(mark or 0) for mark in marks[record.student_id]]
+            self.assertEqual([(entry['grade'], entry['points']) for entry in record.subject_data], expected)
+            total_points = sum(point * subject.credits for (_, point), subject in zip(expected, subjects))
+            self.assertEqual(record.gpa, round(total_points / 9, 2))
+
+    def test_batch_schemes_apply_from_their_first_year(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            scheme = GradingScheme.objects.create(name='R2025', first_batch_year=2025, bands=[
+                {'grade': 'P', 'min_score': 40, 'points': 5}, {'grade': 'F', 'min_score': 0, 'points': 0},
+            ])
+        self.addCleanup(self.delete_scheme, scheme)
+        self.assertEqual(scheme_for_batch(2024).grade_for(45), ('RA', 0))
+        self.assertEqual(scheme_for_batch(2025).grade_for(45), ('P', 5))
+        self.assertEqual(scheme_for_batch(2030).grade_for(39), ('F', 0))
+
+    def test_scheme_edits_apply_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            scheme = GradingScheme.objects.create(name='R2025', first_batch_year=2025, bands=[
+                {'grade': 'P', 'min_score': 40, 'points': 5}, {'grade': 'F', 'min_score': 0, 'points': 0},
+            ])
+            self.assertEqual(scheme_for_batch(2025).grade_for(45), ('RA', 0))
+        self.addCleanup(self.delete_scheme, scheme)
+        self.assertEqual(scheme_for_batch(2025).grade_for(45), ('P', 5))
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                scheme.bands = [{'grade': 'F', 'min_score': 0, 'points': 0}]
+                scheme.save()
+                raise DatabaseError('rolled back')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(scheme_for_batch(2025).grade_for(45), ('P', 5))
+
+    def test_invalid_bands_are_rejected(self):
+        for bands in ([], [{'grade': 'A', 'min_score': 10, 'points': 9}], [{'grade': 'A', 'min_score': 0}, {'grade': 'A', 'min_score': 5}]):
+            with self.subTest(bands=bands), self.assertRaises(ValueError):
+                CompiledScheme('bad', bands)
+
+    def test_migration_restores_unedited_seeded_scale(self):
+        migration = importlib.import_module('students.migrations.0046_restore_baseline_grading_scale')
+        default = GradingScheme.objects.get(first_batch_year=None)
+        default.bands = migration.SEEDED_BANDS
+        default.save()
+        edited = GradingScheme.objects.create(name='Edited', first_batch_year=2020, bands=migration.SEEDED_BANDS[:1] + [
+            {'grade': 'RA', 'min_score': 0, 'points': 0},
+        ])
+
+        migration.restore_baseline_scale(django_apps, None)
 
-# Create your tests here.
+        default.refresh_from_db()
+        edited.refresh_from_db()
+        self.assertEqual(default.bands, DEFAULT_BANDS)
+        self.assertEqual(edited.bands[0]['grade'], 'S')
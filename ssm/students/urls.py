@@ -57,6 +57,7 @@ urlpatterns = [
     
     # Student attendance and marks
     path('attendance/', views.student_attendance, name='student_attendance'),
+    path('api/attendance/calendar/', views.attendance_calendar_api, name='attendance_calendar_api'),
     path('student/marks/', views.student_marks, name='student_marks'),
     path('academic/history/', views.cgpa_history, name='cgpa_history'),
     
@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse, HttpResponse
 from django.utils import timezone
 from django.contrib import messages
-from django.db.models import Q, Count, F
+from django.db.models import Count, F
 from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.cache import never_cache
@@ -18,7 +18,7 @@ logger = logging.getLogger(__name__)
 
 from .models import (
     Student, PersonalInfo, BankDetails, AcademicHistory, DiplomaDetails, UGDetails, PGDetails, PhDDetails,
-    ScholarshipInfo, StudentDocuments, OtherDetails, Caste, StudentMarks, StudentAttendance,
+    ScholarshipInfo, StudentDocuments, OtherDetails, Caste, StudentMarks,
     StudentSkill, StudentProject, LeaveRequest, StudentGPA, BonafideRequest
 )
 from . import ai_utils
@@ -41,22 +41,20 @@ import os
 # --- Custom Decorator for Session-Based Login ---
 def student_login_required(view_func):
     """
-    Custom decorator to check if a student is logged in via session.
-    If not, redirects to the login page.
+    Custom decorator to check if a student is logged in (request.student,
+    set by SessionPrincipalMiddleware). If not, redirects to the login page.
     """
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
-        if 'student_roll_number' not in request.session:
+        if request.student is None:
             return redirect('student_login')
         return view_func(request, *args, **kwargs)
     return _wrapped_view
 
 
-from staffs.models import News
-
 def prevhome(request): 
     # Redirect logged-in students directly to dashboard
-    if 'student_roll_number' in request.session:
+    if request.student is not None:
         return redirect('student_dashboard')
     
     
@@ -75,13 +73,8 @@ def prevhome(request):
     # ------------------------------------
     
     # Fetch public news for the home page
-    today = timezone.now().date()
-    news_list = News.objects.filter(
-        Q(is_active=True) & 
-        (Q(start_date__isnull=True) | Q(start_date__lte=today)) & 
-        (Q(end_date__isnull=True) | Q(end_date__gte=today))
-    ).order_by('-date', '-id')
-    return render(request, 'prevhome.html', {'news_list': news_list})
+    from staffs.news_feed import news_feed
+    return render(request, 'prevhome.html', {'news_list': news_feed('All')})
 
 
 
@@ -94,10 +87,10 @@ def help_and_support(request):
 from staffs.models import ExamSchedule, Timetable
 
 def exam_timetable(request):
-    if 'student_roll_number' not in request.session:
+    if request.student is None:
         return redirect('student_login')
     
-    student = Student.objects.get(roll_number=request.session['student_roll_number'])
+    student = request.student
     schedule = ExamSchedule.objects.filter(semester=student.current_semester).order_by('date', 'session')
     
     return render(request, 'student_exam_schedule.html', {
@@ -106,10 +99,10 @@ def exam_timetable(request):
     })
 
 def class_timetable(request):
-    if 'student_roll_number' not in request.session:
+    if request.student is None:
         return redirect('student_login')
         
-    student = Student.objects.get(roll_number=request.session['student_roll_number'])
+    student = request.student
     entries = Timetable.objects.filter(semester=student.current_semester)
     
     days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
@@ -140,15 +133,15 @@ def get_caste_data_api(request):
 def register_student(request):
     """API view to handle the student profile completion (registration) form submission."""
     # Strict Session Check
-    if 'student_roll_number' not in request.session:
+    if request.student is None:
          return JsonResponse({'error': 'Authentication required. Please log in.'}, status=401)
 
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST method is allowed'}, status=405)
 
     try:
-        roll_number = request.session['student_roll_number']
-        student = Student.objects.get(roll_number=roll_number)
+        # The form saves every field, so start from the row rather than the cached principal
+        student = Student.objects.get(pk=request.student.pk)
         
         data = request.POST
         files = request.FILES
@@ -342,222 +335,35 @@ from django.contrib.auth.decorators import login_required
 #@login_required#(login_url='student_login')
 @student_login_required
 def student_dashboard(request):
-    roll_number = request.session.get('student_roll_number')
-    try:
-        student = Student.objects.get(roll_number=roll_number)
-    except Student.DoesNotExist:
-        # Session could be stale or invalid
-        request.session.flush()
+    # Everything on the page in a fixed number of queries (see students/dashboard.py)
+    from .dashboard import build_student_dashboard
+    dashboard = build_student_dashboard(request.student.roll_number)
+    if dashboard is None:
         return redirect('student_login')
-    
-    # helper to safely get related objects
-    from staffs.models import News
-    def get_related_or_none(model_class, student_obj):
-        try:
-            return model_class.objects.get(student=student_obj)
-        except model_class.DoesNotExist:
-            return None
-
-    # Fetch News
-    # Fetch News
-    today = timezone.now().date()
-    news_list = News.objects.filter(
-        Q(is_active=True) & 
-        Q(target__in=['All', 'Student']) &
-        (Q(start_date__isnull=True) | Q(start_date__lte=today)) & 
-        (Q(end_date__isnull=True) | Q(end_date__gte=today))
-    ).order_by('-date', '-id')
-
-    # Calculate Attendance (Current Semester Only)
-    total_classes = StudentAttendance.objects.filter(student=student, subject__semester=student.current_semester).count()
-    present_classes = StudentAttendance.objects.filter(student=student, subject__semester=student.current_semester, status='Present').count()
-    attendance_percentage = 0
-    if total_classes > 0:
-        attendance_percentage = round((present_classes / total_classes) * 100, 1)
-
-    # Fetch GPA Data for Chart
-    gpa_records = list(StudentGPA.objects.filter(student=student).order_by('semester'))
-    
-    # Check if current semester is in gpa_records
-    existing_sems = [r.semester for r in gpa_records]
-    if student.current_semester not in existing_sems:
-        # Fetch current semester data manually
-        from staffs.models import Subject
-        from students.models import StudentMarks
-        
-        current_subs = Subject.objects.filter(semester=student.current_semester)
-        subject_data = []
-        for sub in current_subs:
-            # Calculate Subject Attendance
-            sub_total = StudentAttendance.objects.filter(student=student, subject=sub).count()
-            sub_present = StudentAttendance.objects.filter(student=student, subject=sub, status='Present').count()
-            sub_attn = round((sub_present / sub_total) * 100, 1) if sub_total > 0 else 0
-
-            try:
-                marks = StudentMarks.objects.get(student=student, subject=sub)
-                subject_data.append({
-                    'code': sub.code,
-                    'name': sub.name,
-                    'credits': sub.credits,
-                    'test1_marks': marks.test1_marks,
-                    'test2_marks': marks.test2_marks,
-                    'internal_marks': marks.internal_marks,
-                    'attendance_percentage': sub_attn,
-                    'grade': 'N/A' # Not generated yet
-                })
-            except StudentMarks.DoesNotExist:
-                subject_data.append({
-                    'code': sub.code,
-                    'name': sub.name,
-                    'credits': sub.credits,
-                    'attendance_percentage': sub_attn, 
-                    'grade': 'N/A'
-                })
-        
-        if subject_data:
-            # Append a dict that mimics the structure needed by the template
-            gpa_records.append({
-                'semester': student.current_semester,
-                'gpa': 0.0, # Placeholder
-                'subject_data': subject_data
-            })
-
-    gpa_labels = [f"Sem {r.semester if isinstance(r, StudentGPA) else r.get('semester')}" for r in gpa_records]
-    gpa_data = [r.gpa if isinstance(r, StudentGPA) else 0.0 for r in gpa_records]
-    
-    # Calculate CGPA
-    # Filter only actual StudentGPA objects for calculation
-    real_records = [r for r in gpa_records if isinstance(r, StudentGPA)]
-    total_points = sum(r.gpa * r.total_credits for r in real_records)
-    total_credits = sum(r.total_credits for r in real_records)
-    cgpa = round(total_points / total_credits, 2) if total_credits > 0 else 0.0
-
-    # Skills & Projects (New)
-    skills = student.skills.all()
-    projects = student.projects.all()
-
-    # Leave Requests (New Widget)
-    from students.models import LeaveRequest
-    recent_leaves = LeaveRequest.objects.filter(student=student).order_by('-created_at')[:5]
-
-    # Helper for calendar data
-    calendar_data = get_attendance_calendar_data(student)
-
-    context = {
-        'student': student,
-        'recent_leaves': recent_leaves,
-        'news_list': news_list,
-        'attendance_percentage': attendance_percentage,
-        'gpa_labels': gpa_labels,
-        'gpa_data': gpa_data,
-        'cgpa': cgpa,
-        'gpa_records': gpa_records,  # Added for History View
-        'skills': skills,
-        'projects': projects,
+    context = dashboard.as_context()
 
-        'today': timezone.now().strftime('%A'),
-        'calendar_data': calendar_data,
-        'profile_completion_percentage': calculate_profile_completion(student),
-        'is_profile_complete': student.is_profile_complete
-    }
-    
     # New Logic: If profile is incomplete, show the status page instead of dashboard
-    print(f"DEBUG: Dashboard access for {student.roll_number}. is_profile_complete={student.is_profile_complete}")
-    if not student.is_profile_complete:
+    if not dashboard.is_profile_complete:
          return render(request, 'student_profile_status.html', context)
 
     return render(request, 'stddash.html', context)
 
-def calculate_profile_completion(student):
-    """
-    Calculates the percentage of the profile that is complete.
-    Based on key fields in Student and related models.
-    """
-    total_fields = 0
-    filled_fields = 0
-    
-    # helper
-    def check_model_fields(model_instance, fields_to_check):
-        nonlocal total_fields, filled_fields
-        if not model_instance:
-             total_fields += len(fields_to_check)
-             return
-        
-        for field in fields_to_check:
-            total_fields += 1
-            val = getattr(model_instance, field, None)
-            if val and str(val).strip(): # Check for non-empty
-                filled_fields += 1
-    
-    # 1. Student Model (Core)
-    check_model_fields(student, ['student_name', 'student_email', 'program_level', 'current_semester'])
-    
-    # 2. Personal Info
-    try:
-        p_info = getattr(student, 'personalinfo', None) # OneToOne related name default is lowercase modelname or defined? 
-        # Models.py says 'personalinfo' (implied) or we need to check. Usually standard is lowercase.
-        # Checking implementation: PersonalInfo.student = models.OneToOneField(..., related_name='personalinfo') (Assumption)
-        # Actually standard Django default related_name is 'personalinfo' if class is PersonalInfo.
-        # Let's rely on views.py logic using PersonalInfo.objects.get(student=student) usually.
-        # But we passed `student` object. Let's try accessor.
-        if not p_info:
-             p_info = PersonalInfo.objects.filter(student=student).first()
-        check_model_fields(p_info, ['date_of_birth', 'gender', 'student_mobile', 'father_name', 'father_mobile', 'present_address'])
-    except:
-        total_fields += 6 # Punishment for missing model
-        
-    # 3. Academic History
-    try:
-         acad = AcademicHistory.objects.filter(student=student).first()
-         check_model_fields(acad, ['sslc_percentage', 'sslc_year_of_passing', 'hsc_percentage', 'hsc_year_of_passing'])
-    except:
-         total_fields += 4
-
-    if total_fields == 0: return 0
-    
-    percentage = int((filled_fields / total_fields) * 100)
-    return min(percentage, 100)
-
-def get_attendance_calendar_data(student):
-    """Helper to prepare attendance data for calendar."""
-    from .models import StudentAttendance
-    all_attendance = StudentAttendance.objects.filter(student=student).select_related('subject')
-    calendar_data = {}
-    
-    for record in all_attendance:
-        date_key = record.date.strftime('%Y-%m-%d')
-        if date_key not in calendar_data:
-            calendar_data[date_key] = {
-                'present_count': 0,
-                'absent_count': 0,
-                'classes': []
-            }
-        
-        calendar_data[date_key]['classes'].append({
-            'subject': record.subject.code if record.subject else 'General',
-            'status': record.status
-        })
-        
-        if record.status == 'Present':
-            calendar_data[date_key]['present_count'] += 1
-        else:
-            calendar_data[date_key]['absent_count'] += 1
-            
-    # Finalize colors
-    final_calendar_data = {}
-    for d, info in calendar_data.items():
-        if info['present_count'] == 0 and info['absent_count'] > 0:
-             dot_color = 'red' # Fully Absent
-        elif info['present_count'] > 0 and info['absent_count'] > 0:
-             dot_color = 'orange' # Partial
-        else:
-             dot_color = 'green' # All Present (or no classes?)
-             
-        final_calendar_data[d] = {
-            'color': dot_color,
-            'details': info['classes']
-        }
-    return final_calendar_data
+@student_login_required
+def attendance_calendar_api(request):
+    """API returning one month (?month=YYYY-MM, default current) of the student's attendance calendar."""
+    from .attendance import attendance_calendar_month
+
+    month_param = request.GET.get('month')
+    if month_param:
+        try:
+            month_start = datetime.datetime.strptime(month_param, '%Y-%m').date()
+        except ValueError:
+            return JsonResponse({'error': 'month must be YYYY-MM'}, status=400)
+    else:
+        month_start = datetime.date.today().replace(day=1)
+
+    days = attendance_calendar_month(request.student.roll_number, month_start.year, month_start.month)
+    return JsonResponse({'month': month_start.strftime('%Y-%m'), 'days': days})
 
 @student_login_required
 def student_profile(request):
@@ -568,7 +374,6 @@ def student_profile(request):
     student = get_object_or_404(Student, roll_number=roll_number)
     
     # Copy of the fetching logic from old dashboard
-    from staffs.models import News
     def get_related_or_none(model_class, student_obj):
         try:
             return model_class.objects.get(student=student_obj)
@@ -604,8 +409,7 @@ from django.contrib import messages
 
 @student_login_required
 def student_editprofile(request):
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     personal_info, _ = PersonalInfo.objects.get_or_create(student=student)
     student_docs, _ = StudentDocuments.objects.get_or_create(student=student)
@@ -615,7 +419,7 @@ def student_editprofile(request):
     if request.method == 'POST':
         # Update student email
         student.student_email = request.POST.get('student_email')
-        student.save()
+        student.save(update_fields=['student_email'])
         
         # Update personal info - contact numbers and addresses
         personal_info.student_mobile = request.POST.get('student_mobile')
@@ -849,17 +653,9 @@ def password_reset_confirm(request):
 @student_login_required
 def student_attendance(request):
     """Displays student's attendance data course-wise."""
-    roll_number = request.session.get('student_roll_number')
-    try:
-        student = Student.objects.get(roll_number=roll_number)
-    except Student.DoesNotExist:
-        request.session.flush()
-        return redirect('student_login')
+    student = request.student
     
-    from staffs.models import Subject
-    from .models import StudentAttendance
-    
-    subjects = Subject.objects.filter(semester=student.current_semester).order_by('code')
+    from .semester_sheet import semester_sheet
     
     theory_data = []
     lab_data = []
@@ -872,32 +668,25 @@ def student_attendance(request):
     total_classes_overall = 0
     present_total_overall = 0
     
-    for subject in subjects:
-        attendance_entries = StudentAttendance.objects.filter(
-            student=student,
-            subject=subject
-        )
-        total_classes = attendance_entries.count()
-        present_count = attendance_entries.filter(status='Present').count()
-        absent_count = attendance_entries.filter(status='Absent').count()
-        
-        if total_classes > 0:
-            percentage = (present_count / total_classes) * 100
-        else:
-            percentage = 0
+    for row in semester_sheet(student):
+        subject = row['subject']
+        total_classes = row['total']
+        present_count = row['present']
+        absent_count = row['absent']
+        percentage = row['percentage']
             
         subject_data = {
             'subject': subject,
             'total_classes': total_classes,
             'present': present_count,
             'absent': absent_count,
-            'percentage': round(percentage, 1),
+            'percentage': percentage,
             'status_color': 'success' if percentage >= 75 else ('warning' if percentage >= 65 else 'danger')
         }
         
-        if subject.subject_type == 'Theory':
+        if subject['subject_type'] == 'Theory':
             theory_data.append(subject_data)
-        elif subject.subject_type == 'Lab':
+        elif subject['subject_type'] == 'Lab':
             lab_data.append(subject_data)
             
         # Stats accumulation
@@ -905,7 +694,7 @@ def student_attendance(request):
         present_total_overall += present_count
 
         # Populate Chart Data
-        chart_labels.append(subject.code)
+        chart_labels.append(subject['code'])
         chart_present.append(present_count)
         chart_absent.append(absent_count)
     
@@ -925,9 +714,6 @@ def student_attendance(request):
         'attendance_status': 'Great!' if overall_percentage >= 75 else ('Needs Improvement' if overall_percentage >= 65 else 'Critical')
     }
 
-    # Use the helper for calendar data
-    calendar_data = get_attendance_calendar_data(student)
-    
     context = {
         'student': student,
         'attendance_data': attendance_data, # Restored for charts
@@ -938,8 +724,7 @@ def student_attendance(request):
             'labels': chart_labels, 
             'present': chart_present,
             'absent': chart_absent
-        },
-        'calendar_data': calendar_data
+        }
     }
     
     return render(request, 'student_attendance.html', context)
@@ -948,17 +733,9 @@ def student_attendance(request):
 @student_login_required
 def student_marks(request):
     """Displays student's marks with pre-processed chart data."""
-    roll_number = request.session.get('student_roll_number')
-    try:
-        student = Student.objects.get(roll_number=roll_number)
-    except Student.DoesNotExist:
-        request.session.flush()
-        return redirect('student_login')
+    student = request.student
     
-    from staffs.models import Subject
-    from .models import StudentMarks
-    
-    subjects = Subject.objects.filter(semester=student.current_semester).order_by('code')
+    from .semester_sheet import semester_sheet
     
     marks_data = []
     
@@ -970,53 +747,28 @@ def student_marks(request):
     
     has_any_data = False
     
-    for subject in subjects:
-        try:
-            marks = StudentMarks.objects.get(student=student, subject=subject)
-            
-            # Normalize marks (None -> 0 for calculations)
-            t1 = marks.test1_marks if marks.test1_marks is not None else 0
-            t2 = marks.test2_marks if marks.test2_marks is not None else 0
-            internal = marks.internal_marks if marks.internal_marks is not None else 0
-            
-            has_data = True
+    for row in semester_sheet(student):
+        subject = row['subject']
+        if row['has_marks']:
             has_any_data = True
-            
-            marks_data.append({
-                'subject': {
-                    'name': subject.name,
-                    'code': subject.code,
-                    'semester': subject.semester
-                },
-                'test1': marks.test1_marks, # Keep None for display as "-"
-                'test2': marks.test2_marks,
-                'internal': marks.internal_marks,
-                'has_data': True
-            })
-            
-            # Populate Chart Data
-            radar_labels.append(subject.code)
-            radar_test1.append(t1)
-            radar_test2.append(t2)
-            radar_internal.append(internal)
-            
-        except StudentMarks.DoesNotExist:
-            marks_data.append({
-                'subject': {
-                    'name': subject.name,
-                    'code': subject.code,
-                    'semester': subject.semester
-                },
-                'test1': None,
-                'test2': None,
-                'internal': None,
-                'has_data': False
-            })
-            # Still add label for radar to show missing subject gap
-            radar_labels.append(subject.code)
-            radar_test1.append(0)
-            radar_test2.append(0)
-            radar_internal.append(0)
+        
+        marks_data.append({
+            'subject': {
+                'name': subject['name'],
+                'code': subject['code'],
+                'semester': subject['semester']
+            },
+            'test1': row['test1'], # Keep None for display as "-"
+            'test2': row['test2'],
+            'internal': row['internal'],
+            'has_data': row['has_marks']
+        })
+        
+        # Populate Chart Data (missing subjects still get a label to show the gap)
+        radar_labels.append(subject['code'])
+        radar_test1.append(row['test1'] if row['test1'] is not None else 0)
+        radar_test2.append(row['test2'] if row['test2'] is not None else 0)
+        radar_internal.append(row['internal'] if row['internal'] is not None else 0)
     
     # Filter empty charts if essentially no data
     if not has_any_data:
@@ -1042,11 +794,9 @@ def export_student_marks_csv(request):
     """Export student marks to CSV."""
     import csv
     from django.http import HttpResponse
-    from staffs.models import Subject
-    from .models import StudentMarks
+    from .semester_sheet import semester_sheet
 
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="Marks_{student.roll_number}.csv"'
@@ -1054,20 +804,12 @@ def export_student_marks_csv(request):
     writer = csv.writer(response)
     writer.writerow(['Subject Code', 'Subject Name', 'Test 1', 'Test 2', 'Internal'])
     
-    subjects = Subject.objects.filter(semester=student.current_semester).order_by('code')
-    
-    for subject in subjects:
-        try:
-            marks = StudentMarks.objects.get(student=student, subject=subject)
-            writer.writerow([
-                subject.code,
-                subject.name,
-                marks.test1_marks if marks.test1_marks is not None else '-',
-                marks.test2_marks if marks.test2_marks is not None else '-',
-                marks.internal_marks if marks.internal_marks is not None else '-'
-            ])
-        except StudentMarks.DoesNotExist:
-            writer.writerow([subject.code, subject.name, '-', '-', '-'])
+    for row in semester_sheet(student):
+        writer.writerow([
+            row['subject']['code'],
+            row['subject']['name'],
+            *['-' if row[field] is None else row[field] for field in ('test1', 'test2', 'internal')]
+        ])
             
     return response
 
@@ -1088,9 +830,6 @@ def cgpa_history(request):
     gpas = []
     cgpas = []
     
-    cumulative_points = 0
-    cumulative_credits = 0
-    
     detailed_history = []
     
     
@@ -1098,33 +837,26 @@ def cgpa_history(request):
     theory_points = []
     lab_points = []
     
-    grade_points_map = {
-        'O': 10, 'A+': 9, 'A': 8, 'B+': 7, 'B': 6, 'C': 5, 'RA': 0, 'AB': 0
-    }
+    # Grade points per semester from the normalized grade table (one query)
+    from .models import StudentSubjectGrade
+    semester_grades = {}
+    for sem, name, points in StudentSubjectGrade.objects.filter(student=student).values_list('semester', 'name', 'points'):
+        semester_grades.setdefault(sem, []).append((name, points))
 
     for record in gpa_records:
         semesters.append(f"Sem {record.semester}")
         gpas.append(record.gpa)
         
-        # Calculate running CGPA
-        cumulative_points += (record.gpa * record.total_credits)
-        cumulative_credits += record.total_credits
-        
-        current_cgpa = round(cumulative_points / cumulative_credits, 2) if cumulative_credits > 0 else 0.0
+        # Running CGPA is stored on each record (students.cgpa)
+        current_cgpa = record.running_cgpa
         cgpas.append(current_cgpa)
         
         subjects = record.subject_data if record.subject_data else []
         
         # Collect detailed stats
-        for sub in subjects:
-            grade = sub.get('grade')
-            # Assuming subject code implies type or we just blindly trust specific naming if available
-            # In absence of strict type in JSON, we rely on 'subject_type' field if we had it joined.
-            # Since we store JSON, let's try to infer or just collect all.
-            # For this 'standout' feature, we'll try to guess based on simple heuristic or just general stats.
-            
-            pts = grade_points_map.get(grade, 0)
-            if 'LAB' in sub.get('name', '').upper() or 'PRACTICAL' in sub.get('name', '').upper():
+        for name, pts in semester_grades.get(record.semester, []):
+            # No subject type is stored with claimed grades, so labs are recognised by name
+            if 'LAB' in name.upper() or 'PRACTICAL' in name.upper():
                 lab_points.append(pts)
             else:
                 theory_points.append(pts)
@@ -1142,7 +874,7 @@ def cgpa_history(request):
         max_gpa = max(gpas)
         min_gpa = min(gpas)
         avg_gpa = round(sum(gpas) / len(gpas), 2)
-        latest_cgpa = cgpas[-1] if cgpas else 0.0
+        latest_cgpa = student.cgpa
     else:
         max_gpa = min_gpa = avg_gpa = latest_cgpa = 0.0
 
@@ -1198,11 +930,9 @@ def export_student_attendance_csv(request):
     """Export student attendance summary to CSV."""
     import csv
     from django.http import HttpResponse
-    from staffs.models import Subject
-    from .models import StudentAttendance
+    from .semester_sheet import semester_sheet
     
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename="Attendance_{student.roll_number}.csv"'
@@ -1210,13 +940,11 @@ def export_student_attendance_csv(request):
     writer = csv.writer(response)
     writer.writerow(['Subject Code', 'Subject Name', 'Total Classes', 'Present', 'Absent', 'Percentage', 'Status'])
     
-    subjects = Subject.objects.filter(semester=student.current_semester).order_by('code')
-    
-    for subject in subjects:
-        attendance_entries = StudentAttendance.objects.filter(student=student, subject=subject)
-        total = attendance_entries.count()
-        present = attendance_entries.filter(status='Present').count()
-        absent = attendance_entries.filter(status='Absent').count()
+    for row in semester_sheet(student):
+        subject = row['subject']
+        total = row['total']
+        present = row['present']
+        absent = row['absent']
         
         percentage = (present / total * 100) if total > 0 else 0
         percentage_str = f"{percentage:.2f}%"
@@ -1224,8 +952,8 @@ def export_student_attendance_csv(request):
         status = 'Good' if percentage >= 75 else 'Average' if percentage >= 65 else 'Low'
         
         writer.writerow([
-            subject.code,
-            subject.name,
+            subject['code'],
+            subject['name'],
             total,
             present,
             absent,
@@ -1238,8 +966,7 @@ def export_student_attendance_csv(request):
 
 @student_login_required
 def resume_builder(request):
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     # Forms
     skill_form = StudentSkillForm()
@@ -1288,8 +1015,7 @@ def resume_builder(request):
 
 @student_login_required
 def generate_resume_pdf(request):
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     # Fetch subjects for coursework section
     from staffs.models import Subject
@@ -1481,8 +1207,7 @@ def clear_ai_resume(request):
 @student_login_required
 def bonafide_list(request):
     """Lists student's bonafide requests."""
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     requests = BonafideRequest.objects.filter(student=student).order_by('-created_at')
 
@@ -1517,8 +1242,7 @@ def bonafide_list(request):
 @student_login_required
 def download_bonafide(request, request_id):
     """Generates PDF for approved bona fide certificate."""
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     bonafide = get_object_or_404(BonafideRequest, id=request_id, student=student)
     
@@ -1571,8 +1295,7 @@ def get_ai_resume_status(request):
 
 @student_login_required
 def apply_leave(request):
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     if request.method == 'POST':
         form = LeaveRequestForm(request.POST, request.FILES)
@@ -1589,8 +1312,7 @@ def apply_leave(request):
 
 @student_login_required
 def leave_history(request):
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     # Fetch all requests ordered by latest first
     leaves = LeaveRequest.objects.filter(student=student).order_by('-created_at')
@@ -1599,8 +1321,7 @@ def leave_history(request):
 
 @student_login_required
 def request_bonafide(request):
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
 
     if request.method == 'POST':
         bonafide_type = request.POST.get('bonafide_type')
@@ -1638,10 +1359,10 @@ def request_bonafide(request):
 
 def upload_result(request):
     """Allows students to upload result screenshots for their current semester subjects."""
-    if 'student_roll_number' not in request.session:
+    if request.student is None:
         return redirect('student_login')
     
-    student = Student.objects.get(roll_number=request.session['student_roll_number'])
+    student = request.student
     
     # Fetch subjects for the student's current semester
     from staffs.models import Subject
@@ -1673,15 +1394,16 @@ def upload_result(request):
 @student_login_required
 def gpa_calculator(request):
     """Renders the GPA Calculator page."""
-    roll_number = request.session.get('student_roll_number')
-    student = Student.objects.get(roll_number=roll_number)
+    student = request.student
     
     # Fetch existing GPA records
     gpa_records = StudentGPA.objects.filter(student=student).order_by('semester')
+    from .grading import scheme_for_student
     
     context = {
         'student': student,
         'gpa_records': gpa_records,
+        'grade_scale': scheme_for_student(student).as_json(),
         'range_8': range(1, 9)
     }
     return render(request, 'gpa_calculator.html', context)
@@ -1696,9 +1418,11 @@ def extract_grades_api(request):
             return JsonResponse({'error': 'No image uploaded'}, status=400)
         
         image_file = request.FILES['result_image']
+        student = request.student
+        from .grading import scheme_for_student
         
         # Call AI Utility (API Key handled by env)
-        extraction_result = ai_utils.extract_grades_from_image(image_file)
+        extraction_result = ai_utils.extract_grades_from_image(image_file, grades=scheme_for_student(student).grades)
         
         if 'error' in extraction_result:
             return JsonResponse({'error': extraction_result['error']}, status=500)
@@ -1715,8 +1439,7 @@ def extract_grades_api(request):
 def save_gpa_api(request):
     """API to save calculated GPA for a semester."""
     try:
-        roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = request.student
         
         data = json.loads(request.body)
         semester = int(data.get('semester'))
@@ -1725,20 +1448,26 @@ def save_gpa_api(request):
         subject_data = data.get('subject_data', []) # Function to store subject details
 
         # Update or Create Record
-        record, created = StudentGPA.objects.update_or_create(
-            student=student,
-            semester=semester,
-            defaults={
-                'gpa': gpa,
-                'total_credits': total_credits,
-                'subject_data': subject_data
-            }
-        )
+        from .grades import sync_subject_grades
+        from .grading import scheme_for_student
+        from .cgpa import update_running_cgpa
+        with transaction.atomic():
+            record, created = StudentGPA.objects.update_or_create(
+                student=student,
+                semester=semester,
+                defaults={
+                    'gpa': gpa,
+                    'total_credits': total_credits,
+                    'subject_data': subject_data
+                }
+            )
+            sync_subject_grades([record], scheme_for_student(student).points_by_grade)
+            cgpas, _ = update_running_cgpa([student.roll_number])
         
         return JsonResponse({
             'success': True, 
             'message': f"GPA for Sem {semester} saved successfully!",
-            'cgpa': calculate_cgpa(student) # Return updated CGPA
+            'cgpa': cgpas[student.roll_number] # Return updated CGPA
         })
 
     except Exception as e:
@@ -1750,8 +1479,7 @@ def save_gpa_api(request):
 def get_gpa_data(request):
     """API to fetch stored GPA and Subject Data for a specific semester."""
     try:
-        roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = request.student
         semester = request.GET.get('semester')
         
         if not semester:
@@ -1773,20 +1501,6 @@ def get_gpa_data(request):
         logger.error(f"Fetch GPA Data Error: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
 
-def calculate_cgpa(student):
-    """Helper to calculate CGPA from stored records."""
-    records = StudentGPA.objects.filter(student=student)
-    if not records.exists():
-        return 0.0
-        
-    total_points = sum(r.gpa * r.total_credits for r in records)
-    total_credits = sum(r.total_credits for r in records)
-    
-    if total_credits == 0:
-        return 0.0
-        
-    return round(total_points / total_credits, 2)
-
 # --- Skills & Projects APIs ---
 
 @require_POST
@@ -1800,8 +1514,7 @@ def add_skill_api(request):
         if not skill_name:
              return JsonResponse({'success': False, 'error': 'Skill name is required'})
 
-        roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = request.student
         
         skill = StudentSkill.objects.create(
             student=student, 
@@ -1819,8 +1532,7 @@ def delete_skill_api(request):
         data = json.loads(request.body)
         skill_id = data.get('skill_id')
         
-        roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = request.student
         
         StudentSkill.objects.filter(id=skill_id, student=student).delete()
         return JsonResponse({'success': True})
@@ -1842,8 +1554,7 @@ def add_project_api(request):
         if not title or not description:
              return JsonResponse({'success': False, 'error': 'Title and Description are required'})
 
-        roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = request.student
         
         project = StudentProject.objects.create(
             student=student, 
@@ -1863,8 +1574,7 @@ def delete_project_api(request):
         data = json.loads(request.body)
         project_id = data.get('project_id')
         
-        roll_number = request.session.get('student_roll_number')
-        student = Student.objects.get(roll_number=roll_number)
+        student = request.student
         
         StudentProject.objects.filter(id=project_id, student=student).delete()
         return JsonResponse({'success': True})
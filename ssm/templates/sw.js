@@ -31,11 +31,146 @@ self.addEventListener('activate', (event) => {
     );
 });
 
+// ==========================================
+// OFFLINE ATTENDANCE QUEUE
+// ==========================================
+// Attendance sheets that cannot reach the server are stored in IndexedDB and
+// posted in batches to the sync API once the network is back. Each sheet has
+// its own idempotency key, so re-sending after a lost response is harmless.
+
+const ATTENDANCE_SYNC_URL = "{% url 'staffs:attendance_sync_api' %}";
+const ATTENDANCE_FORM_PATTERN = /\/staffs\/subjects\/(\d+)\/attendance\/$/;
+const ATTENDANCE_DB = 'attendance-queue';
+const ATTENDANCE_STORE = 'sheets';
+const ATTENDANCE_SYNC_TAG = 'attendance-sync';
+const ATTENDANCE_BATCH_SIZE = 50;
+
+function openAttendanceDb() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open(ATTENDANCE_DB, 1);
+        request.onupgradeneeded = () => {
+            request.result.createObjectStore(ATTENDANCE_STORE, { keyPath: 'key' });
+        };
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function attendanceStore(mode, action) {
+    return openAttendanceDb().then((db) => new Promise((resolve, reject) => {
+        const tx = db.transaction(ATTENDANCE_STORE, mode);
+        const result = action(tx.objectStore(ATTENDANCE_STORE));
+        tx.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+        tx.onerror = () => reject(tx.error);
+    }));
+}
+
+function queueAttendanceSheet(entry) {
+    return attendanceStore('readwrite', (store) => store.put(entry)).then(() => {
+        if (self.registration.sync) {
+            return self.registration.sync.register(ATTENDANCE_SYNC_TAG).catch(() => { });
+        }
+    });
+}
+
+// Builds a sync sheet from a failed manage_attendance form POST
+async function queueAttendanceForm(request) {
+    const subjectId = parseInt(new URL(request.url).pathname.match(ATTENDANCE_FORM_PATTERN)[1], 10);
+    const form = await request.formData();
+    const statuses = {};
+    for (const [name, value] of form.entries()) {
+        if (name.startsWith('status_')) statuses[name.slice(7)] = value;
+    }
+    const date = form.get('attendance_date');
+    const pageUrl = new URL(request.url).pathname;
+    await queueAttendanceSheet({
+        key: self.crypto.randomUUID(),
+        csrfToken: form.get('csrfmiddlewaretoken'),
+        sheet: {
+            subject_id: subjectId,
+            date: date,
+            time: form.get('class_time') || null,
+            end_time: form.get('end_time') || null,
+            is_extra_class: Boolean(form.get('is_extra_class')),
+            recorded_at: new Date().toISOString(),
+            statuses: statuses
+        }
+    });
+    const count = Object.keys(statuses).length;
+    return new Response(
+        `<!DOCTYPE html><html><head><meta charset="UTF-8"><meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Saved offline</title></head>
+        <body style="font-family: Poppins, sans-serif; text-align: center; padding: 40px;">
+        <h2>📴 Attendance saved offline</h2>
+        <p>${count} student(s) for ${date} will be synced automatically when the connection is back.</p>
+        <p><a href="${pageUrl}?date=${date}">Back to attendance</a></p>
+        </body></html>`,
+        { headers: { 'Content-Type': 'text/html; charset=utf-8' } }
+    );
+}
+
+let attendanceFlush = null;
+
+// Posts queued sheets in batches; sheets the server acknowledged (or rejected) leave the queue
+function flushAttendanceQueue() {
+    if (attendanceFlush) return attendanceFlush;
+    attendanceFlush = (async () => {
+        const entries = await attendanceStore('readonly', (store) => store.getAll());
+        const summary = { applied: 0, rejected: [] };
+        for (let i = 0; i < entries.length; i += ATTENDANCE_BATCH_SIZE) {
+            const batch = entries.slice(i, i + ATTENDANCE_BATCH_SIZE);
+            const response = await fetch(ATTENDANCE_SYNC_URL, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json', 'X-CSRFToken': batch[0].csrfToken || '' },
+                body: JSON.stringify({ sheets: batch.map((entry) => Object.assign({ key: entry.key }, entry.sheet)) })
+            });
+            if (!response.ok) {
+                // Logged out, CSRF or a conflict: keep the sheets and retry on the next flush
+                break;
+            }
+            const data = await response.json();
+            await attendanceStore('readwrite', (store) => {
+                data.results.forEach((result) => {
+                    if (result.status === 'rejected') summary.rejected.push(result);
+                    else summary.applied += 1;
+                    if (result.key) store.delete(result.key);
+                });
+            });
+        }
+        const clientList = await self.clients.matchAll();
+        clientList.forEach((client) => client.postMessage({ type: 'attendance-synced', summary: summary }));
+        return summary;
+    })().finally(() => { attendanceFlush = null; });
+    return attendanceFlush;
+}
+
+self.addEventListener('sync', (event) => {
+    if (event.tag === ATTENDANCE_SYNC_TAG) {
+        event.waitUntil(flushAttendanceQueue());
+    }
+});
+
+self.addEventListener('message', (event) => {
+    if (event.data && event.data.type === 'flush-attendance') {
+        event.waitUntil(flushAttendanceQueue().catch(() => { }));
+    }
+});
+
 // Fetch event: Network First, then Cache, then Offline Page
 self.addEventListener('fetch', (event) => {
     // Skip cross-origin requests
     if (!event.request.url.startsWith(self.location.origin)) return;
 
+    // Attendance form submitted without connectivity: queue it instead of losing it
+    if (event.request.method === 'POST' && ATTENDANCE_FORM_PATTERN.test(new URL(event.request.url).pathname)) {
+        const queuedCopy = event.request.clone();
+        event.respondWith(
+            fetch(event.request).catch(() => queueAttendanceForm(queuedCopy))
+        );
+        return;
+    }
+
     event.respondWith(
         fetch(event.request)
             .then((fetchRes) => {